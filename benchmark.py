@@ -0,0 +1,233 @@
+"""Measures what neatest itself costs compared to `python -m unittest discover`.
+
+Generates synthetic projects with trivial tests and runs them with both tools
+in subprocesses:
+
+    python benchmark.py                       # 10, 1000 and 20000 test files
+    python benchmark.py --files 10 100 --output results.json
+
+For each project and each way of running it, the results contain:
+
+    discovery  seconds from the start of the process to the first test
+    run        seconds from the first test to the exit
+    per_test   `run` divided by the number of tests
+    total      seconds of the whole process
+    peak_rss   bytes, the peak resident memory of the largest process
+               (None on Windows)
+
+The results are written to a JSON file, so the numbers of different versions
+can be compared."""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+REPO_DIR = Path(__file__).parent.absolute()
+MARK_VARIABLE = 'NEATEST_BENCHMARK_MARK'
+
+BASE_MODULE = f'''import os
+import time
+import unittest
+
+_marked = False
+
+
+class BenchCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the time the first test started
+        global _marked
+        if not _marked:
+            _marked = True
+            mark = os.environ.get('{MARK_VARIABLE}')
+            if mark and not os.path.exists(mark):
+                with open(mark, 'w') as f:
+                    f.write(repr(time.time()))
+'''
+
+
+class Project(NamedTuple):
+    files: int
+    classes: int
+    tests: int
+    depth: int
+
+    @property
+    def total_tests(self) -> int:
+        return self.files * self.classes * self.tests
+
+
+def generate(project: Project, root: Path):
+    """Creates the package "pkg" with `project.files` test files. Each of
+    them imports a chain of `project.depth` helper modules."""
+    pkg = root / 'pkg'
+    helpers = pkg / 'helpers'
+    helpers.mkdir(parents=True)
+    (pkg / '__init__.py').write_text('')
+    (pkg / 'bench_base.py').write_text(BASE_MODULE)
+    (helpers / '__init__.py').write_text('')
+    for level in range(project.depth):
+        imports = (f'from pkg.helpers import helper{level + 1}\n'
+                   if level + 1 < project.depth else '')
+        (helpers / f'helper{level}.py').write_text(
+            f'{imports}\n\ndef value():\n    return {level}\n')
+
+    head = 'from pkg.helpers import helper0\n' if project.depth else ''
+    for index in range(project.files):
+        lines = [head, 'from pkg.bench_base import BenchCase\n']
+        for cls in range(project.classes):
+            lines.append(f'\n\nclass Test{cls}(BenchCase):\n')
+            for test in range(project.tests):
+                lines.append(f'    def test_{test}(self):\n'
+                             f'        self.assertEqual({test}, {test})\n\n')
+        (pkg / f'test_{index:05d}.py').write_text(''.join(lines))
+
+
+class Measurement(NamedTuple):
+    tool: str
+    files: int
+    tests: int
+    discovery: Optional[float]
+    run: Optional[float]
+    per_test: Optional[float]
+    total: float
+    peak_rss: Optional[int]
+    returncode: int
+
+
+def _wait(process: subprocess.Popen) -> Tuple[int, Optional[int]]:
+    """Waits for the process. Returns the exit code and the peak RSS."""
+    if hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status) \
+            if hasattr(os, 'waitstatus_to_exitcode') else status >> 8
+        # kilobytes on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return process.returncode, usage.ru_maxrss * scale
+    return process.wait(), None
+
+
+def measure(tool: str, args: List[str], project: Project,
+            root: Path) -> Measurement:
+    mark = root / 'first_test.mark'
+    if mark.exists():
+        mark.unlink()
+    env = os.environ.copy()
+    env[MARK_VARIABLE] = str(mark)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [str(REPO_DIR)] + env.get('PYTHONPATH', '').split(os.pathsep))
+
+    started = time.time()
+    process = subprocess.Popen([sys.executable] + args, cwd=str(root),
+                               env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    returncode, peak_rss = _wait(process)
+    total = time.time() - started
+
+    discovery = run = per_test = None
+    if mark.exists():
+        discovery = float(mark.read_text()) - started
+        run = total - discovery
+        per_test = run / project.total_tests if project.total_tests else None
+    return Measurement(tool, project.files, project.total_tests,
+                       discovery, run, per_test, total, peak_rss, returncode)
+
+
+def tools(jobs: int) -> List[List]:
+    """The names and the arguments of the ways to run the tests."""
+    neatest = ['-m', 'neatest', '-s', 'pkg', '-q']
+    return [
+        ['unittest', ['-m', 'unittest', 'discover', '-s', 'pkg', '-t', '.',
+                      '-q']],
+        ['neatest (cold cache)', neatest + ['--clear-cache']],
+        ['neatest', neatest],
+        ['neatest --import-all', neatest + ['--import-all']],
+        ['neatest --json', neatest + ['--json']],
+        ['neatest --jsonl', neatest + ['--jsonl', os.devnull]],
+        ['neatest --durations', neatest + ['--durations', '10']],
+        [f'neatest -j {jobs}', neatest + ['-j', str(jobs)]],
+    ]
+
+
+def _seconds(value: Optional[float]) -> str:
+    return f'{value:9.3f}' if value is not None else '        -'
+
+
+def format_measurement(m: Measurement) -> str:
+    rss = f'{m.peak_rss / 1024 / 1024:8.1f}' if m.peak_rss else '       -'
+    per_test = (f'{m.per_test * 1e6:9.1f}' if m.per_test is not None
+                else '        -')
+    failed = '' if m.returncode == 0 else f'  (exit code {m.returncode})'
+    return (f'{m.files:6d} {m.tests:7d}  {_seconds(m.discovery)}s '
+            f'{_seconds(m.run)}s {per_test}us {_seconds(m.total)}s '
+            f'{rss} MiB  {m.tool}{failed}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, nargs='+',
+                        default=[10, 1000, 20000],
+                        help='Numbers of the test files in the generated '
+                             'projects (default: 10 1000 20000)')
+    parser.add_argument('--classes', type=int, default=2,
+                        help='Test classes in each file (default: 2)')
+    parser.add_argument('--tests', type=int, default=5,
+                        help='Tests in each class (default: 5)')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='Length of the chain of the modules imported '
+                             'by the test files (default: 3)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Run each measurement N times and keep the '
+                             'fastest (default: 1)')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='Processes for the parallel run. 0 means the '
+                             'number of CPUs (default: 0)')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='JSON file for the results '
+                             '(default: benchmark.json)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(REPO_DIR))
+    import neatest
+
+    jobs = args.jobs or os.cpu_count() or 1
+    results: List[Measurement] = []
+    print(' files   tests  discovery       run  per test     total'
+          '      RSS')
+    for files in args.files:
+        project = Project(files, args.classes, args.tests, args.depth)
+        root = Path(tempfile.mkdtemp(prefix='neatest_benchmark_'))
+        try:
+            generate(project, root)
+            for tool, tool_args in tools(jobs):
+                best = min((measure(tool, tool_args, project, root)
+                            for _ in range(max(1, args.repeat))),
+                           key=lambda m: m.total)
+                print(format_measurement(best))
+                results.append(best)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'neatest': neatest.__version__,
+                   'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'cpus': os.cpu_count(),
+                   'project': {'classes': args.classes,
+                               'tests': args.tests,
+                               'depth': args.depth},
+                   'results': [m._asdict() for m in results]},
+                  f, indent=2)
+    print(f'\nResults written to {args.output}')
+
+
+if __name__ == "__main__":
+    main()
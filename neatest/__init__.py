@@ -1,3 +1,4 @@
 from ._constants import __version__
 from ._neatest import main_entry_point, run, NeatestError, InstallationError, \
-    TestsError, PythonWarningsArgs, print_version, Warnings, RunResult, Verbosity
+    TestsError, PythonWarningsArgs, print_version, Warnings, RunResult, \
+    Verbosity, Backend
@@ -0,0 +1,41 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Optional, Union
+
+CACHE_DIR_NAME = '.neatest_cache'
+
+
+class CacheDir:
+    """The directory where neatest keeps the data between runs.
+
+    The cache is only an optimization: any file that cannot be read or written
+    is silently treated as missing."""
+
+    def __init__(self, top_level_dir: Union[str, Path]):
+        self.path = Path(top_level_dir).absolute() / CACHE_DIR_NAME
+
+    def read(self, name: str) -> Optional[Any]:
+        try:
+            return json.loads((self.path / name).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def write(self, name: str, data: Any):
+        try:
+            self.path.mkdir(exist_ok=True)
+            gitignore = self.path / '.gitignore'
+            if not gitignore.exists():
+                gitignore.write_text('# Created by neatest\n*\n')
+            temp = self.path / f'{name}.{os.getpid()}.tmp'
+            temp.write_text(json.dumps(data), encoding='utf-8')
+            os.replace(str(temp), str(self.path / name))
+        except OSError:
+            pass
+
+    def clear(self):
+        shutil.rmtree(str(self.path), ignore_errors=True)
@@ -0,0 +1,105 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import io
+from tempfile import SpooledTemporaryFile
+from typing import NamedTuple, Optional
+
+# bytes of the captured output kept in memory, the rest goes to a temp file
+DEFAULT_CAPTURE_MEMORY = 1024 * 1024
+# bytes of the captured output shown for a failed test
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024
+
+
+class CaptureLimits(NamedTuple):
+    memory: int = DEFAULT_CAPTURE_MEMORY
+    # None means no limit
+    output: Optional[int] = DEFAULT_OUTPUT_LIMIT
+
+
+class CaptureBuffer(io.TextIOBase):
+    """Replaces `io.StringIO` for capturing the output.
+
+    Up to `limits.memory` bytes are kept in memory, and the rest is written to
+    a temporary file. `getvalue()` returns at most `limits.output` bytes:
+    the beginning and the end of the output with the middle part skipped.
+
+    The stream can only be appended to, or cleared with `seek(0)` followed
+    by `truncate()`, as `unittest` does after each test."""
+
+    def __init__(self, limits: CaptureLimits = CaptureLimits()):
+        super().__init__()
+        self.limits = limits
+        self._file = SpooledTemporaryFile(max_size=limits.memory)
+        self._chars = 0
+        self._rewound = False
+
+    @property
+    def encoding(self):
+        return 'utf-8'
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        if not isinstance(s, str):
+            raise TypeError(
+                f'write() argument must be str, not {type(s).__name__}')
+        self._file.write(s.encode('utf-8', 'backslashreplace'))
+        self._chars += len(s)
+        self._rewound = False
+        return len(s)
+
+    def tell(self) -> int:
+        """The number of characters written."""
+        return 0 if self._rewound else self._chars
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if offset != 0 or whence not in (io.SEEK_SET, io.SEEK_END):
+            raise io.UnsupportedOperation('can only seek to the start or end')
+        self._rewound = whence == io.SEEK_SET
+        return self.tell()
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        if size is None:
+            size = self.tell()
+        if size != 0:
+            raise io.UnsupportedOperation('can only truncate to zero size')
+        self.clear()
+        return 0
+
+    def clear(self):
+        if getattr(self._file, '_rolled', True):
+            # the output went to the disk, so the memory is used again
+            self._file.close()
+            self._file = SpooledTemporaryFile(max_size=self.limits.memory)
+        else:
+            # called twice after each test, so the buffer is reused
+            self._file.seek(0)
+            self._file.truncate()
+        self._chars = 0
+        self._rewound = False
+
+    def getvalue(self) -> str:
+        size = self._file.tell()
+        limit = self.limits.output
+        try:
+            self._file.seek(0)
+            if limit is None or size <= limit:
+                return self._file.read().decode('utf-8', 'replace')
+            half = limit // 2
+            head = self._file.read(half).decode('utf-8', 'ignore')
+            self._file.seek(size - half)
+            tail = self._file.read(half).decode('utf-8', 'ignore')
+            return (f'{head}\n'
+                    f'[... {size - 2 * half} bytes of the output skipped ...]'
+                    f'\n{tail}')
+        finally:
+            self._file.seek(size)
+
+    def close(self):
+        self._file.close()
+        super().close()
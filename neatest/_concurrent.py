@@ -0,0 +1,214 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Running the async tests of a class at the same time on one event loop.
+
+Only the subclasses of `unittest.IsolatedAsyncioTestCase` with the class
+attribute `neatest_concurrent = True` are run this way:
+
+    class TestServer(unittest.IsolatedAsyncioTestCase):
+        neatest_concurrent = True
+
+        async def test_get(self):
+            ...
+
+Each test still gets its own instance, `setUp`, `asyncSetUp`, `asyncTearDown`,
+`tearDown` and cleanups, but they are awaited on the loop shared by the
+tests of the class. The outcome of each test is reported to the result when
+the test finishes, so the output of the tests is not captured, and the
+subtests are not reported separately.
+
+`asyncio` is imported only when such a class is run, since importing it takes
+time and most runs do not need it."""
+
+import functools
+import inspect
+import sys
+import unittest
+from typing import Iterable, List, Optional
+from unittest import TestCase, TestSuite
+
+from neatest._timing import Stopwatch, TimingSuite, set_stopwatch
+
+# hides the frames of this module from the tracebacks, as unittest does
+__unittest = True
+
+# the attribute of the test classes that allows running them concurrently
+CONCURRENT_ATTRIBUTE = 'neatest_concurrent'
+
+
+def is_concurrent(test_class: type) -> bool:
+    if not (isinstance(test_class, type)
+            and getattr(test_class, CONCURRENT_ATTRIBUTE, False)):
+        return False
+    # `unittest.IsolatedAsyncioTestCase` imports asyncio when it is accessed,
+    # and its subclasses exist only if it is already imported
+    async_case = sys.modules.get('unittest.async_case')
+    return async_case is not None \
+        and issubclass(test_class, async_case.IsolatedAsyncioTestCase)
+
+
+class _Outcome:
+    def __init__(self):
+        self.skipped: Optional[str] = None
+        # sys.exc_info() of each error
+        self.errors: List[tuple] = []
+
+
+async def _step(outcome: _Outcome, function) -> bool:
+    """Calls the function and awaits the result, if it is awaitable.
+    Returns False if it raised."""
+    try:
+        value = function()
+        if inspect.isawaitable(value):
+            await value
+        return True
+    except unittest.SkipTest as e:
+        outcome.skipped = str(e)
+    except Exception:
+        outcome.errors.append(sys.exc_info())
+    return False
+
+
+async def _run_test_body(test: TestCase, outcome: _Outcome):
+    if await _step(outcome, test.setUp) \
+            and await _step(outcome, test.asyncSetUp):  # type: ignore
+        await _step(outcome, getattr(test, test._testMethodName))
+        await _step(outcome, test.asyncTearDown)  # type: ignore
+        await _step(outcome, test.tearDown)
+
+
+def _timeout_error(timeout: float) -> tuple:
+    try:
+        raise TimeoutError(f'The test did not finish in {timeout} seconds')
+    except TimeoutError:
+        return sys.exc_info()
+
+
+class ConcurrentSuite(TimingSuite):
+    """The tests of a concurrent class. Runs up to `limit` of them at a time,
+    each within `timeout` seconds (including `setUp` and `tearDown`).
+
+    The class and module fixtures are handled the same way as by
+    `TestSuite`."""
+
+    def __init__(self, tests: Iterable = (), limit: int = 1,
+                 timeout: Optional[float] = None):
+        super().__init__(tests)
+        self.limit = limit
+        self.timeout = timeout
+
+    async def _run_test(self, test: TestCase, semaphore, result):
+        # semaphore is asyncio.Semaphore
+        import asyncio
+        async with semaphore:
+            if result.shouldStop:
+                return
+            stopwatch = Stopwatch()
+            outcome = _Outcome()
+            method = getattr(test, test._testMethodName)
+            skip_why = (getattr(test.__class__, '__unittest_skip_why__', '')
+                        or getattr(method, '__unittest_skip_why__', ''))
+            if getattr(test.__class__, '__unittest_skip__', False) \
+                    or getattr(method, '__unittest_skip__', False):
+                outcome.skipped = skip_why
+            else:
+                timed_out = False
+                try:
+                    await asyncio.wait_for(_run_test_body(test, outcome),
+                                           self.timeout)
+                except asyncio.TimeoutError:
+                    timed_out = True
+                if timed_out:
+                    assert self.timeout is not None
+                    outcome.errors.append(_timeout_error(self.timeout))
+                while test._cleanups:  # type: ignore
+                    function, args, kwargs = \
+                        test._cleanups.pop()  # type: ignore
+                    await _step(outcome,
+                                functools.partial(function, *args, **kwargs))
+            expecting_failure = (
+                    getattr(test, '__unittest_expecting_failure__', False)
+                    or getattr(method, '__unittest_expecting_failure__',
+                               False))
+            self._report(test, outcome, expecting_failure, stopwatch, result)
+
+    @staticmethod
+    def _report(test: TestCase, outcome: _Outcome, expecting_failure: bool,
+                stopwatch: Stopwatch, result):
+        set_stopwatch(test, stopwatch)
+        result.startTest(test)
+        try:
+            if outcome.skipped is not None and not outcome.errors:
+                result.addSkip(test, outcome.skipped)
+            elif expecting_failure:
+                if outcome.errors:
+                    result.addExpectedFailure(test, outcome.errors[0])
+                else:
+                    result.addUnexpectedSuccess(test)
+            elif outcome.errors:
+                for error in outcome.errors:
+                    if issubclass(error[0], test.failureException):
+                        result.addFailure(test, error)
+                    else:
+                        result.addError(test, error)
+            else:
+                result.addSuccess(test)
+        finally:
+            result.stopTest(test)
+
+    async def _run_all(self, tests: List[TestCase], result):
+        import asyncio
+        semaphore = asyncio.Semaphore(max(1, self.limit))
+        await asyncio.gather(*(self._run_test(test, semaphore, result)
+                               for test in tests))
+
+    def run(self, result, debug=False):
+        top_level = False
+        if getattr(result, '_testRunEntered', False) is False:
+            result._testRunEntered = top_level = True
+
+        tests = list(self)
+        if tests and not result.shouldStop:
+            first = tests[0]
+            self._tearDownPreviousClass(first, result)
+            self._handleModuleFixture(first, result)
+            self._handleClassSetUp(first, result)
+            result._previousTestClass = first.__class__
+            if not (getattr(first.__class__, '_classSetupFailed', False)
+                    or getattr(result, '_moduleSetUpFailed', False)):
+                import asyncio
+                loop = asyncio.new_event_loop()
+                loop.set_debug(True)
+                asyncio.set_event_loop(loop)
+                try:
+                    loop.run_until_complete(self._run_all(tests, result))
+                    loop.run_until_complete(loop.shutdown_asyncgens())
+                finally:
+                    asyncio.set_event_loop(None)
+                    loop.close()
+            if self._cleanup:
+                self._tests = []
+
+        if top_level:
+            self._tearDownPreviousClass(None, result)
+            self._handleModuleTearDown(result)
+            result._testRunEntered = False
+        return result
+
+
+def group_concurrent(suite: TestSuite, limit: int,
+                     timeout: Optional[float]) -> TestSuite:
+    """Replaces (in place) the suites of the concurrent classes with
+    `ConcurrentSuite`. Returns the suite."""
+    items = list(suite)
+    classes = {item.__class__ for item in items}
+    if items and len(classes) == 1 and all(
+            isinstance(item, TestCase) for item in items) \
+            and is_concurrent(classes.pop()):
+        return ConcurrentSuite(items, limit, timeout)
+    grouped: list = [group_concurrent(item, limit, timeout)
+                     if isinstance(item, TestSuite) else item
+                     for item in items]
+    suite._tests = grouped  # type: ignore
+    return suite
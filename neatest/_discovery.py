@@ -0,0 +1,1009 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Test discovery that parses the sources before importing them.
+
+`unittest discover` imports every module matching the pattern just to find out
+whether it contains tests. `NeatestLoader` follows exactly the same rules, but
+first looks at the syntax tree of each file and skips the files (and the
+packages) that cannot contain `unittest.TestCase` subclasses.
+"""
+
+import ast
+import builtins
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple, \
+    Union
+from unittest import TestLoader, TestSuite
+from unittest.loader import VALID_MODULE_NAME
+
+from neatest._cache import CacheDir
+from neatest._requirements import fingerprint as installed_fingerprint
+from neatest._timing import TimingSuite
+
+_TEST_CASE_ROOTS = {
+    'unittest.TestCase',
+    'unittest.case.TestCase',
+    'unittest.FunctionTestCase',
+    'unittest.case.FunctionTestCase',
+    'unittest.IsolatedAsyncioTestCase',
+    'unittest.async_case.IsolatedAsyncioTestCase',
+}
+
+
+class ScannedClass(NamedTuple):
+    name: str
+    # base class expressions as written in the source, e.g. "unittest.TestCase"
+    bases: List[str]
+    # names of all the functions defined in the class body, and of the
+    # attributes assigned there (like "test_b = test_a")
+    methods: List[str]
+
+
+class ScannedModule(NamedTuple):
+    classes: List[ScannedClass]
+    # local name -> imported name. Relative imports keep their leading dots,
+    # so the scan does not depend on the name the module is imported by
+    imports: Dict[str, str]
+    # local name -> dotted expression assigned to it at the top level
+    assigned: Dict[str, str]
+    star_imports: List[str]
+    has_load_tests: bool
+    syntax_error: bool
+    # all the modules imported anywhere in the file (relative imports keep
+    # their leading dots). For "from m import x" both "m" and "m.x" are
+    # listed, since x may be a submodule
+    dependencies: List[str]
+    # defines or imports setUpModule or tearDownModule
+    has_module_fixtures: bool = False
+    # changes its names at runtime with globals(), vars(), exec() or
+    # setattr(sys.modules[...], ...), so the classes may not be in the source
+    dynamic_names: bool = False
+
+
+def _dotted(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        value = _dotted(node.value)
+        return f'{value}.{node.attr}' if value else None
+    return None
+
+
+# the base class that is computed when the module is imported, like
+# "make_base()" or "A if cond else B". It cannot be resolved statically
+DYNAMIC_BASE = '()'
+
+
+def _base_expressions(node: ast.AST) -> List[str]:
+    if isinstance(node, ast.Subscript):  # Generic[T], SomeCase[int]
+        return _base_expressions(node.value)
+    if isinstance(node, ast.Call):  # six.with_metaclass(Meta, TestCase)
+        result = _base_expressions(node.func)
+        for arg in node.args:
+            result.extend(_base_expressions(arg))
+        return result + [DYNAMIC_BASE]
+    dotted = _dotted(node)
+    return [dotted] if dotted else [DYNAMIC_BASE]
+
+
+# the expressions that may evaluate to a class created at import time
+_COMPUTED = tuple(getattr(ast, name)
+                  for name in ('Call', 'IfExp', 'Subscript', 'BoolOp',
+                               'Await', 'NamedExpr')
+                  if hasattr(ast, name))
+
+
+def _assigned_value(node: ast.AST) -> Optional[str]:
+    """The dotted expression assigned to a name, DYNAMIC_BASE for a value
+    that may be a class computed at import time (`TestX = make()`), or None
+    for the values that cannot be classes."""
+    if isinstance(node, _COMPUTED):
+        return DYNAMIC_BASE
+    return _dotted(node)
+
+
+def _target_names(target: ast.expr) -> List[str]:
+    if isinstance(target, ast.Name):
+        return [target.id]
+    if isinstance(target, (ast.Tuple, ast.List)):
+        return [name for item in target.elts for name in _target_names(item)]
+    if isinstance(target, ast.Starred):
+        return _target_names(target.value)
+    return []  # an attribute or an item
+
+
+def _assignments(targets: List[ast.expr],
+                 value: ast.AST) -> List[Tuple[str, Optional[str]]]:
+    """The (name, value) pairs of `targets = value`, unpacking the tuples
+    and the lists."""
+    result: List[Tuple[str, Optional[str]]] = []
+    for target in targets:
+        if isinstance(target, ast.Name):
+            result.append((target.id, _assigned_value(value)))
+        elif isinstance(target, (ast.Tuple, ast.List)) \
+                and isinstance(value, (ast.Tuple, ast.List)) \
+                and len(value.elts) == len(target.elts) \
+                and not any(isinstance(item, ast.Starred)
+                            for item in target.elts + value.elts):
+            for item, item_value in zip(target.elts, value.elts):
+                result.extend(_assignments([item], item_value))
+        else:
+            # the items of a value that is not written out may be anything
+            result.extend((name, DYNAMIC_BASE)
+                          for name in _target_names(target))
+    return result
+
+
+_BLOCKS = tuple(getattr(ast, name)
+                for name in ('If', 'Try', 'TryStar', 'With', 'AsyncWith',
+                             'For', 'AsyncFor', 'While')
+                if hasattr(ast, name))
+
+
+def _top_level_statements(body: List[ast.stmt]):
+    """Yields the statements executed on import, including the ones nested
+    in `if`, `try`, `with`, `for`, `while` and `match` blocks, but not in
+    functions or classes."""
+    for stmt in body:
+        yield stmt
+        if isinstance(stmt, _BLOCKS):
+            for attr in ('body', 'orelse', 'finalbody'):
+                yield from _top_level_statements(getattr(stmt, attr, []))
+            for handler in getattr(stmt, 'handlers', []):
+                yield from _top_level_statements(handler.body)
+        for case in getattr(stmt, 'cases', []):  # match
+            yield from _top_level_statements(case.body)
+
+
+def _changes_names(node: ast.AST) -> bool:
+    """Whether the call may add names to the module at runtime."""
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+        return False
+    name = node.func.id
+    if name in ('globals', 'exec'):
+        return True
+    if name == 'vars':
+        return not node.args
+    if name == 'setattr' and node.args:
+        # setattr(sys.modules[__name__], ...)
+        target = node.args[0]
+        return isinstance(target, ast.Subscript) \
+            and _dotted(target.value) in ('sys.modules', 'modules')
+    return False
+
+
+def scan_source(source: Union[str, bytes]) -> ScannedModule:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return ScannedModule([], {}, {}, [], False, True, [])
+
+    classes: List[ScannedClass] = []
+    imports: Dict[str, str] = {}
+    assigned: Dict[str, str] = {}
+    star_imports: List[str] = []
+    has_load_tests = False
+    defined: Set[str] = set()
+
+    for stmt in _top_level_statements(tree.body):
+        if isinstance(stmt, ast.ClassDef):
+            bases: List[str] = []
+            for base in stmt.bases:
+                bases.extend(_base_expressions(base))
+            methods = []
+            for item in stmt.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    methods.append(item.name)
+                elif isinstance(item, (ast.Assign, ast.AnnAssign)):
+                    targets = (item.targets if isinstance(item, ast.Assign)
+                               else [item.target])
+                    methods.extend(target.id for target in targets
+                                   if isinstance(target, ast.Name))
+            classes.append(ScannedClass(stmt.name, bases, methods))
+        elif isinstance(stmt, ast.Import):
+            for alias in stmt.names:
+                if alias.asname:
+                    imports[alias.asname] = alias.name
+                else:
+                    head = alias.name.split('.')[0]
+                    imports[head] = head
+        elif isinstance(stmt, ast.ImportFrom):
+            source_module = '.' * (stmt.level or 0) + (stmt.module or '')
+            for alias in stmt.names:
+                if alias.name == '*':
+                    star_imports.append(source_module)
+                    continue
+                separator = '' if source_module.endswith('.') else '.'
+                imports[alias.asname or alias.name] = \
+                    f'{source_module}{separator}{alias.name}'
+        elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            defined.add(stmt.name)
+            if stmt.name == 'load_tests':
+                has_load_tests = True
+        elif isinstance(stmt, (ast.Assign, ast.AnnAssign)):
+            if isinstance(stmt, ast.Assign):
+                pairs = _assignments(stmt.targets, stmt.value)
+            elif stmt.value is not None:
+                pairs = _assignments([stmt.target], stmt.value)
+            else:
+                pairs = []
+            for name, value in pairs:
+                defined.add(name)
+                if name == 'load_tests':
+                    has_load_tests = True
+                if value:
+                    assigned[name] = value
+                else:
+                    assigned.pop(name, None)
+
+    if 'load_tests' in imports:
+        has_load_tests = True
+
+    dependencies: List[str] = []
+    dynamic_names = False
+    for node in ast.walk(tree):
+        if _changes_names(node):
+            dynamic_names = True
+        elif isinstance(node, ast.Import):
+            dependencies.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            source_module = '.' * (node.level or 0) + (node.module or '')
+            dependencies.append(source_module)
+            separator = '' if source_module.endswith('.') else '.'
+            dependencies.extend(f'{source_module}{separator}{alias.name}'
+                                for alias in node.names
+                                if alias.name != '*')
+
+    defined.update(imports)
+    return ScannedModule(classes, imports, assigned, star_imports,
+                         has_load_tests, False,
+                         sorted(set(dependencies)),
+                         bool(defined & _MODULE_FIXTURES), dynamic_names)
+
+
+def _resolve_relative(module: str, is_package: bool, name: str) -> str:
+    """Converts '..base.Foo' imported into `module` to the absolute name."""
+    level = len(name) - len(name.lstrip('.'))
+    if level == 0:
+        return name
+    parts = module.split('.')
+    if not is_package:
+        parts = parts[:-1]
+    if level > 1:
+        parts = parts[:max(0, len(parts) - (level - 1))]
+    rest = name[level:]
+    return '.'.join(parts + ([rest] if rest else []))
+
+
+_MODULE_FIXTURES = {'setUpModule', 'tearDownModule'}
+
+
+def _looks_like_test_case(class_name: str) -> bool:
+    # The base class is defined outside the project, so we cannot parse it.
+    # Classes like django.test.TestCase or absltest.TestCase contain "Test"
+    # in their names. We'd rather import a module in vain than miss the tests
+    return 'Test' in class_name
+
+
+def _is_standard(name: str) -> bool:
+    """Whether the absolute name is in the standard library (only known
+    since Python 3.10)."""
+    standard = getattr(sys, 'stdlib_module_names', ())
+    return name.split('.')[0] in standard
+
+
+def _decode_scan(data: list) -> ScannedModule:
+    scan = ScannedModule(*data)
+    return scan._replace(classes=[ScannedClass(*c) for c in scan.classes])
+
+
+def sources_fingerprint(top_level_dir: str) -> str:
+    """Changes when a file inside the top level directory (except the hidden
+    directories and `__pycache__`) is added, removed or modified, or when
+    the installed packages change."""
+    files = []
+    for root, dirs, names in os.walk(top_level_dir):
+        dirs[:] = sorted(d for d in dirs
+                         if not d.startswith('.') and d != '__pycache__')
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append([os.path.relpath(path, top_level_dir),
+                          stat.st_mtime_ns, stat.st_size])
+    data = json.dumps([installed_fingerprint([]), files])
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class DiscoveryManifest:
+    """Keeps the results of scanning each file of the project, and the IDs of
+    tests loaded from it.
+
+    An entry is valid while the file keeps the same mtime and size. When they
+    change, but the content hash does not, the entry is still reused. With
+    the `cache` specified, the manifest is loaded from it and can be saved
+    back, so the next run only parses the files that changed.
+
+    The units found by the discovery in the other processes are kept too, so
+    the next parallel run with no changes in the project does not discover
+    the tests again."""
+
+    FILE_NAME = 'discovery.json'
+    # increase when the format of ScannedModule changes
+    FORMAT = 6
+
+    def __init__(self, top_level_dir: str, cache: Optional[CacheDir] = None):
+        self.top_level_dir = os.path.abspath(top_level_dir)
+        self.cache = cache
+        self._files: Dict[str, dict] = {}
+        self._scans: Dict[str, ScannedModule] = {}
+        # the start directory and the pattern -> the fingerprint of the
+        # sources and the [name, path, test IDs] of the units found
+        self._units: Dict[str, dict] = {}
+        self._sources: Optional[str] = None
+        self._modified = False
+
+        data = cache.read(self.FILE_NAME) if cache is not None else None
+        if isinstance(data, dict) \
+                and data.get('format') == self.FORMAT \
+                and data.get('python') == list(sys.version_info[:2]):
+            self._files = data['files']
+            self._units = data.get('units', {})
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.top_level_dir)
+
+    def scan(self, path: str) -> ScannedModule:
+        key = self._key(path)
+        scan = self._scans.get(key)
+        if scan is not None:
+            return scan
+
+        try:
+            stat = os.stat(path)
+            entry = self._files.get(key)
+            if entry is not None \
+                    and entry['mtime'] == stat.st_mtime_ns \
+                    and entry['size'] == stat.st_size:
+                scan = _decode_scan(entry['scan'])
+            else:
+                with open(path, 'rb') as f:
+                    source = f.read()
+                digest = hashlib.sha1(source).hexdigest()
+                if entry is not None and entry['sha1'] == digest:
+                    scan = _decode_scan(entry['scan'])
+                    entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+                else:
+                    scan = scan_source(source)
+                    self._files[key] = {'mtime': stat.st_mtime_ns,
+                                        'size': stat.st_size,
+                                        'sha1': digest,
+                                        'scan': scan,
+                                        'tests': None}
+                self._modified = True
+        except OSError:
+            scan = ScannedModule([], {}, {}, [], False, True, [])
+
+        self._scans[key] = scan
+        return scan
+
+    def set_tests(self, path: str, ids: List[str]):
+        entry = self._files.get(self._key(path))
+        if entry is not None and entry['tests'] != ids:
+            entry['tests'] = ids
+            self._modified = True
+
+    def tests(self, path: str) -> Optional[List[str]]:
+        """IDs of the tests loaded from the file by the last discovery."""
+        entry = self._files.get(self._key(path))
+        return entry['tests'] if entry is not None else None
+
+    def files_with_tests(self, predicate: Callable[[str], bool]) -> List[str]:
+        """Paths of the files that had the matching tests during the last
+        discovery."""
+        return [os.path.join(self.top_level_dir, key)
+                for key, entry in self._files.items()
+                if any(predicate(i) for i in entry['tests'] or ())]
+
+    def updates(self) -> Dict[str, dict]:
+        """The entries of the files scanned by this object, to be merged to
+        the manifest of another process."""
+        return {key: self._files[key]
+                for key in self._scans if key in self._files}
+
+    def merge(self, entries: Dict[str, dict]):
+        for key, entry in entries.items():
+            current = self._files.get(key)
+            if current is None or any(current[field] != entry[field]
+                                      for field in ('mtime', 'size', 'sha1',
+                                                    'tests')):
+                self._files[key] = entry
+                self._scans.pop(key, None)
+                self._modified = True
+
+    def _units_key(self, start_dir: str, pattern: str, static: bool) -> str:
+        return json.dumps([self._key(start_dir), pattern, static])
+
+    def _sources_fingerprint(self) -> str:
+        # computed once, before the discovery
+        if self._sources is None:
+            self._sources = sources_fingerprint(self.top_level_dir)
+        return self._sources
+
+    def found_units(self, start_dir: str, pattern: str,
+                    static: bool) -> Optional[List[list]]:
+        """The [name, path, test IDs] of the units found in the `start_dir`
+        by the last discovery with the same arguments, or None if any file of
+        the project or any installed package changed after it."""
+        if self.cache is None:
+            return None
+        entry = self._units.get(self._units_key(start_dir, pattern, static))
+        if entry is None or entry['sources'] != self._sources_fingerprint():
+            return None
+        return [[name, os.path.join(self.top_level_dir, path), ids]
+                for name, path, ids in entry['units']]
+
+    def set_found_units(self, start_dir: str, pattern: str, static: bool,
+                        units: List[list]):
+        """Remembers the [name, path, test IDs] of the units found by the
+        discovery that started after the first `found_units` call."""
+        if self.cache is None:
+            return
+        sources = self._sources_fingerprint()
+        # the units found for the other sources will not be used
+        self._units = {key: entry for key, entry in self._units.items()
+                       if entry['sources'] == sources}
+        self._units[self._units_key(start_dir, pattern, static)] = {
+            'sources': sources,
+            'units': [[name, self._key(path), ids]
+                      for name, path, ids in units]}
+        self._modified = True
+
+    def save(self):
+        if self.cache is not None and self._modified:
+            self.cache.write(self.FILE_NAME,
+                             {'format': self.FORMAT,
+                              'python': list(sys.version_info[:2]),
+                              'files': self._files,
+                              'units': self._units})
+            self._modified = False
+
+
+class StaticIndex:
+    """Resolves class hierarchies across the modules inside the top level
+    directory, parsing each of the files at most once."""
+
+    def __init__(self, top_level_dir: str,
+                 manifest: Optional[DiscoveryManifest] = None):
+        self.top_level_dir = os.path.abspath(top_level_dir)
+        self.manifest = manifest or DiscoveryManifest(top_level_dir)
+        self._test_classes: Dict[Tuple[str, str, bool], bool] = {}
+
+    def scan_file(self, path: str) -> ScannedModule:
+        return self.manifest.scan(path)
+
+    def module_file(self, module: str) -> Optional[Tuple[str, bool]]:
+        """Returns the (path, is_package) of a module defined in the project,
+        or None if the module is not in the top level directory."""
+        parts = module.split('.')
+        if not module or not all(part.isidentifier() for part in parts):
+            return None
+        base = os.path.join(self.top_level_dir, *parts)
+        init = os.path.join(base, '__init__.py')
+        if os.path.isfile(init):
+            return init, True
+        if os.path.isfile(base + '.py'):
+            return base + '.py', False
+        return None
+
+    def _scan_module(self,
+                     module: str) -> Optional[Tuple[ScannedModule, bool]]:
+        found = self.module_file(module)
+        if found is None:
+            return None
+        path, is_package = found
+        return self.scan_file(path), is_package
+
+    def _resolve(self, module: str, expression: str,
+                 depth: int = 0) -> Optional[str]:
+        """Converts the `expression` used inside `module` to the absolute
+        dotted name. Returns '' for builtins and None when unknown."""
+        found = self._scan_module(module)
+        if found is None or depth > 10:
+            return None
+        scan, is_package = found
+        head, _, rest = expression.partition('.')
+        suffix = f'.{rest}' if rest else ''
+        if head in scan.imports:
+            return _resolve_relative(module, is_package,
+                                     scan.imports[head]) + suffix
+        if any(cls.name == head for cls in scan.classes):
+            return f'{module}.{expression}'
+        if head in scan.assigned:
+            target = self._resolve(module, scan.assigned[head], depth + 1)
+            return target + suffix if target else target
+        for star in scan.star_imports:
+            star_module = _resolve_relative(module, is_package, star)
+            star_found = self._scan_module(star_module)
+            if star_found is not None and (
+                    any(cls.name == head for cls in star_found[0].classes)
+                    or head in star_found[0].imports):
+                return f'{star_module}.{expression}'
+        if hasattr(builtins, head):
+            return ''
+        return None
+
+    def _split_class(self, absolute: str) -> Optional[Tuple[str, str]]:
+        """Splits the absolute name of a class defined in the project into
+        the module and the class name."""
+        parts = absolute.split('.')
+        for i in range(len(parts) - 1, 0, -1):
+            if self.module_file('.'.join(parts[:i])) is not None:
+                rest = parts[i:]
+                if len(rest) == 1:
+                    return '.'.join(parts[:i]), rest[0]
+                break
+        return None
+
+    def _is_test_name(self, absolute: str, base: bool = False) -> bool:
+        if absolute in _TEST_CASE_ROOTS:
+            return True
+        if absolute.split('.')[0] == 'unittest':
+            return False
+        if self.module_file(absolute) is not None:
+            return False  # this is a module, not a class
+        split = self._split_class(absolute)
+        if split is not None:
+            return self.is_test_class(*split, base=base)
+        if base and not _is_standard(absolute):
+            # a class of an installed library (or of a library that is not
+            # installed, so that unittest reports the ImportError), that may
+            # derive from TestCase whatever its name is
+            return True
+        return _looks_like_test_case(absolute.split('.')[-1])
+
+    def _is_test_expression(self, module: str, expression: str,
+                            base: bool = False) -> bool:
+        """With `base`, the expression is used as a base class, so when it
+        cannot be resolved (a function, a computed value) it may be a test
+        case."""
+        absolute = self._resolve(module, expression)
+        if absolute is None:
+            return base or _looks_like_test_case(expression.split('.')[-1])
+        return absolute != '' and self._is_test_name(absolute, base)
+
+    def is_test_class(self, module: str, name: str,
+                      base: bool = False) -> bool:
+        """Whether the class `name` available in `module` (defined there or
+        imported) is a subclass of `unittest.TestCase`. With `base`, the name
+        is used as a base class, and is a test case unless it is known not to
+        be."""
+        key = (module, name, base)
+        if key in self._test_classes:
+            return self._test_classes[key]
+        self._test_classes[key] = False  # breaking the cycles
+        found = self._scan_module(module)
+        if found is None:
+            result = _looks_like_test_case(name)
+        else:
+            defined = [cls for cls in found[0].classes if cls.name == name]
+            if defined:
+                result = any(self._is_test_expression(module, b, base=True)
+                             for b in defined[-1].bases)
+            else:
+                result = self._is_test_expression(module, name, base)
+        self._test_classes[key] = result
+        return result
+
+    def dependencies(self, module: str) -> Set[str]:
+        """The project modules imported by the `module`, including the
+        parent packages that are imported along with them."""
+        found = self.module_file(module)
+        if found is None:
+            return set()
+        path, is_package = found
+        result: Set[str] = set()
+        for name in [module] + self.scan_file(path).dependencies:
+            absolute = _resolve_relative(module, is_package, name)
+            parts = absolute.split('.')
+            # "from m import x" where x is not a submodule depends on m only
+            while parts and self.module_file('.'.join(parts)) is None:
+                parts.pop()
+            while parts:
+                result.add('.'.join(parts))
+                parts.pop()
+        result.discard(module)
+        return result
+
+    def external_dependencies(self, module: str) -> Set[str]:
+        """The modules imported by the `module` that are not inside the
+        top level directory (as written in the source, so for
+        "from m import x" both "m" and "m.x" are included)."""
+        found = self.module_file(module)
+        if found is None:
+            return set()
+        path, _ = found
+        return {name for name in self.scan_file(path).dependencies
+                if not name.startswith('.')
+                and self.module_file(name.split('.')[0]) is None}
+
+    def class_methods(self, module: str, name: str,
+                      depth: int = 0) -> Optional[Set[str]]:
+        """The names of the functions defined in the class `name` available
+        in `module` and in its base classes. None when some of the base
+        classes are defined outside the project (except the unittest ones)."""
+        found = self._scan_module(module)
+        if found is None or depth > 10:
+            return None
+        defined = [cls for cls in found[0].classes if cls.name == name]
+        if not defined:
+            absolute = self._resolve(module, name)
+            split = self._split_class(absolute) if absolute else None
+            if split is None or split == (module, name):
+                return None
+            return self.class_methods(*split, depth + 1)
+        methods = set(defined[-1].methods)
+        for base in defined[-1].bases:
+            absolute = self._resolve(module, base)
+            if absolute == '' or absolute in _TEST_CASE_ROOTS:
+                continue  # object, TestCase
+            split = self._split_class(absolute) if absolute else None
+            base_methods = (self.class_methods(*split, depth + 1)
+                            if split is not None else None)
+            if base_methods is None:
+                return None
+            methods |= base_methods
+        return methods
+
+    def _class_may_match(self, absolute: Optional[str],
+                         patterns: List[str]) -> bool:
+        split = self._split_class(absolute) if absolute else None
+        if split is None:
+            # not defined in the project, so the names are unknown
+            return absolute != '' and (absolute is None
+                                       or self._is_test_name(absolute))
+        if not self.is_test_class(*split):
+            return False
+        # the tests are loaded with the IDs of the module the class is
+        # defined in, even if it is imported by another one
+        prefix = f'{split[0]}.{split[1]}.'
+        methods = self.class_methods(*split)
+        if methods is None:
+            return any(may_match_prefix(p, prefix) for p in patterns)
+        return any(fnmatch.fnmatchcase(prefix + method, p)
+                   for method in methods if method.startswith('test')
+                   for p in patterns)
+
+    def may_match_names(self, path: str, module: str,
+                        patterns: List[str]) -> bool:
+        """Whether importing the file may add the tests with the IDs
+        matching any of the `patterns` (as `TestLoader.testNamePatterns`).
+        The methods created at runtime are not seen, unless they are
+        inherited from outside the project."""
+        scan = self.scan_file(path)
+        if scan.syntax_error or scan.has_load_tests or scan.dynamic_names:
+            return True
+        is_package = (os.path.basename(path) == '__init__.py'
+                      and not module.endswith('.__init__'))
+        for cls in scan.classes:
+            if self._class_may_match(f'{module}.{cls.name}', patterns):
+                return True
+        for imported in scan.imports.values():
+            absolute = _resolve_relative(module, is_package, imported)
+            if absolute not in _TEST_CASE_ROOTS \
+                    and self.module_file(absolute) is None \
+                    and absolute.split('.')[0] != 'unittest' \
+                    and self._class_may_match(absolute, patterns):
+                return True
+        for expression in scan.assigned.values():
+            if (expression == DYNAMIC_BASE
+                    or self._is_test_expression(module, expression)) \
+                    and self._class_may_match(
+                        self._resolve(module, expression), patterns):
+                return True
+        for star in scan.star_imports:
+            star_module = _resolve_relative(module, is_package, star)
+            star_found = self.module_file(star_module)
+            if star_found is not None and self.may_match_names(
+                    star_found[0], star_module, patterns):
+                return True
+        return False
+
+    def may_contain_tests(self, path: str, module: str) -> bool:
+        """Whether importing the file may add anything to the test suite."""
+        scan = self.scan_file(path)
+        if scan.syntax_error or scan.has_load_tests or scan.dynamic_names:
+            # unittest will report the syntax error as a failed test, and
+            # the other modules decide what to add at runtime
+            return True
+        is_package = (os.path.basename(path) == '__init__.py'
+                      and not module.endswith('.__init__'))
+        if any(self.is_test_class(module, cls.name) for cls in scan.classes):
+            return True
+        for imported in scan.imports.values():
+            absolute = _resolve_relative(module, is_package, imported)
+            if absolute not in _TEST_CASE_ROOTS \
+                    and self._is_test_name(absolute):
+                return True
+        for expression in scan.assigned.values():
+            # "TestX = make()" may be a test case
+            if expression == DYNAMIC_BASE \
+                    or self._is_test_expression(module, expression):
+                return True
+        for star in scan.star_imports:
+            star_module = _resolve_relative(module, is_package, star)
+            star_found = self.module_file(star_module)
+            if star_found is not None and self.may_contain_tests(
+                    star_found[0], star_module):
+                return True
+        return False
+
+
+def _glob_tokens(pattern: str) -> List[str]:
+    # the characters and the [...] sets, as fnmatch reads them
+    tokens = []
+    i = 0
+    while i < len(pattern):
+        if pattern[i] == '[':
+            j = i + 1
+            if j < len(pattern) and pattern[j] == '!':
+                j += 1
+            if j < len(pattern) and pattern[j] == ']':
+                j += 1
+            j = pattern.find(']', j)
+            if j != -1:
+                tokens.append(pattern[i:j + 1])
+                i = j + 1
+                continue
+        tokens.append(pattern[i])
+        i += 1
+    return tokens
+
+
+def may_match_prefix(pattern: str, prefix: str) -> bool:
+    """Whether the `fnmatch.fnmatchcase` pattern matches any string that
+    starts with `prefix`."""
+    tokens = _glob_tokens(pattern)
+
+    def with_stars(states: Set[int]) -> Set[int]:
+        # "*" may match nothing
+        result = set(states)
+        for state in sorted(states):
+            while state < len(tokens) and tokens[state] == '*':
+                state += 1
+                result.add(state)
+        return result
+
+    states = {0}
+    for char in prefix:
+        states = {state + (tokens[state] != '*')
+                  for state in with_stars(states) if state < len(tokens)
+                  and (tokens[state] in ('*', '?') or tokens[state] == char
+                       or (len(tokens[state]) > 1
+                           and fnmatch.fnmatchcase(char, tokens[state])))}
+        if not states:
+            return False
+    return True
+
+
+class AllOf:
+    """A predicate that is true when all the `predicates` are. Unlike a
+    closure, it can be passed to another process."""
+
+    def __init__(self, predicates: List[Callable[[str], bool]]):
+        self.predicates = predicates
+
+    def __call__(self, name: str) -> bool:
+        return all(p(name) for p in self.predicates)
+
+
+class AnyOf(AllOf):
+    """A predicate that is true when any of the `predicates` is."""
+
+    def __call__(self, name: str) -> bool:
+        return any(p(name) for p in self.predicates)
+
+
+class NeatestLoader(TestLoader):
+    """TestLoader that does not import the modules without tests during the
+    discovery. With `static=False` it behaves like the standard loader.
+
+    `select` is a predicate called with module names. When specified, only
+    the tests from the selected modules are loaded, and other modules are not
+    imported.
+
+    With `testNamePatterns` set, the modules that cannot contain the tests
+    with the matching names are not imported either.
+
+    After `discover` the `discovered` list contains the (module name, path)
+    of each module that produced a suite, in the order of the suites.
+    The IDs of loaded tests are recorded to the `manifest`."""
+
+    suiteClass = TimingSuite
+
+    def __init__(self, static: bool = True,
+                 manifest: Optional[DiscoveryManifest] = None,
+                 select: Optional[Callable[[str], bool]] = None):
+        super().__init__()
+        self.static = static
+        self.manifest = manifest
+        self.select = select
+        self.discovered: List[Tuple[str, str]] = []
+        self._index: Optional[StaticIndex] = None
+        self._dirs_with_tests: Dict[str, bool] = {}
+        self._depth = 0
+
+    def discover(self, start_dir, pattern='test*.py', top_level_dir=None):
+        if self._depth == 0:
+            # not called by load_tests of a package
+            top = top_level_dir if top_level_dir is not None else start_dir
+            if self.manifest is None \
+                    or self.manifest.top_level_dir != os.path.abspath(top):
+                self.manifest = DiscoveryManifest(top)
+            self._index = StaticIndex(top, self.manifest)
+            self.discovered = []
+        return super().discover(start_dir, pattern=pattern,
+                                top_level_dir=top_level_dir)
+
+    def load_path(self, full_path: str, pattern: str,
+                  top_level_dir: str) -> TestSuite:
+        """Loads the tests from a module or a package that was found by
+        `discover` (in this or in another process)."""
+        top_level_dir = os.path.abspath(top_level_dir)
+        if top_level_dir not in sys.path:
+            sys.path.insert(0, top_level_dir)
+        self._top_level_dir = top_level_dir
+        tests, _ = TestLoader._find_test_path(  # type: ignore
+            self, full_path, pattern)
+        return tests if tests is not None else self.suiteClass()
+
+    def _selected(self, full_path: str) -> bool:
+        if self.select is None:
+            return True
+        name = self._get_name_from_path(full_path)  # type: ignore
+        if name.endswith('.__init__'):
+            name = name[:-len('.__init__')]
+        return self.select(name)
+
+    def _file_may_contain_tests(self, full_path: str) -> bool:
+        if not self._selected(full_path):
+            return False
+        if not self.static:
+            return True
+        assert self._index is not None
+        name = self._get_name_from_path(full_path)  # type: ignore
+        if not self._index.may_contain_tests(full_path, name):
+            return False
+        if self.testNamePatterns:
+            if name.endswith('.__init__'):
+                name = name[:-len('.__init__')]
+            return self._index.may_match_names(full_path, name,
+                                               self.testNamePatterns)
+        return True
+
+    def _dir_may_contain_tests(self, full_path: str, pattern: str) -> bool:
+        known = self._dirs_with_tests.get(full_path)
+        if known is not None:
+            return known
+        self._dirs_with_tests[full_path] = False
+        result = self._file_may_contain_tests(
+            os.path.join(full_path, '__init__.py'))
+        if not result:
+            for entry in sorted(os.listdir(full_path)):
+                path = os.path.join(full_path, entry)
+                if os.path.isfile(path):
+                    if VALID_MODULE_NAME.match(entry) \
+                            and self._match_path(entry, path, pattern) \
+                            and self._file_may_contain_tests(path):
+                        result = True
+                        break
+                elif os.path.isfile(os.path.join(path, '__init__.py')):
+                    if self._dir_may_contain_tests(path, pattern):
+                        result = True
+                        break
+        self._dirs_with_tests[full_path] = result
+        return result
+
+    def _find_test_path(self, full_path, pattern, *args, **kwargs):
+        filtering = self._depth == 0 \
+                    and (self.static or self.select is not None)
+        is_package = os.path.isdir(full_path)
+        if filtering:
+            basename = os.path.basename(full_path)
+            if not is_package:
+                if VALID_MODULE_NAME.match(basename) \
+                        and self._match_path(basename, full_path, pattern) \
+                        and not self._file_may_contain_tests(full_path):
+                    return None, False
+            elif os.path.isfile(os.path.join(full_path, '__init__.py')):
+                if not self._dir_may_contain_tests(full_path, pattern):
+                    return None, False
+
+        self._depth += 1
+        try:
+            tests, should_recurse = super()._find_test_path(
+                full_path, pattern, *args, **kwargs)
+        finally:
+            self._depth -= 1
+
+        if tests is None or self._depth > 0:
+            return tests, should_recurse
+
+        module_file = full_path
+        if is_package:
+            module_file = os.path.join(module_file, '__init__.py')
+            if filtering and should_recurse \
+                    and not self._file_may_contain_tests(module_file):
+                # the package was imported only for its subpackages
+                return None, should_recurse
+
+        self.discovered.append(
+            (self._get_name_from_path(full_path), full_path))
+        # only some of the tests are loaded with the name patterns
+        if os.path.isfile(module_file) and self.manifest is not None \
+                and not self.testNamePatterns:
+            self.manifest.set_tests(module_file,
+                                    [t.id() for t in iterate_tests(tests)])
+        return tests, should_recurse
+
+
+def iterate_tests(suite):
+    """Yields the test cases of the suite, flattening the nested suites."""
+    if isinstance(suite, TestSuite):
+        for item in suite:
+            yield from iterate_tests(item)
+    else:
+        yield suite
+
+
+def filter_suite(suite: TestSuite,
+                 predicate: Callable[[str], bool]) -> TestSuite:
+    """Returns a copy of the suite (keeping the nesting, so the fixtures
+    are called the same way) with only the tests whose IDs match the
+    predicate."""
+    result = suite.__class__()
+    for item in suite:
+        if isinstance(item, TestSuite):
+            filtered = filter_suite(item, predicate)
+            if filtered.countTestCases() > 0:
+                result.addTest(filtered)
+        elif predicate(item.id()):
+            result.addTest(item)
+    return result
+
+
+def _runs(keys: List) -> List:
+    # the keys without the consecutive repeats
+    return [key for i, key in enumerate(keys) if i == 0 or keys[i - 1] != key]
+
+
+def group_fixtures(suite: TestSuite) -> TestSuite:
+    """Returns the suite where the tests of each module, and the tests of
+    each class within the module, are next to each other, so `setUpModule`
+    and `setUpClass` are called once for them. The modules and the classes
+    keep the order they first appear in.
+
+    If the tests are already grouped, the same suite is returned."""
+    tests = list(iterate_tests(suite))
+    modules = _runs([test.__class__.__module__ for test in tests])
+    classes = _runs([test.__class__ for test in tests])
+    if len(set(modules)) == len(modules) and len(set(classes)) == len(classes):
+        return suite
+
+    grouped: Dict[str, Dict[type, List]] = {}
+    for test in tests:
+        grouped.setdefault(test.__class__.__module__, {}) \
+            .setdefault(test.__class__, []).append(test)
+    result = suite.__class__()
+    for module_classes in grouped.values():
+        result.addTest(suite.__class__(suite.__class__(class_tests)
+                                       for class_tests in
+                                       module_classes.values()))
+    return result
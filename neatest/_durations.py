@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+from statistics import median
+from typing import Dict, List, Optional
+
+from neatest._cache import CacheDir
+from neatest._worker import Unit
+
+
+def class_id(test_id: str) -> str:
+    return test_id.rsplit('.', 1)[0]
+
+
+class DurationHistory:
+    """How long the tests, the classes and the modules took in the previous
+    runs (in seconds). The latest known duration of each item is kept."""
+
+    FILE_NAME = 'durations.json'
+
+    def __init__(self, cache: Optional[CacheDir]):
+        self.cache = cache
+        self.tests: Dict[str, float] = {}
+        self.modules: Dict[str, float] = {}
+
+        data = cache.read(self.FILE_NAME) if cache is not None else None
+        if isinstance(data, dict):
+            self.tests = data.get('tests') or {}
+            self.modules = data.get('modules') or {}
+
+    def classes(self) -> Dict[str, float]:
+        result: Dict[str, float] = {}
+        for test_id, seconds in self.tests.items():
+            key = class_id(test_id)
+            result[key] = result.get(key, 0.0) + seconds
+        return result
+
+    def update(self, tests: Dict[str, float], modules: Dict[str, float]):
+        self.tests.update(tests)
+        self.modules.update(modules)
+
+    def save(self):
+        if self.cache is not None:
+            self.cache.write(self.FILE_NAME,
+                             {'tests': self.tests,
+                              'classes': self.classes(),
+                              'modules': self.modules})
+
+    def estimate(self, unit: Unit) -> Optional[float]:
+        """Expected duration of the unit, or None if it was never timed."""
+        if unit.test_ids is None:
+            return self.modules.get(unit.name)
+        known = [self.tests[i] for i in unit.test_ids if i in self.tests]
+        if len(known) < len(unit.test_ids):
+            return None
+        return sum(known)
+
+
+def longest_first(units: List[Unit],
+                  history: DurationHistory) -> List[Unit]:
+    """Orders the units for the workers taking them from a shared queue.
+
+    Taking the longest units first, the workers finish at nearly the same
+    time (the LPT scheduling). The units that were never timed are expected
+    to take the median time per test. Without any history, the units with
+    more tests go first."""
+    estimates = [history.estimate(unit) for unit in units]
+    per_test = [seconds / unit.total
+                for unit, seconds in zip(units, estimates)
+                if seconds is not None and unit.total > 0]
+    default_per_test = median(per_test) if per_test else 1.0
+
+    def key(index: int) -> float:
+        seconds = estimates[index]
+        if seconds is None:
+            seconds = units[index].total * default_per_test
+        return -seconds
+
+    # sorted() is stable, so the units with the same estimate keep the order
+    return [units[i] for i in sorted(range(len(units)), key=key)]
@@ -0,0 +1,104 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Selecting the tests affected by the changed files.
+
+The import graph of the project is built from the sources (the parsed files
+are cached by `DiscoveryManifest`). A test module is affected, when it
+imports one of the changed modules directly or through other modules."""
+
+import os
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+from neatest._discovery import StaticIndex
+
+
+def project_files(top_level_dir: str) -> Iterator[str]:
+    """Yields the .py files that can be imported from the top level
+    directory: the modules in it and everything inside the packages."""
+    for entry in sorted(os.listdir(top_level_dir)):
+        path = os.path.join(top_level_dir, entry)
+        if entry.endswith('.py') and os.path.isfile(path):
+            yield path
+        elif not entry.startswith('.') \
+                and os.path.isfile(os.path.join(path, '__init__.py')):
+            yield from project_files(path)
+
+
+def module_name(top_level_dir: str, path: str) -> Optional[str]:
+    """The name the file is imported by, or None if the file is not inside
+    the top level directory."""
+    relative = os.path.relpath(os.path.abspath(path),
+                               os.path.abspath(top_level_dir))
+    if relative.startswith('..') or not relative.endswith('.py'):
+        return None
+    parts = relative[:-len('.py')].split(os.sep)
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts) or None
+
+
+def _parse_time(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def changed_since(top_level_dir: str, since: str) -> Optional[List[str]]:
+    """Returns the .py files changed after the moment `since`.
+
+    The `since` is a POSIX timestamp, an ISO 8601 date and time, a file
+    (its modification time is the baseline), or a git revision. Only the last
+    option needs a VCS. Returns None if `since` is none of them."""
+    timestamp = _parse_time(since)
+    if timestamp is None and os.path.exists(since):
+        timestamp = os.path.getmtime(since)
+    if timestamp is not None:
+        return [path for path in project_files(top_level_dir)
+                if os.path.getmtime(path) > timestamp]
+
+    try:
+        output = subprocess.run(
+            ['git', 'diff', '--name-only', '--relative', since, '--'],
+            cwd=top_level_dir, capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [str(Path(top_level_dir) / line)
+            for line in output.splitlines()
+            if line.endswith('.py')]
+
+
+class ImportGraph:
+    """Dependencies between the modules of the project."""
+
+    def __init__(self, index: StaticIndex):
+        self.index = index
+        # module -> modules that import it
+        self.importers: Dict[str, Set[str]] = {}
+        for path in project_files(index.top_level_dir):
+            name = module_name(index.top_level_dir, path)
+            if name is None:
+                continue
+            for dependency in index.dependencies(name):
+                self.importers.setdefault(dependency, set()).add(name)
+
+    def affected(self, changed_modules: Set[str]) -> Set[str]:
+        """The changed modules and all the modules importing them, directly
+        or indirectly."""
+        result = set(changed_modules)
+        stack = list(changed_modules)
+        while stack:
+            for importer in self.importers.get(stack.pop(), ()):
+                if importer not in result:
+                    result.add(importer)
+                    stack.append(importer)
+        return result
@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Measuring how long the modules take to import during the discovery.
+
+Like `python -X importtime`, but aggregated: each module is imported once,
+and the time is attributed to the test module that caused the import."""
+
+import importlib._bootstrap as bootstrap  # type: ignore
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    # seconds, including the nested imports
+    cumulative: float
+    # seconds, excluding the nested imports
+    own: float
+    # the outermost import in progress: the test module imported by the
+    # loader, or the module itself
+    imported_by: str
+
+
+class ImportProfiler:
+    """Replaces the function of `importlib` that loads the modules not yet in
+    `sys.modules`, while used as a context manager. Only the imports in the
+    thread that entered the context are measured."""
+
+    def __init__(self):
+        self.timings: List[ImportTiming] = []
+        # the modules being imported and the time of their nested imports
+        self._stack: List[List] = []
+        self._original = None
+        self._thread: Optional[int] = None
+
+    def _find_and_load(self, name, *args, **kwargs):
+        if threading.get_ident() != self._thread:
+            return self._original(name, *args, **kwargs)
+        self._stack.append([name, 0.0])
+        start = time.perf_counter()
+        try:
+            return self._original(name, *args, **kwargs)
+        finally:
+            cumulative = time.perf_counter() - start
+            _, nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] += cumulative
+            root = self._stack[0][0] if self._stack else name
+            self.timings.append(
+                ImportTiming(name, cumulative, cumulative - nested, root))
+
+    def __enter__(self):
+        self._thread = threading.get_ident()
+        self._original = bootstrap._find_and_load
+        bootstrap._find_and_load = self._find_and_load
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        bootstrap._find_and_load = self._original
+        self._thread = None
+
+
+def slowest_imports(timings: List[ImportTiming],
+                    count: int) -> List[ImportTiming]:
+    """The `count` modules that took the longest by themselves, or all of
+    them if `count` is 0."""
+    ordered = sorted(timings, key=lambda t: t.own, reverse=True)
+    return ordered[:count] if count > 0 else ordered
+
+
+def format_import(timing: ImportTiming) -> str:
+    via = '' if timing.imported_by == timing.module \
+        else f'  (by {timing.imported_by})'
+    return (f'{timing.own:9.3f}s self {timing.cumulative:9.3f}s cumulative  '
+            f'{timing.module}{via}')
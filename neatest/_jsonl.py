@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Streaming the events of the run as JSON Lines.
+
+Each event is a JSON object on a separate line with the "event" and "time"
+keys. The lines are flushed as soon as they are written, so the output can be
+followed while the tests are running:
+
+    {"event": "run_start", "tests": N, "jobs": N}
+    {"event": "start", "test": ID}
+    {"event": "outcome", "test": ID, "outcome": OUTCOME, "details": TEXT}
+    {"event": "duration", "kind": KIND, "name": ID, "wall": S, "cpu": S}
+    {"event": "memory", "test": ID, "peak": BYTES, "retained": BYTES}
+    {"event": "warning", "test": ID, "category": NAME, "message": TEXT,
+     "filename": PATH, "lineno": N, "count": N}
+    {"event": "end", "test": ID, "stdout": N, "stderr": N}
+    {"event": "run_end", "run": N, "failures": N, ...}
+
+OUTCOME is one of "success", "failure", "error", "skip", "expected_failure",
+"unexpected_success". The failures of subtests have the IDs of the subtests.
+"stdout" and "stderr" are the numbers of characters captured in the buffer
+mode. The "memory" events are written only when the memory is measured.
+Each distinct warning is reported once per test with the number of
+times it was caught. The warnings are reported after the test they were
+caught in, with "test" null for the warnings caught outside the tests. The
+warnings hidden by `ignore_warnings` are not reported."""
+
+import json
+import os
+import sys
+import time
+from typing import Callable, Optional, TextIO
+
+
+class JsonLinesReporter:
+    def __init__(self, stream: TextIO,
+                 on_close: Optional[Callable[[], None]] = None):
+        self.stream = stream
+        self._on_close = on_close
+
+    def emit(self, event: str, **fields):
+        fields = {'event': event, 'time': time.time(), **fields}
+        self.stream.write(json.dumps(fields, default=str) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+
+def open_reporter(destination: str) -> JsonLinesReporter:
+    """Opens the reporter writing to the file at the `destination` path, to
+    the file descriptor if `destination` is a number, or to stdout if it is
+    "-". In the last case, everything else written to stdout (also by the
+    worker processes) is redirected to stderr until the reporter is
+    closed."""
+    if destination.isdigit():
+        stream = os.fdopen(int(destination), 'w', closefd=False)
+        return JsonLinesReporter(stream, stream.close)
+
+    if destination == '-':
+        sys.stdout.flush()
+        assert sys.__stdout__ is not None and sys.__stderr__ is not None
+        stdout_fd = sys.__stdout__.fileno()
+        saved_fd = os.dup(stdout_fd)
+        os.dup2(sys.__stderr__.fileno(), stdout_fd)
+        stream = os.fdopen(os.dup(saved_fd), 'w')
+
+        def restore():
+            stream.close()
+            sys.stdout.flush()
+            os.dup2(saved_fd, stdout_fd)
+            os.close(saved_fd)
+
+        return JsonLinesReporter(stream, restore)
+
+    stream = open(destination, 'w', encoding='utf-8')
+    return JsonLinesReporter(stream, stream.close)
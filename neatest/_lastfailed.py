@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import re
+from typing import Iterable, Optional, Set
+
+from neatest._cache import CacheDir
+
+# the IDs of errors in the fixtures look like "setUpClass (module.Class)"
+_FIXTURE_ERROR = re.compile(
+    r'^(?:setUpClass|tearDownClass|setUpModule|tearDownModule) \((.+)\)$')
+
+# the IDs of tests created by the loader for the modules failed to import
+_LOADER_PREFIXES = ('unittest.loader._FailedTest.',
+                    'unittest.loader.ModuleSkipped.')
+
+
+def failure_key(test_id: str) -> str:
+    """Converts the ID of a failed item to the ID of what should be rerun:
+    the test for a subtest, the class or the module for a fixture."""
+    match = _FIXTURE_ERROR.match(test_id)
+    if match:
+        return match.group(1)
+    # "module.Class.test_method (param=1)" for subtests
+    return test_id.split(' ', 1)[0]
+
+
+def _is_within(test_id: str, key: str) -> bool:
+    return test_id == key or test_id.startswith(key + '.')
+
+
+class LastFailed:
+    """IDs of the tests (or classes, or modules) that failed in the previous
+    runs and did not pass since then."""
+
+    FILE_NAME = 'lastfailed.json'
+
+    def __init__(self, cache: Optional[CacheDir]):
+        self.cache = cache
+        data = cache.read(self.FILE_NAME) if cache is not None else None
+        self.keys: Set[str] = set(data) if isinstance(data, list) else set()
+
+    def matches(self, test_id: str) -> bool:
+        key = failure_key(test_id)
+        return any(_is_within(key, k) for k in self.keys)
+
+    def may_be_in_module(self, module: str) -> bool:
+        """Whether the module may contain the failed tests, judging by their
+        IDs. The tests may also be imported from other modules."""
+        for key in self.keys:
+            for prefix in _LOADER_PREFIXES:
+                if key.startswith(prefix):
+                    key = key[len(prefix):]
+            if _is_within(key, module) or _is_within(module, key):
+                return True
+        return False
+
+    def update(self, failed_ids: Iterable[str], run_ids: Iterable[str]):
+        """Forgets the failures of the tests that ran this time, and adds the
+        new failures. The failures of the tests that were not run are kept."""
+        run_keys = {failure_key(i) for i in run_ids}
+        self.keys = {key for key in self.keys
+                     if not any(_is_within(r, key) for r in run_keys)}
+        self.keys.update(failure_key(i) for i in failed_ids)
+
+    def save(self):
+        if self.cache is not None:
+            self.cache.write(self.FILE_NAME, sorted(self.keys))
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import gc
+import tracemalloc
+from typing import List, NamedTuple, Optional
+
+
+class MemoryUsage(NamedTuple):
+    test: str
+    # bytes allocated by the test at the peak
+    peak: int
+    # bytes allocated by the test and still not freed when it stopped
+    retained: int
+
+
+class MemoryTracker:
+    """Measures the memory allocated by each test with `tracemalloc`.
+
+    The tracing is started anew for each test and stopped after it, so only
+    the allocations made during the test are counted, and the code between
+    the tests runs at full speed. The memory kept by the attributes of the
+    test case counts as retained."""
+
+    def __init__(self):
+        self._test_id: Optional[str] = None
+
+    def start_test(self, test_id: str):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start()
+        self._test_id = test_id
+
+    def stop_test(self, test_id: str) -> Optional[MemoryUsage]:
+        if self._test_id != test_id or not tracemalloc.is_tracing():
+            # the test stopped the tracing by itself
+            self._test_id = None
+            return None
+        self._test_id = None
+        peak = tracemalloc.get_traced_memory()[1]
+        # the garbage in reference cycles is not retained
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return MemoryUsage(test_id, peak, retained)
+
+
+def largest(usages: List[MemoryUsage], count: int) -> List[MemoryUsage]:
+    """The `count` tests with the highest peak, or all of them if `count`
+    is 0."""
+    ordered = sorted(usages, key=lambda u: u.peak, reverse=True)
+    return ordered[:count] if count > 0 else ordered
+
+
+def exceeding(usages: List[MemoryUsage], peak_limit: Optional[int],
+              leak_limit: Optional[int]) -> List[MemoryUsage]:
+    """The tests that allocated more than `peak_limit` bytes at the peak or
+    retained more than `leak_limit` bytes."""
+    return [u for u in usages
+            if (peak_limit is not None and u.peak > peak_limit)
+            or (leak_limit is not None and u.retained > leak_limit)]
+
+
+def format_memory(usage: MemoryUsage) -> str:
+    mib = 1024 * 1024
+    return (f'{usage.peak / mib:9.3f} MiB peak '
+            f'{usage.retained / mib:9.3f} MiB retained  {usage.test}')
@@ -2,18 +2,51 @@
 # SPDX-License-Identifier: MIT
 
 import argparse
-import io
+import contextlib
+import functools
+import importlib
+import os
 import subprocess
 import sys
-import unittest
+import time
 import warnings as wrn
 from enum import Enum, IntEnum
 from json import dumps
 from pathlib import Path
-from typing import List, Optional, Union, NamedTuple
-from unittest import TextTestRunner, TestSuite, TestLoader, TestResult
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, \
+    Set, Union, NamedTuple, Tuple, cast
+from unittest import TextTestRunner, TestSuite, TestResult
 
 import neatest._constants
+from neatest._cache import CacheDir, CACHE_DIR_NAME
+from neatest._capture import CaptureBuffer, CaptureLimits, \
+    DEFAULT_CAPTURE_MEMORY, DEFAULT_OUTPUT_LIMIT
+from neatest._concurrent import group_concurrent
+from neatest._discovery import NeatestLoader, DiscoveryManifest, \
+    iterate_tests, StaticIndex, filter_suite, group_fixtures, AllOf, AnyOf
+from neatest._durations import DurationHistory, class_id, longest_first
+from neatest._impact import ImportGraph, changed_since, module_name
+from neatest._imports import ImportProfiler, ImportTiming, \
+    format_import, slowest_imports
+from neatest._jsonl import open_reporter
+from neatest._lastfailed import LastFailed
+from neatest._memory import MemoryTracker, exceeding, format_memory, largest
+from neatest._parallel import ProcessPoolSuite, default_preload, \
+    forkserver_context, discover_in_processes
+from neatest._requirements import SatisfiedRequirements, unsatisfied
+from neatest._remote import AddressError, SocketPoolSuite, parse_address, \
+    run_worker
+from neatest._result import NeatestResult
+from neatest._shards import Shard, merge_main, parse_shard, \
+    read_test_durations, split_classes, write_result_file
+from neatest._threads import ThreadPoolSuite, is_serial
+from neatest._profiler import OUTSIDE, SamplingProfiler, format_hot, \
+    hottest, write_profile
+from neatest._timeout import TimeoutWatchdog
+from neatest._timing import TimingSuite, slowest, format_timing, total_time
+from neatest._warnings import WarningsCollector
+from neatest._watch import watch as watch_changes
+from neatest._worker import Unit, WorkerOptions
 
 
 class NeatestError(Exception):
@@ -36,6 +69,42 @@ class WarningsError(NeatestError):
         super().__init__("Testing failed due to warnings.")
 
 
+class MemoryLimitError(NeatestError):
+    def __init__(self):
+        super().__init__("Testing failed due to memory limits.")
+
+
+class TotalTimeoutError(NeatestError):
+    def __init__(self, not_run: int):
+        super().__init__(f"Testing failed: {not_run} tests were not run "
+                         f"in the total timeout.")
+
+
+class AddressFormatError(NeatestError):
+    def __init__(self, address: str):
+        super().__init__(f'Wrong address "{address}": expected HOST:PORT '
+                         f'or PORT')
+
+
+class ShardError(NeatestError):
+    def __init__(self, shard: str):
+        super().__init__(f'Wrong shard "{shard}": expected NUMBER/TOTAL '
+                         f'with NUMBER from 1 to TOTAL')
+
+
+class ChangesError(NeatestError):
+    def __init__(self, since: str):
+        super().__init__(f'Cannot find the changes since "{since}": '
+                         f'it is neither a time, nor a file, '
+                         f'nor a git revision')
+
+
+class BackendError(NeatestError):
+    def __init__(self, backend: str):
+        super().__init__(f'The {backend} backend is not available '
+                         f'on this platform')
+
+
 class ModulesNotFoundError(NeatestError):
     def __init__(self, top_level_dir: Path):
         super().__init__(f'Cannot find a module directory (with __init__.py) '
@@ -85,6 +154,15 @@ class Warnings(Enum):
     fail = "fail"
 
 
+class Backend(Enum):
+    # the workers are started the default way for the platform
+    process = "process"
+    # the workers are forked from a server with the dependencies imported
+    forkserver = "forkserver"
+    # the modules are run in threads of the main process
+    thread = "thread"
+
+
 class Verbosity(IntEnum):
     quiet = 0
     normal = 1
@@ -94,11 +172,28 @@ class Verbosity(IntEnum):
 splitter = '-' * 70
 
 
-def install_requirements(tests_require: List[str]):
-    if subprocess.call(
-            [sys.executable, "-m", "pip",
-             "install"] + tests_require) != 0:
-        raise InstallationError
+def install_requirements(tests_require: List[str],
+                         cache: Optional[CacheDir] = None):
+    """Runs `pip install` for the requirements that are not installed yet.
+
+    If all the requirements were satisfied last time, and no packages were
+    installed or removed since then, not even the check is done."""
+    satisfied = SatisfiedRequirements(cache)
+    if tests_require in satisfied:
+        return
+    missing = unsatisfied(tests_require)
+    if missing:
+        if subprocess.call(
+                [sys.executable, "-m", "pip",
+                 "install"] + missing) != 0:
+            raise InstallationError
+        importlib.invalidate_caches()
+        if unsatisfied(missing):
+            # cannot be checked, or pip did not do it
+            return
+    else:
+        print(f'All {len(tests_require)} requirements are already installed')
+    satisfied.add(tests_require)
 
 
 default_pattern = '*.py'
@@ -110,6 +205,7 @@ default_warnings_handling = Warnings.print
 
 class RunResult(NamedTuple):
     tests: TestResult
+    # the first occurrence of each distinct warning, except the ignored ones
     warnings: List[wrn.WarningMessage]
 
 
@@ -132,14 +228,16 @@ def set_warnings_filter(w: PythonWarningsArgs):
 
 
 class TempMute:
-    def __init__(self):
+    def __init__(self, capture: CaptureLimits = CaptureLimits()):
         self.old_stdout = sys.stdout
         self.old_stderr = sys.stderr
-        sys.stdout = io.StringIO()
-        sys.stderr = io.StringIO()
+        sys.stdout = CaptureBuffer(capture)
+        sys.stderr = CaptureBuffer(capture)
 
     def unmute(self):
         if self.old_stdout is not None:
+            sys.stdout.close()
+            sys.stderr.close()
             sys.stdout = self.old_stdout
             sys.stderr = self.old_stderr
             self.old_stdout = None
@@ -155,6 +253,76 @@ def _remove_those_contain(
             if not any(bad in item for bad in bad_substrings)]
 
 
+def _module_durations(unit_test_ids: Dict[str, List[str]],
+                      test_durations: Dict[str, float]) -> Dict[str, float]:
+    # only the modules where all the tests were run
+    return {name: sum(test_durations[i] for i in ids)
+            for name, ids in unit_test_ids.items()
+            if all(i in test_durations for i in ids)}
+
+
+class _Module(NamedTuple):
+    # to run the tests in a worker
+    unit: Unit
+    # None if the tests were loaded by another process
+    suite: Optional[TestSuite]
+    # all the tests of the unit
+    test_ids: List[str]
+
+
+def _filter_module(module: _Module,
+                   predicate: Callable[[str], bool]) -> _Module:
+    ids = [i for i in module.test_ids if predicate(i)]
+    suite = (filter_suite(module.suite, predicate)
+             if module.suite is not None else None)
+    return _Module(module.unit._replace(test_ids=ids, total=len(ids)),
+                   suite, ids)
+
+
+def _failed_first(modules: List[_Module],
+                  is_failed: Callable[[str], bool]) \
+        -> Tuple[List[_Module], List[_Module]]:
+    # splits the modules into the ones with the failed tests and the rest of
+    # them. The modules are not split, so their fixtures are called once
+    first: List[_Module] = []
+    rest: List[_Module] = []
+    for module in modules:
+        failed = any(is_failed(test_id) for test_id in module.test_ids)
+        (first if failed else rest).append(module)
+    return first, rest
+
+
+def _select_shard(modules: List[_Module], shard: Shard,
+                  durations_file: Optional[str],
+                  manifest: DiscoveryManifest) -> List[_Module]:
+    # keeps the tests of the shard. Only the durations from the file are
+    # used, so all the runners get the same split. The modules with
+    # setUpModule or tearDownModule are not split
+    together = {module.unit.name for module in modules
+                if os.path.isfile(module.unit.path)
+                and manifest.scan(module.unit.path).has_module_fixtures}
+    groups = {test_id: (module.unit.name if module.unit.name in together
+                        else class_id(test_id))
+              for module in modules for test_id in module.test_ids}
+    durations: Dict[str, float] = {}
+    if durations_file is not None:
+        try:
+            durations = read_test_durations(durations_file)
+        except (OSError, ValueError):
+            print(f'Cannot read "{durations_file}", splitting by the number '
+                  f'of tests')
+    parts = split_classes([i for module in modules for i in module.test_ids],
+                          shard.total, durations, groups.__getitem__)
+    selected = set(parts[shard.number - 1])
+    result: List[_Module] = []
+    for module in modules:
+        if all(i in selected for i in module.test_ids):
+            result.append(module)
+        elif any(i in selected for i in module.test_ids):
+            result.append(_filter_module(module, selected.__contains__))
+    return result
+
+
 def run(
         tests_require: Optional[List[str]] = None,
         start_directory: Optional[
@@ -166,12 +334,44 @@ def run(
         warnings: Warnings = default_warnings_handling,
         ignore_warnings: List[str] = None,
         json=False,
+        static_discovery=False,
+        cache=True,
+        clear_cache=False,
+        jobs=1,
+        durations: Optional[int] = None,
+        changed: Optional[List[str]] = None,
+        affected_since: Optional[str] = None,
+        last_failed=False,
+        failed_first=False,
+        watch=False,
+        backend: Backend = Backend.process,
+        preload: Optional[List[str]] = None,
+        jsonl: Optional[str] = None,
+        capture_memory: int = DEFAULT_CAPTURE_MEMORY,
+        output_limit: Optional[int] = DEFAULT_OUTPUT_LIMIT,
+        profile_imports: Optional[int] = None,
+        memory: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        leak_limit: Optional[int] = None,
+        async_concurrency: int = 0,
+        async_timeout: Optional[float] = None,
+        serve: Optional[str] = None,
+        shard: Optional[str] = None,
+        durations_file: Optional[str] = None,
+        result_file: Optional[str] = None,
+        timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+        profile: Optional[str] = None,
+        profile_top: int = 10,
+        name_patterns: Optional[List[str]] = None,
 ) -> RunResult:
     """Discovers and runs unit tests for module or modules.
 
     tests_require: Dependent modules to install with `pip install` before
     running tests. These are modules that are used for testing but are not
-    needed in production.
+    needed in production. Pip is only run for the requirements that are not
+    installed yet (the version specifiers are checked if the `packaging`
+    library is installed).
 
     pattern: Mask for the names of the python files that contain the tests.
 
@@ -195,12 +395,205 @@ def run(
     ignore_warnings: Allows you to hide individual warnings. If any of the
     listed strings is found in the warning message, the message will not
     be displayed.
+
+    static_discovery: Parse the sources before importing them and import only
+    the modules that may contain tests. A module that defines no test cases
+    is then not imported, so if it fails to import, the error is not
+    reported, unlike with `unittest discover`. With False, every module
+    matching the pattern is imported.
+
+    cache: Keep the results of parsing the sources in the `.neatest_cache`
+    directory, so the next run only parses the files that changed. With
+    `jobs`, the test IDs found are kept too, and the next run reuses them
+    without the discovery if no file in the project and no installed package
+    changed.
+
+    clear_cache: Delete the `.neatest_cache` directory before running.
+
+    jobs: Number of processes to run the tests in. Each of the modules is run
+    entirely by one of the processes. 0 means the number of CPUs. The modules
+    that took longer in the previous runs are started first.
+
+    durations: Print the wall and CPU time of the N slowest tests,
+    `setUpClass`, `setUpModule`, `tearDownClass` and `tearDownModule` calls,
+    and the total time of the tests and of the fixtures. 0 means all of them.
+    The times are also available as `RunResult.tests.timings`.
+
+    changed: Run only the test modules that import any of these files,
+    directly or through other modules of the project. The imports are found
+    by parsing the sources.
+
+    affected_since: Like `changed`, but the changed files are the ones
+    modified after the moment. It can be a POSIX timestamp, ISO 8601 date and
+    time, a path to a file (its modification time) or a git revision.
+
+    last_failed: Run only the tests that failed the last time they were run.
+    The failures are kept in the `.neatest_cache` directory. If no failures
+    are recorded, all the tests are run.
+
+    failed_first: Run the modules with the tests that failed the last time
+    before the rest of them. Combined with `failfast`, stops soon after a
+    known failure repeats. The modules are not split, so `setUpModule` and
+    `setUpClass` are called once.
+
+    watch: After running the tests, keep watching the sources and rerun the
+    tests affected by each change, until interrupted with Ctrl+C. The changed
+    modules and the modules importing them are imported again, other modules
+    stay imported. Returns the result of the last run and does not exit.
+
+    backend: How the worker processes are started. With `Backend.forkserver`
+    the `preload` modules are imported once by a server process, and the
+    workers are forked from it with the modules already imported. The tests
+    are run in a worker process even if `jobs` is 1. Not available on Windows.
+    With `Backend.thread`, the modules are run in `jobs` threads of the main
+    process. The modules with the classes marked with `neatest_serial = True`
+    are run after the others, one at a time.
+
+    preload: The modules for the fork server to import. By default, these are
+    the modules from outside the project imported by the test modules and by
+    the project modules they import.
+
+    jsonl: Write the events of the run (the start, outcome and end of each
+    test, durations, warnings) to the file at this path as JSON Lines, as they
+    happen. A number means a file descriptor, "-" means stdout (in that case
+    the rest of the output goes to stderr). The format is described in
+    `neatest._jsonl`.
+
+    capture_memory: How many bytes of the captured output (with `buffer`)
+    to keep in memory. The rest is written to a temporary file. The output of
+    a test is discarded as soon as the test passes.
+
+    output_limit: How many bytes of the captured output to show for a failed
+    test. The beginning and the end of the output are shown. None means no
+    limit.
+
+    profile_imports: Print the N modules that took the longest to import
+    during the discovery, not counting the time of the modules they import,
+    and the test modules that imported them. 0 means all of them.
+
+    memory: Measure the memory allocated by each test with `tracemalloc` and
+    print the N tests with the highest peak, and how much of the memory each
+    of them did not free. 0 means all of them. The tests run slower while
+    the memory is measured. The measurements are also available as
+    `RunResult.tests.memory_usages`. The memory is not measured with
+    `Backend.thread`, since the threads share it.
+
+    memory_limit: Fail if any test allocated more than this number of bytes
+    at the peak. Implies measuring the memory.
+
+    leak_limit: Fail if any test did not free more than this number of
+    bytes by the time it stopped. Implies measuring the memory.
+
+    async_concurrency: Run up to N tests of each `IsolatedAsyncioTestCase`
+    class with the `neatest_concurrent = True` attribute at the same time on
+    one event loop. 0 means the tests are run one by one, as usual. The
+    output of such tests is not buffered.
+
+    async_timeout: Fail the concurrently run async tests that take longer
+    than this number of seconds.
+
+    serve: Run the tests on the workers connected over TCP to this address
+    ("HOST:PORT", or "PORT" for 127.0.0.1) instead of this process. The
+    workers are started with `neatest --worker HOST:PORT` in the same project
+    directory on any machine, and can connect at any time. The tests of the
+    workers that disconnect are given to the others. `jobs` is only used to
+    discover the tests.
+
+    shard: Run only a part of the tests: "NUMBER/TOTAL", like "2/4", where
+    NUMBER is from 1 to TOTAL. The tests are split between the TOTAL parts by
+    the test classes. The split is the same for the same tests and the same
+    `durations_file`, so the parts can be run on different machines.
+
+    durations_file: The durations of the tests from the previous runs, to
+    split the tests into the shards of nearly the same duration. The file is
+    written by `neatest merge --durations-file`, the `durations.json` from
+    the `.neatest_cache` directory can also be used. Without the file, the
+    shards have nearly the same number of tests.
+
+    result_file: Write the summary of the run, the failures and the
+    durations of the tests to this JSON file. The files of the shards are
+    combined with `neatest merge FILE...`.
+
+    timeout: Interrupt the tests that take longer than this number of
+    seconds, print the stacks of all the threads and report the test as an
+    error. The limit for the tests of a class can be set by its
+    `neatest_timeout` attribute. A worker process that cannot interrupt the
+    test exits and is replaced by another one. The tests are not interrupted
+    by the thread backend.
+
+    total_timeout: Interrupt the test that is running when the tests have
+    run for this number of seconds, and do not start the others. The run
+    fails if any tests were not run.
+
+    profile: Sample the stacks of the running tests every few milliseconds
+    and write them to the `neatest_profiles` subdirectory of this directory
+    in the collapsed format of the flame graph tools: `run.collapsed` for the
+    whole run, with the ID of the test at the root of each stack, and a file
+    for each test in `tests`. The functions with the most samples are printed
+    after the run.
+
+    profile_top: The number of the functions printed with `profile`
+    (0 for all).
+
+    name_patterns: Run only the tests whose IDs ("module.Class.test_method")
+    match any of these `fnmatch` patterns, like `unittest -k`. A pattern
+    without "*" matches the IDs that contain it. With `static_discovery`, the
+    test modules are parsed before importing them, so the modules without
+    the matching tests are not imported.
     """
 
     top_level_directory = default_top_level_dir
     pattern = default_pattern
 
-    temp_mute = TempMute() if json else None
+    if watch:
+        def run_changed(changed_files: Optional[List[str]]) -> RunResult:
+            first = changed_files is None
+            return run(tests_require=tests_require if first else None,
+                       start_directory=start_directory,
+                       buffer=buffer,
+                       failfast=failfast,
+                       verbosity=verbosity,
+                       exit_if_failed=False,
+                       warnings=warnings,
+                       ignore_warnings=ignore_warnings,
+                       json=json,
+                       static_discovery=static_discovery,
+                       cache=cache,
+                       clear_cache=clear_cache and first,
+                       jobs=jobs,
+                       durations=durations,
+                       changed=changed if first else changed_files,
+                       affected_since=affected_since if first else None,
+                       last_failed=last_failed and first,
+                       failed_first=failed_first,
+                       backend=backend,
+                       preload=preload,
+                       jsonl=jsonl,
+                       capture_memory=capture_memory,
+                       output_limit=output_limit,
+                       profile_imports=profile_imports,
+                       memory=memory,
+                       memory_limit=memory_limit,
+                       leak_limit=leak_limit,
+                       async_concurrency=async_concurrency,
+                       async_timeout=async_timeout,
+                       serve=serve,
+                       shard=shard,
+                       durations_file=durations_file,
+                       result_file=result_file,
+                       timeout=timeout,
+                       total_timeout=total_timeout,
+                       profile=profile,
+                       profile_top=profile_top,
+                       name_patterns=name_patterns)
+
+        return watch_changes(top_level_directory, run_changed, cache=cache)
+
+    reporter = open_reporter(jsonl) if jsonl is not None else None
+    capture = CaptureLimits(capture_memory, output_limit)
+    temp_mute = TempMute(capture) if json else None
+    track_memory = (memory is not None or memory_limit is not None
+                    or leak_limit is not None)
 
     try:
 
@@ -210,7 +603,9 @@ def run(
 
         try:
             if tests_require:
-                install_requirements(tests_require)
+                install_requirements(
+                    tests_require,
+                    CacheDir(top_level_directory) if cache else None)
                 print(splitter)
 
             if start_directory is not None:
@@ -222,23 +617,260 @@ def run(
             else:
                 start_dirs = [str(p) for p in find_start_dirs()]
 
-            suites: List[unittest.TestSuite] = []
-
-            for sd in start_dirs:
-                suite = TestLoader().discover(
-                    top_level_dir=(top_level_directory
-                                   if top_level_directory is not None else sd),
-                    start_dir=sd,
-                    pattern=pattern)
+            if clear_cache:
+                CacheDir(top_level_directory).clear()
+            manifest = DiscoveryManifest(
+                top_level_directory,
+                CacheDir(top_level_directory) if cache else None)
+
+            last_run = LastFailed(
+                CacheDir(top_level_directory) if cache else None)
+            if (last_failed or failed_first) and not last_run.keys:
+                print('No failed tests recorded, running all tests')
+            only_failed = last_failed and bool(last_run.keys)
+
+            this_shard: Optional[Shard] = None
+            if shard is not None:
+                try:
+                    this_shard = parse_shard(shard)
+                except ValueError:
+                    raise ShardError(shard) from None
+
+            selects: List[Callable[[str], bool]] = []
+            if changed is not None or affected_since is not None:
+                changed_files = list(changed or [])
+                if affected_since is not None:
+                    since_files = changed_since(top_level_directory,
+                                                affected_since)
+                    if since_files is None:
+                        raise ChangesError(affected_since)
+                    changed_files.extend(since_files)
+                changed_modules = {
+                    name for name in (module_name(top_level_directory, f)
+                                      for f in changed_files)
+                    if name is not None}
+                graph = ImportGraph(
+                    StaticIndex(top_level_directory, manifest))
+                affected = graph.affected(changed_modules)
+                selects.append(affected.__contains__)
+                print(f'Changed {len(changed_modules)} modules, '
+                      f'affected {len(affected)} modules')
+
+            if only_failed:
+                # the modules that had the failed tests, and the modules the
+                # failed tests were defined in
+                failed_modules = {
+                    module_name(top_level_directory, path)
+                    for path in manifest.files_with_tests(last_run.matches)}
+                selects.append(AnyOf([failed_modules.__contains__,
+                                      last_run.may_be_in_module]))
+
+            select = AllOf(selects) if selects else None
+
+            if name_patterns is not None:
+                name_patterns = [FromUnittestMain.convert_select_pattern(p)
+                                 for p in name_patterns]
+
+            if jobs <= 0:
+                jobs = os.cpu_count() or 1
+
+            in_threads = backend == Backend.thread and serve is None
+            in_workers = not in_threads and (
+                    jobs > 1 or backend == Backend.forkserver
+                    or serve is not None)
+            # the results of the tests are replayed from other threads or
+            # processes, where the output is buffered
+            elsewhere = in_workers or in_threads
+
+            import_timings: List[ImportTiming] = []
+
+            def discover_here(sd: str) -> List[_Module]:
+                loader = NeatestLoader(static=static_discovery,
+                                       manifest=manifest,
+                                       select=select)
+                loader.testNamePatterns = name_patterns
+                profiler = ImportProfiler()
+                with profiler if profile_imports is not None \
+                        else contextlib.nullcontext():
+                    suite = loader.discover(
+                        top_level_dir=(top_level_directory
+                                       if top_level_directory is not None
+                                       else sd),
+                        start_dir=sd,
+                        pattern=pattern)
+                import_timings.extend(profiler.timings)
+                result = []
+                for (name, path), module_suite in zip(loader.discovered,
+                                                      suite):
+                    ids = [t.id() for t in iterate_tests(module_suite)]
+                    result.append(_Module(Unit(name, path, None, len(ids)),
+                                          module_suite, ids))
+                return result
+
+            # the modules imported by the discovery in other processes
+            imported: Optional[Set[str]] = None
+
+            def discover_elsewhere() -> Iterator[List[_Module]]:
+                # the workers load the tests by themselves, so this process
+                # does not need to import the test modules. When nothing
+                # changed since the last run, the units found by it are
+                # reused and the discovery is skipped. The preloaded modules
+                # of the fork server are chosen by the discovery, and the
+                # selected tests are not cached
+                reusable = (select is None and name_patterns is None
+                            and profile_imports is None
+                            and not (backend == Backend.forkserver
+                                     and preload is None))
+                cached = {sd: (manifest.found_units(sd, pattern,
+                                                    static_discovery)
+                               if reusable else None)
+                          for sd in start_dirs}
+                discovered = discover_in_processes(
+                    [sd for sd in start_dirs if cached[sd] is None],
+                    top_level_directory, pattern,
+                    static_discovery, cache, select, jobs,
+                    profile_imports is not None, name_patterns)
+                for sd in start_dirs:
+                    units = cached[sd]
+                    if units is None:
+                        found = next(discovered)
+                        manifest.merge(found.manifest_entries)
+                        assert imported is not None
+                        imported.update(found.imported)
+                        import_timings.extend(found.imports)
+                        units = [[unit.name, unit.path, unit.test_ids or []]
+                                 for unit in found.units]
+                        if reusable:
+                            manifest.set_found_units(sd, pattern,
+                                                     static_discovery, units)
+                    yield [_Module(Unit(name, path, None, len(ids)), None,
+                                   ids)
+                           for name, path, ids in units]
+
+            discovered: Iterable[List[_Module]]
+            if in_workers:
+                imported = set()
+                discovered = discover_elsewhere()
+            else:
+                discovered = (discover_here(sd) for sd in start_dirs)
+
+            modules: List[_Module] = []
+            # IDs of the tests in the modules that are run entirely
+            unit_test_ids: Dict[str, List[str]] = {}
+
+            for sd, found in zip(start_dirs, discovered):
+                count = 0
+                for module in found:
+                    if only_failed:
+                        module = _filter_module(module, last_run.matches)
+                    if module.unit.total > 0:
+                        modules.append(module)
+                        if module.unit.test_ids is None:
+                            unit_test_ids[module.unit.name] = module.test_ids
+                    count += module.unit.total
                 print(
                     f'Package "{rel_to_top(Path(sd))}" contains '
-                    f'{suite.countTestCases()} tests')
-                if suite.countTestCases() > 0:
-                    suites.append(suite)
+                    f'{count} tests')
+
+            manifest.save()
+
+            if this_shard is not None:
+                modules = _select_shard(modules, this_shard, durations_file,
+                                        manifest)
+                print(f'Shard {this_shard} contains '
+                      f'{sum(module.unit.total for module in modules)} tests')
+
+            first: List[_Module] = []
+            if failed_first and last_run.keys:
+                first, modules = _failed_first(modules, last_run.matches)
+
+            warnings_filter = (PythonWarningsArgs.ignore
+                               if warnings == Warnings.ignore
+                               else PythonWarningsArgs.default)
+
+            history = DurationHistory(
+                CacheDir(top_level_directory) if cache else None)
+
+            context = None
+            if backend == Backend.forkserver and serve is None:
+                if preload is None:
+                    preload = default_preload(
+                        StaticIndex(top_level_directory, manifest),
+                        [module.unit.name for module in first + modules],
+                        imported)
+                try:
+                    context = forkserver_context(preload)
+                except ValueError:
+                    raise BackendError(backend.value) from None
+                print(f'Preloading {len(preload)} modules in the fork server')
+
+            deadline = (time.time() + total_timeout
+                        if total_timeout is not None else None)
+
+            runnable: Union[TestSuite, ProcessPoolSuite, ThreadPoolSuite,
+                            SocketPoolSuite]
+            if in_threads:
+                by_name: Dict[str, TestSuite] = {
+                    module.unit.name: module.suite
+                    for module in first + modules
+                    if module.suite is not None}
+                suites = [group_fixtures(by_name[unit.name]) for unit in
+                          [module.unit for module in first]
+                          + longest_first([module.unit for module in modules],
+                                          history)]
+                if async_concurrency > 0:
+                    for suite in suites:
+                        group_concurrent(suite, async_concurrency,
+                                         async_timeout)
+                runnable = ThreadPoolSuite(
+                    [suite for suite in suites if not is_serial(suite)],
+                    jobs,
+                    buffer=buffer,
+                    failfast=failfast,
+                    capture=capture,
+                    serial=[suite for suite in suites if is_serial(suite)],
+                    profile=profile is not None)
+            elif in_workers:
+                units = ([module.unit for module in first]
+                         + longest_first([module.unit for module in modules],
+                                         history))
+                options = WorkerOptions(
+                    top_level_dir=top_level_directory,
+                    pattern=pattern,
+                    buffer=buffer,
+                    failfast=failfast,
+                    warnings_filter=warnings_filter.value,
+                    mute=json,
+                    sys_path=list(sys.path),
+                    capture=capture,
+                    track_memory=track_memory,
+                    async_concurrency=async_concurrency,
+                    async_timeout=async_timeout,
+                    timeout=timeout,
+                    deadline=deadline,
+                    profile=profile is not None,
+                    name_patterns=name_patterns)
+                if serve is not None:
+                    try:
+                        address = parse_address(serve)
+                    except AddressError:
+                        raise AddressFormatError(serve)
+                    runnable = SocketPoolSuite(units, address, options,
+                                               unit_test_ids,
+                                               top_level_directory)
+                else:
+                    runnable = ProcessPoolSuite(units, jobs, options, context)
+            else:
+                runnable = group_fixtures(TimingSuite(
+                    [module.suite for module in first + modules
+                     if module.suite is not None]))
+                if async_concurrency > 0:
+                    group_concurrent(runnable, async_concurrency,
+                                     async_timeout)
 
-            combo_suite = TestSuite(suites)
+            collector = WarningsCollector(ignore_warnings, reporter)
 
-            with wrn.catch_warnings(record=True) as catcher:
+            with wrn.catch_warnings():
 
                 # with the default unittest, even if warnings are enabled, the
                 # --buffer argument makes them invisible: warnings are
@@ -249,59 +881,209 @@ def run(
                 # until they are explicitly disabled.
                 #
                 # So the run(warning=None), and we handle all the warnings
-                # manually
-
-                set_warnings_filter(
-                    PythonWarningsArgs.ignore
-                    if warnings == Warnings.ignore
-                    else PythonWarningsArgs.default)
-
-                result = TextTestRunner(buffer=buffer,
+                # manually. Each distinct warning is kept once, with the count
+
+                wrn.showwarning = collector.showwarning
+                set_warnings_filter(warnings_filter)
+
+                planned = runnable.countTestCases()
+                if reporter is not None:
+                    reporter.emit('run_start',
+                                  tests=planned,
+                                  jobs=jobs if elsewhere else 1)
+
+                # the workers interrupt their tests by themselves
+                watchdog = (TimeoutWatchdog(timeout, deadline)
+                            if not elsewhere else None)
+                # and sample their stacks
+                sampler = (SamplingProfiler()
+                           if profile is not None and not elsewhere else None)
+                if sampler is not None:
+                    sampler.start()
+
+                # in the parallel mode the output is buffered by the workers
+                runner = TextTestRunner(buffer=buffer and not elsewhere,
                                         verbosity=verbosity.value,
                                         failfast=failfast,
-                                        warnings=None).run(combo_suite)
+                                        warnings=None,
+                                        resultclass=functools.partial(
+                                            NeatestResult,
+                                            reporter=reporter,
+                                            capture=capture,
+                                            collector=collector,
+                                            memory=(MemoryTracker()
+                                                    if track_memory
+                                                    and not elsewhere
+                                                    else None),
+                                            watchdog=watchdog,
+                                            profiler=sampler))
+                # the pool suites run like a TestSuite
+                result = cast(NeatestResult,
+                              runner.run(runnable))  # type: ignore
+
+                if sampler is not None:
+                    sampler.stop()
+                    result.addProfile(OUTSIDE, sampler.take_outside())
+
+                # the warnings caught outside the tests
+                collector.flush()
+
+            history.update(result.test_durations,
+                           result.module_durations if in_workers
+                           else _module_durations(unit_test_ids,
+                                                  result.test_durations))
+            history.save()
+
+            last_run.update(
+                [test.id() for test, _ in result.failures + result.errors]
+                + [test.id() for test in result.unexpectedSuccesses],
+                result.test_durations)
+            last_run.save()
+
+            if collector.collected:
+                print()
+                print(splitter)
+                print(f"Caught {collector.total} warnings:")
+                for item in collector.collected.values():
+                    print()
+                    print(item.describe())
 
-                caught_warnings = list(catcher)
+            slowest_timings = (slowest(result.timings, durations)
+                               if durations is not None else [])
+            if slowest_timings:
+                print()
+                print(splitter)
+                print(f"Slowest {len(slowest_timings)} items:")
+                print()
+                for timing in slowest_timings:
+                    print(format_timing(timing))
 
-            formatted_warnings = [
-                wrn.formatwarning(message=w.message,
-                                  category=w.category,
-                                  filename=w.filename,
-                                  lineno=w.lineno,
-                                  line=w.line)
-                for w in caught_warnings]
+            tests_time, fixtures_time = total_time(result.timings)
+            if durations is not None:
+                print()
+                print(f"Tests took {tests_time:.3f}s, fixtures "
+                      f"{fixtures_time:.3f}s")
 
-            formatted_warnings = _remove_those_contain(formatted_warnings,
-                                                       ignore_warnings)
+            slowest_import_timings = (
+                slowest_imports(import_timings, profile_imports)
+                if profile_imports is not None else [])
+            if slowest_import_timings:
+                print()
+                print(splitter)
+                print(f"Slowest {len(slowest_import_timings)} imports:")
+                print()
+                for import_timing in slowest_import_timings:
+                    print(format_import(import_timing))
 
-            if formatted_warnings:
+            largest_usages = (largest(result.memory_usages, memory)
+                              if memory is not None else [])
+            if largest_usages:
                 print()
                 print(splitter)
-                print(f"Caught {len(caught_warnings)} warnings:")
-                for w in formatted_warnings:
-                    print()
-                    print(w)
+                print(f"Largest memory usage of {len(largest_usages)} tests:")
+                print()
+                for usage in largest_usages:
+                    print(format_memory(usage))
+
+            over_limits = exceeding(result.memory_usages, memory_limit,
+                                    leak_limit)
+            if over_limits:
+                print()
+                print(splitter)
+                print(f"{len(over_limits)} tests exceeded the memory limits:")
+                print()
+                for usage in over_limits:
+                    print(format_memory(usage))
+
+            hot_functions = (hottest(result.profile, profile_top)
+                             if profile is not None else [])
+            if profile is not None:
+                written = write_profile(profile, result.profile)
+                samples = sum(sum(stacks.values())
+                              for stacks in result.profile.values())
+                print()
+                print(splitter)
+                print(f"Hottest {len(hot_functions)} functions of {samples} "
+                      f"samples:")
+                print()
+                for hot in hot_functions:
+                    print(format_hot(hot, samples))
+                print()
+                print(f"The stacks are written to {written}")
+
+            # the tests that were not started, since the time was over
+            not_run = 0
+            if deadline is not None and time.time() >= deadline:
+                not_run = max(planned - result.testsRun, 0)
+            if not_run:
+                print()
+                print(splitter)
+                print(f"{not_run} tests were not run, since the time of the "
+                      f"run is over")
+
+            summary: Dict[str, Any] = {
+                'run': result.testsRun,
+                'skipped': len(result.skipped),
+                'failures': len(result.failures),
+                'errors': len(result.errors),
+                'unexpected_successes': len(result.unexpectedSuccesses),
+                'warnings': collector.total
+            }
+
+            if total_timeout is not None:
+                summary['not_run'] = not_run
+
+            if reporter is not None:
+                reporter.emit('run_end', **summary)
 
             if json:
                 assert temp_mute is not None
                 temp_mute.unmute()
 
-                print(dumps({
-                    'run': result.testsRun,
-                    'skipped': len(result.skipped),
-                    'failures': len(result.failures),
-                    'errors': len(result.errors),
-                    'unexpected_successes': len(result.unexpectedSuccesses),
-                    'warnings': len(caught_warnings) if caught_warnings else 0
-                }))
+                if durations is not None:
+                    summary['durations'] = [t._asdict()
+                                            for t in slowest_timings]
+                    summary['time'] = {'tests': tests_time,
+                                       'fixtures': fixtures_time}
+                if memory is not None:
+                    summary['memory'] = [u._asdict() for u in largest_usages]
+                if track_memory:
+                    summary['memory_exceeded'] = len(over_limits)
+                if profile_imports is not None:
+                    summary['imports'] = [t._asdict()
+                                          for t in slowest_import_timings]
+                if profile is not None:
+                    summary['profile'] = [h._asdict() for h in hot_functions]
+                print(dumps(summary))
+
+            if result_file is not None:
+                problems = [[test.id(), 'failure', details]
+                            for test, details in result.failures]
+                problems += [[test.id(), 'error', details]
+                             for test, details in result.errors]
+                problems += [[test.id(), 'unexpected success', '']
+                             for test in result.unexpectedSuccesses]
+                ok = (result.wasSuccessful() and not over_limits
+                      and not (warnings == Warnings.fail and collector.total)
+                      and not not_run)
+                write_result_file(result_file, {
+                    **summary,
+                    'shard': str(this_shard) if this_shard else None,
+                    'problems': problems,
+                    'test_durations': result.test_durations,
+                    'ok': ok})
 
             if exit_if_failed:
                 if not result.wasSuccessful():
                     raise TestsError
-                if warnings == Warnings.fail and caught_warnings:
+                if warnings == Warnings.fail and collector.total:
                     raise WarningsError
+                if over_limits:
+                    raise MemoryLimitError
+                if not_run:
+                    raise TotalTimeoutError(not_run)
 
-            return RunResult(result, caught_warnings)
+            return RunResult(result, collector.warnings())
 
         except NeatestError as e:
             if not json:
@@ -317,6 +1099,8 @@ def run(
     finally:
         if temp_mute:
             temp_mute.unmute()
+        if reporter is not None:
+            reporter.close()
 
 
 def print_version():
@@ -337,6 +1121,9 @@ def main_entry_point():
         print_version()
         exit(0)
 
+    if sys.argv[1:2] == ['merge']:
+        sys.exit(merge_main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser()
 
     parser.add_argument('-s', '--start-directory', dest='start',
@@ -368,6 +1155,190 @@ def main_entry_point():
                         action='store_true',
                         help='Stop on first fail or error')
 
+    parser.add_argument('-j', '--jobs', dest='jobs',
+                        type=int,
+                        default=1,
+                        help="Number of processes to run the tests in. "
+                             "0 means the number of CPUs (default: 1)")
+
+    parser.add_argument('--serve', dest='serve',
+                        default=None,
+                        metavar='[HOST:]PORT',
+                        help="Run the tests on the workers connecting to "
+                             "this address (default host: 127.0.0.1)")
+
+    parser.add_argument('--worker', dest='worker',
+                        default=None,
+                        metavar='HOST:PORT',
+                        help="Run the tests given by the coordinator at "
+                             "this address, then exit. The other options "
+                             "are ignored")
+
+    parser.add_argument('--shard', dest='shard',
+                        default=None,
+                        metavar='NUMBER/TOTAL',
+                        help="Run only the part NUMBER of TOTAL parts of the "
+                             "tests, like 2/4. The tests are split by the "
+                             "test classes")
+
+    parser.add_argument('--durations-file', dest='durations_file',
+                        default=None,
+                        metavar='FILE',
+                        help="Durations of the tests to balance the "
+                             "--shard parts, as written by "
+                             "'neatest merge --durations-file'")
+
+    parser.add_argument('--result-file', dest='result_file',
+                        default=None,
+                        metavar='FILE',
+                        help="Write the results to the JSON file, to be "
+                             "combined with 'neatest merge FILE...'")
+
+    parser.add_argument('--backend', dest='backend',
+                        choices=[Backend.process.value,
+                                 Backend.forkserver.value,
+                                 Backend.thread.value],
+                        default=Backend.process.value,
+                        help="How the workers are started: "
+                             "'forkserver' forks them from a server with "
+                             "the dependencies already imported, 'thread' "
+                             "runs the tests in threads (default: process)")
+
+    parser.add_argument('--preload', dest='preload',
+                        action='append',
+                        metavar='MODULE',
+                        help="Module for the fork server to import. Can be "
+                             "repeated. By default, the modules imported by "
+                             "the tests")
+
+    parser.add_argument('--durations', dest='durations',
+                        type=int,
+                        default=None,
+                        metavar='N',
+                        help="Show N slowest tests and fixtures "
+                             "(0 for all)")
+
+    parser.add_argument('--profile-imports', dest='profile_imports',
+                        type=int,
+                        default=None,
+                        metavar='N',
+                        help="Show N modules that took the longest to "
+                             "import during the discovery (0 for all)")
+
+    parser.add_argument('--memory', dest='memory',
+                        type=int,
+                        default=None,
+                        metavar='N',
+                        help="Measure the memory allocated by each test and "
+                             "show N tests with the highest peak (0 for all)")
+
+    parser.add_argument('--memory-limit', dest='memory_limit',
+                        type=int,
+                        default=None,
+                        metavar='BYTES',
+                        help="Fail if a test allocates more memory at the "
+                             "peak")
+
+    parser.add_argument('--leak-limit', dest='leak_limit',
+                        type=int,
+                        default=None,
+                        metavar='BYTES',
+                        help="Fail if a test does not free more memory by "
+                             "the time it stops")
+
+    parser.add_argument('--async-concurrency', dest='async_concurrency',
+                        type=int,
+                        default=0,
+                        metavar='N',
+                        help="Run up to N async tests of the classes marked "
+                             "with 'neatest_concurrent = True' at the same "
+                             "time (default: 0, one by one)")
+
+    parser.add_argument('--async-timeout', dest='async_timeout',
+                        type=float,
+                        default=None,
+                        metavar='SECONDS',
+                        help="Fail the concurrent async tests that take "
+                             "longer")
+
+    parser.add_argument('--timeout', dest='timeout',
+                        type=float,
+                        default=None,
+                        metavar='SECONDS',
+                        help="Interrupt the tests that take longer, print "
+                             "the stacks and report them as errors")
+
+    parser.add_argument('--total-timeout', dest='total_timeout',
+                        type=float,
+                        default=None,
+                        metavar='SECONDS',
+                        help="Stop running the tests after this time")
+
+    parser.add_argument('--profile', dest='profile',
+                        default=None,
+                        metavar='DIR',
+                        help="Sample the stacks of the tests, write them to "
+                             "DIR/neatest_profiles for the flame graph tools "
+                             "and show the hottest functions")
+
+    parser.add_argument('--profile-top', dest='profile_top',
+                        type=int,
+                        default=10,
+                        metavar='N',
+                        help="Show N hottest functions with --profile "
+                             "(0 for all)")
+
+    parser.add_argument('--changed', dest='changed',
+                        nargs='+',
+                        metavar='FILE',
+                        help="Run only the tests that import the changed "
+                             "files, directly or indirectly")
+
+    parser.add_argument('--affected-since', dest='affected_since',
+                        metavar='TIME',
+                        help="Run only the tests that import the files "
+                             "modified since TIME (a timestamp, "
+                             "ISO 8601 time, a file or a git revision)")
+
+    parser.add_argument('--lf', '--last-failed', dest='last_failed',
+                        action='store_true',
+                        default=False,
+                        help="Run only the tests that failed last time")
+
+    parser.add_argument('--ff', '--failed-first', dest='failed_first',
+                        action='store_true',
+                        default=False,
+                        help="Run the tests that failed last time before "
+                             "the others")
+
+    parser.add_argument('--watch', dest='watch',
+                        action='store_true',
+                        default=False,
+                        help="Keep running and rerun the affected tests "
+                             "when the sources change")
+
+    parser.add_argument('--jsonl', dest='jsonl',
+                        metavar='FILE',
+                        help="Write the events of the run to FILE as JSON "
+                             "Lines while running. A number means a file "
+                             "descriptor, '-' means stdout")
+
+    parser.add_argument('--capture-memory', dest='capture_memory',
+                        type=int,
+                        default=DEFAULT_CAPTURE_MEMORY,
+                        metavar='BYTES',
+                        help="How much of the captured output to keep in "
+                             "memory before writing it to a temporary file "
+                             f"(default: {DEFAULT_CAPTURE_MEMORY})")
+
+    parser.add_argument('--output-limit', dest='output_limit',
+                        type=int,
+                        default=DEFAULT_OUTPUT_LIMIT,
+                        metavar='BYTES',
+                        help="How much of the captured output to show for "
+                             "a failed test. 0 means no limit "
+                             f"(default: {DEFAULT_OUTPUT_LIMIT})")
+
     parser.add_argument('--json', dest='json',
                         action='store_true',
                         default=False,
@@ -382,22 +1353,85 @@ def main_entry_point():
                         help=f"Way to handle warnings "
                              f"(default: '{default_warnings_handling.value}')")
 
+    parser.add_argument('--static', dest='static_discovery',
+                        action='store_true',
+                        default=False,
+                        help="Parse the sources first and import only the "
+                             "modules that may contain tests. By default, "
+                             "every module is imported to find the tests, as "
+                             "'unittest discover' does")
+
+    parser.add_argument('--no-cache', dest='cache',
+                        action='store_false',
+                        default=True,
+                        help="Do not read or write the discovery cache "
+                             f"in the '{CACHE_DIR_NAME}' directory")
+
+    parser.add_argument('--clear-cache', dest='clear_cache',
+                        action='store_true',
+                        default=False,
+                        help="Delete the cache before running the tests")
+
     parser.add_argument('--version',
                         action='store_true',
                         default=False,
                         help="Show version info and exit")
 
-    # parser.add_argument('-k', dest='testNamePatterns',
-    #                     action='append',
-    #                     type=FromUnittestMain.convert_select_pattern,
-    #                     help='Only run tests which match the given substring')
+    parser.add_argument('-k', dest='name_patterns',
+                        action='append',
+                        default=None,
+                        metavar='PATTERN',
+                        help="Only run the tests whose IDs match the pattern "
+                             "or contain the substring. The modules without "
+                             "such tests are not imported")
 
     args = parser.parse_args()
 
+    if args.worker is not None:
+        try:
+            run_worker(args.worker)
+        except AddressError:
+            print(AddressFormatError(args.worker).message)
+            sys.exit(1)
+        except OSError as e:
+            print(f'Cannot connect to "{args.worker}": {e}')
+            sys.exit(1)
+        return
+
     run(start_directory=args.start,
         tests_require=args.require,
         verbosity=Verbosity(args.verbosity or default_verbosity),
         buffer=True,
         failfast=args.failfast,
         warnings=Warnings(args.warnings),
-        json=args.json)
+        json=args.json,
+        static_discovery=args.static_discovery,
+        cache=args.cache,
+        clear_cache=args.clear_cache,
+        jobs=args.jobs,
+        durations=args.durations,
+        changed=args.changed,
+        affected_since=args.affected_since,
+        last_failed=args.last_failed,
+        failed_first=args.failed_first,
+        watch=args.watch,
+        backend=Backend(args.backend),
+        preload=args.preload,
+        jsonl=args.jsonl,
+        capture_memory=args.capture_memory,
+        output_limit=args.output_limit or None,
+        profile_imports=args.profile_imports,
+        memory=args.memory,
+        memory_limit=args.memory_limit,
+        leak_limit=args.leak_limit,
+        async_concurrency=args.async_concurrency,
+        async_timeout=args.async_timeout,
+        serve=args.serve,
+        shard=args.shard,
+        durations_file=args.durations_file,
+        result_file=args.result_file,
+        timeout=args.timeout,
+        total_timeout=args.total_timeout,
+        profile=args.profile,
+        profile_top=args.profile_top,
+        name_patterns=args.name_patterns)
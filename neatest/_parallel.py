@@ -0,0 +1,230 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import contextlib
+import multiprocessing
+import queue
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, \
+    Optional, Set
+
+from neatest._cache import CacheDir
+from neatest._discovery import DiscoveryManifest, NeatestLoader, \
+    StaticIndex, iterate_tests
+from neatest._imports import ImportProfiler, ImportTiming
+from neatest._result import NeatestResult, RemoteTest, RemoteError
+from neatest._worker import Unit, WorkerOptions, process_main
+
+
+class DiscoveryResult(NamedTuple):
+    # the modules with the tests, with all the test IDs
+    units: List[Unit]
+    # to be merged to the manifest of the parent process
+    manifest_entries: Dict[str, dict]
+    # all the modules imported by the discovery
+    imported: List[str]
+    # the time of each import, if the imports were profiled
+    imports: List[ImportTiming]
+
+
+def discover_ids(top_level_dir: str, start_dir: str, pattern: str,
+                 static: bool, cache: bool,
+                 select: Optional[Callable[[str], bool]],
+                 profile_imports: bool = False,
+                 name_patterns: Optional[List[str]] = None
+                 ) -> DiscoveryResult:
+    """Discovers the tests in the current process. The result contains only
+    the IDs, so it can be sent to another process."""
+    manifest = DiscoveryManifest(
+        top_level_dir, CacheDir(top_level_dir) if cache else None)
+    loader = NeatestLoader(static=static, manifest=manifest, select=select)
+    loader.testNamePatterns = name_patterns
+    profiler = ImportProfiler()
+    with profiler if profile_imports else contextlib.nullcontext():
+        suite = loader.discover(start_dir=start_dir, pattern=pattern,
+                                top_level_dir=top_level_dir)
+    units = []
+    for (name, path), module_suite in zip(loader.discovered, suite):
+        ids = [t.id() for t in iterate_tests(module_suite)]
+        units.append(Unit(name, path, ids, len(ids)))
+    return DiscoveryResult(units, manifest.updates(), sorted(sys.modules),
+                           profiler.timings)
+
+
+def discover_in_processes(start_dirs: List[str], top_level_dir: str,
+                          pattern: str, static: bool, cache: bool,
+                          select: Optional[Callable[[str], bool]],
+                          jobs: int, profile_imports: bool = False,
+                          name_patterns: Optional[List[str]] = None
+                          ) -> Iterator[DiscoveryResult]:
+    """Discovers the tests of each start directory in a separate process,
+    up to `jobs` at a time, so the current process does not import the test
+    modules. Yields the results in the order of `start_dirs`."""
+    workers = max(1, min(jobs, len(start_dirs)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(discover_ids, top_level_dir, start_dir,
+                                   pattern, static, cache, select,
+                                   profile_imports, name_patterns)
+                   for start_dir in start_dirs]
+        for future in futures:
+            yield future.result()
+
+
+def default_preload(index: StaticIndex, modules: Iterable[str],
+                    imported: Optional[Set[str]] = None) -> List[str]:
+    """The modules from outside the project imported by the `modules` or by
+    the project modules they import. Only the modules already `imported` (by
+    default, by this process) are listed, so they are known to be
+    importable."""
+    seen: Set[str] = set()
+    external: Set[str] = set()
+    stack = list(modules)
+    while stack:
+        module = stack.pop()
+        if module in seen:
+            continue
+        seen.add(module)
+        external.update(index.external_dependencies(module))
+        stack.extend(index.dependencies(module))
+    if imported is None:
+        imported = set(sys.modules)
+    return sorted(name for name in external if name in imported)
+
+
+def forkserver_context(preload: List[str]):
+    """The multiprocessing context that forks the workers from a server
+    process. The `preload` modules are imported by the server once, so the
+    workers start with them already imported.
+
+    The server is started once per process, so the preload list of the first
+    call is used. Raises ValueError if the platform has no fork server."""
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(preload)
+    return context
+
+
+class ProcessPoolSuite:
+    """Runs the units in the worker processes.
+
+    The object can be passed to `TextTestRunner.run` instead of a `TestSuite`.
+    The workers take the units one by one from the shared queue, and the
+    outcomes are replayed to the result of the runner as soon as they come.
+    Each unit is a whole module, so `setUpModule` and `setUpClass` are called
+    the same way as in a single process. The units are taken in the order
+    they are listed, so the longest ones should go first.
+
+    When a worker gives up on a test that timed out and exits, another
+    worker is started for the rest of its unit."""
+
+    def __init__(self, units: List[Unit], jobs: int, options: WorkerOptions,
+                 context: Optional[BaseContext] = None):
+        self.units = units
+        self.jobs = jobs
+        self.options = options
+        self.context = context
+
+    def countTestCases(self) -> int:
+        return sum(unit.total for unit in self.units)
+
+    def _report_lost(self, result: NeatestResult, unit: Unit, exitcode):
+        result.addError(
+            RemoteTest(unit.name, f'{unit.name} (worker)'),
+            RemoteError(f'The worker process running the tests from '
+                        f'"{unit.name}" exited unexpectedly '
+                        f'(exit code {exitcode})\n'))
+
+    def __call__(self, result: NeatestResult) -> NeatestResult:
+        if not self.units:
+            return result
+
+        # BaseContext is declared without Process
+        context: Any = self.context or multiprocessing.get_context()
+        tasks = context.Queue()
+        events = context.Queue()
+        stop_event = context.Event()
+
+        # the abandoned parts of the units are added to the end
+        units = list(self.units)
+        jobs = max(1, min(self.jobs, len(units)))
+
+        processes: List[multiprocessing.process.BaseProcess] = []
+
+        def start_process(first_task: Optional[tuple] = None):
+            process = context.Process(
+                target=process_main,
+                args=(self.options, tasks, events, stop_event, first_task),
+                daemon=True)
+            with warnings.catch_warnings():
+                # the replacement workers are forked while the feeder thread
+                # of the queue is running. It is not a warning of the tests
+                warnings.filterwarnings('ignore', message=r'.*use of fork\(\)',
+                                        category=DeprecationWarning)
+                process.start()
+            processes.append(process)
+
+        # the workers are forked before the queue starts its feeder thread
+        for _ in range(jobs):
+            start_process()
+        for index, unit in enumerate(units):
+            tasks.put((index, tuple(unit)))
+        for _ in range(jobs):
+            tasks.put(None)
+
+        # pid -> index of the unit
+        in_progress: Dict[int, int] = {}
+
+        def handle(event):
+            kind = event[0]
+            if kind == 'unit_start':
+                in_progress[event[2]] = event[1]
+            elif kind == 'unit_done':
+                in_progress.pop(event[2], None)
+                unit = units[event[1]]
+                if unit.test_ids is None:
+                    result.module_durations[unit.name] = event[3]
+            elif kind == 'unit_abandoned':
+                # the worker exits, and its None is left in the queue for
+                # the new one
+                in_progress.pop(event[2], None)
+                rest = Unit(*event[3])
+                if rest.total > 0 and not stop_event.is_set():
+                    units.append(rest)
+                    start_process((len(units) - 1, tuple(rest)))
+                else:
+                    start_process()
+            else:
+                result.replay(event)
+            if result.shouldStop:
+                stop_event.set()
+
+        try:
+            while True:
+                while any(p.is_alive() for p in processes):
+                    try:
+                        handle(events.get(timeout=0.1))
+                    except queue.Empty:
+                        pass
+                # the events sent right before the workers exited
+                while True:
+                    try:
+                        handle(events.get(timeout=0.1))
+                    except queue.Empty:
+                        break
+                # unless a new worker was started by the events
+                if not any(p.is_alive() for p in processes):
+                    break
+        finally:
+            stop_event.set()
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+        exitcodes = {p.pid: p.exitcode for p in processes}
+        for pid, index in in_progress.items():
+            self._report_lost(result, units[index], exitcodes.get(pid))
+
+        return result
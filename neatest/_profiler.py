@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Statistical profiling of the tests.
+
+A thread takes the stacks of the threads running the tests every few
+milliseconds, so the tests run at nearly the normal speed, unlike with
+cProfile. The samples are attributed to the test running in the thread, or
+to the fixtures and the runner, if no test is running.
+
+The stacks are written in the "collapsed" format used by the flame graph
+tools (flamegraph.pl, speedscope, inferno): one line per distinct stack,
+with the frames from the root separated by semicolons and the number of
+samples after a space:
+
+    test_parse (tests/test_parser.py:10);parse (app/parser.py:5) 12
+"""
+
+import os
+import re
+import sys
+import sysconfig
+import threading
+import unittest
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# stack -> number of samples
+Stacks = Dict[str, int]
+
+# the key of the samples taken outside the tests
+OUTSIDE = '(outside tests)'
+
+# the subdirectory of the --profile directory with the files written by us
+PROFILE_DIR = 'neatest_profiles'
+
+# The frames at the root of the stacks, up to the code of the tests, are the
+# same in all the samples, so they are not shown. These are the frames of the
+# runner (neatest and unittest), of the standard library (runpy, threading,
+# multiprocessing, importlib), and of the script that started the runner
+_RUNNER_DIRS = tuple({os.path.dirname(os.path.abspath(path)) + os.sep
+                      for path in (unittest.__file__, __file__) if path})
+_LIBRARY_DIRS = tuple({os.path.abspath(sysconfig.get_paths()[name]) + os.sep
+                       for name in ('stdlib', 'platstdlib')})
+
+# the kinds of the frames
+_USER, _LIBRARY, _RUNNER = range(3)
+
+DEFAULT_INTERVAL = 0.005
+
+
+class SamplingProfiler:
+    """Samples the stacks of the threads running the tests, and of the
+    thread that started the profiler.
+
+    `start_test` and `stop_test` are called in the thread running the test,
+    by the result."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self._owner = threading.get_ident()
+        self._lock = threading.Lock()
+        # thread -> samples of the test running in the thread
+        self._tests: Dict[int, Stacks] = {}
+        self._outside: Stacks = {}
+        # code -> the frame label and its kind
+        self._labels: Dict[object, Tuple[str, int]] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._owner = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='neatest-profiler')
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def start_test(self):
+        with self._lock:
+            self._tests[threading.get_ident()] = {}
+
+    def stop_test(self) -> Stacks:
+        """The samples taken since the test started in this thread."""
+        with self._lock:
+            return self._tests.pop(threading.get_ident(), {})
+
+    def take_outside(self) -> Stacks:
+        """The samples taken outside the tests since the previous call."""
+        with self._lock:
+            stacks, self._outside = self._outside, {}
+            return stacks
+
+    def _label(self, code) -> Tuple[str, int]:
+        if code not in self._labels:
+            path = code.co_filename
+            # "<frozen runpy>", "<string>"
+            kind = _LIBRARY if path.startswith('<frozen') else _USER
+            if not path.startswith('<'):
+                path = os.path.abspath(path)
+                if path.startswith(_RUNNER_DIRS):
+                    kind = _RUNNER
+                elif path.startswith(_LIBRARY_DIRS):
+                    kind = _LIBRARY
+                try:
+                    path = os.path.relpath(path)
+                except ValueError:  # another drive on Windows
+                    pass
+            self._labels[code] = \
+                (f'{code.co_name} ({path}:{code.co_firstlineno})', kind)
+        return self._labels[code]
+
+    def _stack(self, frame) -> Optional[str]:
+        labels: List[Tuple[str, int]] = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        # the stacks with only the runner (waiting for the next test) are
+        # not counted
+        kinds = [kind for _, kind in labels]
+        start = kinds.index(_RUNNER) if _RUNNER in kinds else 0
+        while start < len(labels) and labels[start][1] != _USER:
+            start += 1
+        if start == len(labels):
+            return None
+        return ';'.join(label for label, _ in labels[start:])
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                targets = [(ident, stacks)
+                           for ident, stacks in self._tests.items()]
+                if self._owner not in self._tests:
+                    targets.append((self._owner, self._outside))
+                for ident, stacks in targets:
+                    frame = frames.get(ident)
+                    stack = self._stack(frame) if frame is not None else None
+                    if stack is not None:
+                        stacks[stack] = stacks.get(stack, 0) + 1
+
+
+def merge_stacks(target: Stacks, stacks: Stacks):
+    for stack, count in stacks.items():
+        target[stack] = target.get(stack, 0) + count
+
+
+class HotFunction(NamedTuple):
+    function: str
+    # samples with the function at the top of the stack
+    own: int
+    # samples with the function anywhere in the stack
+    total: int
+
+
+def hottest(samples: Dict[str, Stacks], count: int) -> List[HotFunction]:
+    """The `count` functions with the most own samples, or all of them if
+    `count` is 0."""
+    own: Dict[str, int] = {}
+    total: Dict[str, int] = {}
+    for stacks in samples.values():
+        for stack, number in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] = own.get(frames[-1], 0) + number
+            for frame in set(frames):
+                total[frame] = total.get(frame, 0) + number
+    ordered = sorted(own, key=lambda f: (-own[f], -total[f], f))
+    if count > 0:
+        ordered = ordered[:count]
+    return [HotFunction(f, own[f], total[f]) for f in ordered]
+
+
+def format_hot(hot: HotFunction, samples: int) -> str:
+    return (f'{hot.own / samples:7.1%} own {hot.total / samples:7.1%} total  '
+            f'{hot.function}')
+
+
+def _write_collapsed(path: str, stacks: Stacks):
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f'{stack} {count}\n')
+
+
+def _file_name(test_id: str) -> str:
+    return re.sub(r'[^\w.\-]', '_', test_id)[:200] + '.collapsed'
+
+
+def write_profile(directory: str, samples: Dict[str, Stacks]) -> str:
+    """Writes `run.collapsed` with the samples of all the tests (under the
+    frame with the ID of the test), and a file for each test in the `tests`
+    subdirectory, all in the `PROFILE_DIR` subdirectory of `directory`.
+
+    The directory may be any directory of the project, so only the
+    `.collapsed` files of the previous run in `PROFILE_DIR` are removed.
+    Returns the path of the subdirectory."""
+    directory = os.path.join(directory, PROFILE_DIR)
+    tests_dir = os.path.join(directory, 'tests')
+    os.makedirs(tests_dir, exist_ok=True)
+    for name in os.listdir(tests_dir):
+        if name.endswith('.collapsed'):
+            os.remove(os.path.join(tests_dir, name))
+    run: Stacks = {}
+    for test_id, stacks in samples.items():
+        merge_stacks(run, {f'{test_id};{stack}': count
+                           for stack, count in stacks.items()})
+        if test_id != OUTSIDE:
+            _write_collapsed(os.path.join(tests_dir, _file_name(test_id)),
+                             stacks)
+    _write_collapsed(os.path.join(directory, 'run.collapsed'), run)
+    return directory
@@ -0,0 +1,373 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Running the tests on other machines.
+
+The coordinator (`neatest --serve`) discovers the tests and listens for TCP
+connections. The workers (`neatest --worker HOST:PORT`) are started in the
+same project directory on any machine, connect to the coordinator and take
+the units one by one. Each message is a JSON array on a separate line:
+
+    worker       -> coordinator  ["ready", PID]
+    coordinator  -> worker       ["options", {WorkerOptions}]
+    coordinator  -> worker       ["unit", [NAME, PATH, IDS, TOTAL]] or ["done"]
+    worker       -> coordinator  the events of `neatest._worker.EventResult`
+    worker       -> coordinator  ["unit_done", SECONDS]
+
+After "unit_done", the coordinator sends the next unit or "done". The paths
+of the units are relative to the top level directory.
+
+If a worker disconnects, the tests of its unit that did not finish are given
+to another worker. The events of a test are applied to the result only when
+the test stops, so the interrupted tests are not counted twice. A worker that
+sends a message not following the protocol is disconnected the same way."""
+
+import json
+import os
+import selectors
+import socket
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from neatest._capture import CaptureLimits
+from neatest._memory import MemoryUsage
+from neatest._result import NeatestResult, RemoteError, RemoteTest
+from neatest._timing import Timing
+from neatest._worker import Unit, Worker, WorkerOptions
+
+# the number of workers a test may take down before it is reported as
+# an error
+MAX_ATTEMPTS = 2
+
+# the events of `neatest._worker.EventResult` and the number of their
+# arguments. The first argument of the test events describes the test
+_TEST_EVENTS = {'start': 1, 'stop': 2, 'success': 1, 'failure': 2,
+                'error': 2, 'skip': 2, 'expected_failure': 2,
+                'unexpected_success': 1}
+_OTHER_EVENTS = {'warning': 7, 'timing': len(Timing._fields),
+                 'memory': len(MemoryUsage._fields), 'profile': 2}
+
+
+class AddressError(ValueError):
+    pass
+
+
+class ProtocolError(ValueError):
+    """The other side sent a message that does not follow the protocol."""
+
+
+def parse_address(address: str,
+                  default_host: str = '127.0.0.1') -> Tuple[str, int]:
+    """Parses "HOST:PORT" or "PORT"."""
+    host, _, port = address.rpartition(':')
+    try:
+        return host or default_host, int(port)
+    except ValueError:
+        raise AddressError(address) from None
+
+
+def options_to_json(options: WorkerOptions) -> dict:
+    return options._asdict()
+
+
+def options_from_json(data: dict) -> WorkerOptions:
+    options = WorkerOptions(**data)
+    return options._replace(capture=CaptureLimits(*options.capture))
+
+
+class Connection:
+    """Sends and receives the messages over the socket."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._buffer = b''
+
+    def send(self, message: list):
+        self.sock.sendall(
+            (json.dumps(message, default=str) + '\n').encode('utf-8'))
+
+    def receive_available(self) -> Optional[List[list]]:
+        """Reads the data that is ready and returns the complete messages.
+        Returns None if the connection is closed."""
+        try:
+            data = self.sock.recv(65536)
+        except (ConnectionError, OSError):
+            return None
+        if not data:
+            return None
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b'\n')
+        return [_decode(line) for line in lines if line]
+
+    def receive(self) -> Optional[list]:
+        """Waits for the next message. Returns None if the connection is
+        closed."""
+        while b'\n' not in self._buffer:
+            try:
+                data = self.sock.recv(65536)
+            except (ConnectionError, OSError):
+                return None
+            if not data:
+                return None
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return _decode(line)
+
+    def try_send(self, message: list):
+        """Sends the message, if the other side is still connected. The
+        disconnection is noticed when reading."""
+        try:
+            self.send(message)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+
+def _decode(line: bytes) -> list:
+    """Parses a message. Raises ProtocolError."""
+    try:
+        message = json.loads(line)
+    except ValueError:
+        raise ProtocolError(f'Not a JSON message: {line[:100]!r}') from None
+    if not (isinstance(message, list) and message
+            and isinstance(message[0], str)):
+        raise ProtocolError(f'Not a message: {line[:100]!r}')
+    return message
+
+
+def check_event(event: list):
+    """Raises ProtocolError if the event cannot be applied to the
+    result."""
+    kind, args = event[0], event[1:]
+    expected = _TEST_EVENTS.get(kind, _OTHER_EVENTS.get(kind))
+    if expected is None:
+        raise ProtocolError(f'Unknown message "{kind}"')
+    if len(args) != expected:
+        raise ProtocolError(f'"{kind}" expects {expected} arguments, '
+                            f'got {len(args)}')
+    if kind in _TEST_EVENTS:
+        test = args[0]
+        if not (isinstance(test, list) and 2 <= len(test) <= 3
+                and all(isinstance(s, (str, type(None))) for s in test)
+                and isinstance(test[0], str)):
+            raise ProtocolError(f'"{kind}" has a wrong test: {test!r}')
+
+
+class _Assignment:
+    """The unit given to a worker and what is known about its progress."""
+
+    def __init__(self, index: int, unit: Unit, test_ids: List[str]):
+        self.index = index
+        self.unit = unit
+        self.test_ids = test_ids
+        self.finished: set = set()
+        # the events of the test that has started, but not stopped yet
+        self.pending: List[list] = []
+        self.current: Optional[str] = None
+
+
+class SocketPoolSuite:
+    """Hands out the units to the workers connected over TCP.
+
+    The object can be passed to `TextTestRunner.run` instead of a `TestSuite`.
+    `test_ids` contains the IDs of all the tests of the units that run whole
+    modules, so the unfinished tests can be given to another worker."""
+
+    def __init__(self, units: List[Unit], address: Tuple[str, int],
+                 options: WorkerOptions, test_ids: Dict[str, List[str]],
+                 top_level_dir: str = '.'):
+        self.units = units
+        self.address = address
+        self.options = options
+        self.test_ids = test_ids
+        self.top_level_dir = top_level_dir
+        self._attempts: Dict[str, int] = {}
+        # the workers run on their own machines, with their own sys.path
+        self._options = options_to_json(
+            options._replace(sys_path=[], mute=False))
+
+    def countTestCases(self) -> int:
+        return sum(unit.total for unit in self.units)
+
+    def _relative(self, unit: Unit) -> Unit:
+        return unit._replace(
+            path=os.path.relpath(unit.path, self.top_level_dir))
+
+    def _lost(self, assignment: _Assignment, result: NeatestResult,
+              todo: Deque[Tuple[int, Unit]]):
+        """Gives the unfinished tests of the disconnected worker to the
+        others."""
+        current = assignment.current
+        remaining = [test_id for test_id in assignment.test_ids
+                     if test_id not in assignment.finished]
+        if current is not None:
+            attempts = self._attempts.get(current, 0) + 1
+            self._attempts[current] = attempts
+            if attempts >= MAX_ATTEMPTS:
+                remaining.remove(current)
+                result.addError(
+                    RemoteTest(current, current),
+                    RemoteError(f'The test was running when {attempts} '
+                                f'workers disconnected\n'))
+        if remaining:
+            todo.appendleft((assignment.index, assignment.unit._replace(
+                test_ids=remaining, total=len(remaining))))
+
+    def _handle(self, event: list, assignment: _Assignment,
+                result: NeatestResult):
+        check_event(event)
+        try:
+            self._apply(event, assignment, result)
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ProtocolError(f'Cannot apply "{event[0]}": {e}') from e
+
+    @staticmethod
+    def _apply(event: list, assignment: _Assignment, result: NeatestResult):
+        kind = event[0]
+        if kind == 'start':
+            assignment.current = event[1][0]
+            assignment.pending = [event]
+        elif kind == 'stop':
+            for pending in assignment.pending:
+                result.replay(pending)
+            result.replay(event)
+            assignment.finished.add(event[1][0])
+            assignment.current = None
+            assignment.pending = []
+        elif assignment.current is not None:
+            assignment.pending.append(event)
+        else:
+            result.replay(event)
+
+    def _receive(self, message: list, connection: Connection,
+                 working: Dict[Connection, Optional[_Assignment]],
+                 result: NeatestResult,
+                 give_work: Callable[[Connection], None]):
+        """Handles a message from the worker. Raises ProtocolError."""
+        assignment = working.get(connection)
+        if message[0] == 'ready':
+            if assignment is not None:
+                raise ProtocolError('"ready" while running a unit')
+            connection.try_send(['options', self._options])
+            give_work(connection)
+        elif assignment is None:
+            raise ProtocolError(f'"{message[0]}" without a unit')
+        elif message[0] == 'unit_done':
+            if len(message) != 2 or not isinstance(message[1],
+                                                   (int, float)):
+                raise ProtocolError(f'Wrong "unit_done": {message!r}')
+            if assignment.unit.test_ids is None:
+                result.module_durations[assignment.unit.name] = message[1]
+            give_work(connection)
+        else:
+            self._handle(message, assignment, result)
+
+    def __call__(self, result: NeatestResult) -> NeatestResult:
+        todo: Deque[Tuple[int, Unit]] = deque(enumerate(self.units))
+        # connection -> the unit it runs, or None if it waits. The connections
+        # are added after they send "ready"
+        working: Dict[Connection, Optional[_Assignment]] = {}
+
+        def give_work(connection: Connection):
+            # while other workers run their units, the idle ones wait, since
+            # the units of the lost workers may be given to them
+            working[connection] = None
+            if todo:
+                index, unit = todo.popleft()
+                ids = (unit.test_ids if unit.test_ids is not None
+                       else self.test_ids.get(unit.name, []))
+                working[connection] = _Assignment(index, unit, ids)
+                connection.try_send(['unit', list(self._relative(unit))])
+
+        def drop(connection: Connection, reason: Optional[str] = None):
+            if reason is not None:
+                print(f'Disconnecting the worker: {reason}', flush=True)
+            selector.unregister(connection.sock)
+            assignment = working.pop(connection, None)
+            connection.close()
+            if assignment is not None:
+                self._lost(assignment, result, todo)
+                for waiting in [c for c, a in working.items() if a is None]:
+                    give_work(waiting)
+
+        server = socket.socket()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(self.address)
+        server.listen()
+        selector = selectors.DefaultSelector()
+        selector.register(server, selectors.EVENT_READ)
+        print(f'Waiting for workers on {self.address[0]}:{self.address[1]}',
+              flush=True)
+        try:
+            while todo or any(a is not None for a in working.values()):
+                for key, _ in selector.select(timeout=0.5):
+                    if key.fileobj is server:
+                        sock, _ = server.accept()
+                        selector.register(sock, selectors.EVENT_READ,
+                                          Connection(sock))
+                        continue
+                    connection = key.data
+                    try:
+                        messages = connection.receive_available()
+                        if messages is None:
+                            drop(connection)
+                            continue
+                        for message in messages:
+                            self._receive(message, connection, working,
+                                          result, give_work)
+                    except ProtocolError as e:
+                        drop(connection, str(e))
+                    if result.shouldStop:
+                        todo.clear()
+            for key in list(selector.get_map().values()):
+                if key.fileobj is not server:
+                    key.data.try_send(['done'])
+                    key.data.close()
+        finally:
+            selector.close()
+            server.close()
+        return result
+
+
+def run_worker(address: str, connect_timeout: float = 30.0) -> int:
+    """Connects to the coordinator and runs the units it gives until it says
+    "done". Returns the number of the units run."""
+    host, port = parse_address(address)
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+    connection = Connection(sock)
+    connection.send(['ready', os.getpid()])
+    worker: Optional[Worker] = None
+    units = 0
+    try:
+        while True:
+            message = connection.receive()
+            if message is None or message[0] == 'done':
+                break
+            if message[0] == 'options':
+                options = options_from_json(message[1])
+                worker = Worker(options, connection.send)
+            elif message[0] == 'unit':
+                assert worker is not None
+                unit = Unit(*message[1])
+                unit = unit._replace(path=os.path.abspath(os.path.join(
+                    worker.options.top_level_dir, unit.path)))
+                started = time.perf_counter()
+                worker.run_unit(unit)
+                units += 1
+                connection.send(['unit_done',
+                                 time.perf_counter() - started])
+    finally:
+        connection.close()
+    return units
@@ -0,0 +1,197 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Checking whether the `tests_require` are installed, without running pip.
+
+The requirements are checked against the installed distributions with
+`importlib.metadata`. The version specifiers, extras and markers are
+understood with the `packaging` library, or with its copy vendored by pip.
+Without both, only the package names with the simple version comparisons
+(such as `name>=1.2,<2`) are checked, and everything else is left to pip."""
+
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import List, Optional
+
+from neatest._cache import CacheDir
+
+_SIMPLE_SPEC = re.compile(
+    r'^\s*(?P<name>[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)\s*'
+    r'(?P<clauses>(?:[<>=!]=?\s*[0-9][0-9.]*\s*'
+    r'(?:,\s*[<>=!]=?\s*[0-9][0-9.]*\s*)*)?)$')
+_CLAUSE = re.compile(r'^(==|!=|>=|<=|>|<)([0-9]+(?:\.[0-9]+)*)$')
+_RELEASE = re.compile(r'^[0-9]+(?:\.[0-9]+)*$')
+
+
+# the libraries are imported only when the requirements are checked, since
+# most runs do not check them
+
+def _importlib_metadata():
+    """`importlib.metadata`, its backport on Python 3.7, or None."""
+    try:
+        from importlib import metadata
+        return metadata
+    except ImportError:
+        try:
+            import importlib_metadata  # type: ignore
+            return importlib_metadata
+        except ImportError:
+            return None
+
+
+def _packaging_requirements():
+    """`packaging.requirements`, its copy vendored by pip, or None."""
+    try:
+        from packaging import requirements  # type: ignore
+        return requirements
+    except ImportError:
+        try:
+            from pip._vendor.packaging import requirements  # type: ignore
+            return requirements
+        except ImportError:
+            return None
+
+
+def _installed_version(name: str) -> Optional[str]:
+    metadata = _importlib_metadata()
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _satisfied(requirement, depth: int = 0) -> Optional[bool]:
+    # requirement is packaging.requirements.Requirement
+    if requirement.url:
+        return None
+    if requirement.marker is not None and not requirement.marker.evaluate():
+        return True
+    version = _installed_version(requirement.name)
+    if version is None:
+        return False
+    if not requirement.specifier.contains(version, prereleases=True):
+        return False
+    requirements = _packaging_requirements()
+    for extra in requirement.extras:
+        if depth > 0:
+            return None
+        for text in _importlib_metadata().requires(requirement.name) or []:
+            try:
+                dependency = requirements.Requirement(text)
+            except requirements.InvalidRequirement:
+                return None
+            if dependency.marker is None \
+                    or not dependency.marker.evaluate({'extra': extra}):
+                continue
+            dependency.marker = None
+            result = _satisfied(dependency, depth + 1)
+            if not result:
+                return result
+    return True
+
+
+def _release(version: str) -> List[int]:
+    return [int(part) for part in version.split('.')]
+
+
+def _compare(installed: List[int], operator: str, version: List[int]) -> bool:
+    # 1.0 is the same version as 1.0.0
+    length = max(len(installed), len(version))
+    left = installed + [0] * (length - len(installed))
+    right = version + [0] * (length - len(version))
+    return {'==': left == right, '!=': left != right,
+            '>=': left >= right, '<=': left <= right,
+            '>': left > right, '<': left < right}[operator]
+
+
+def _simple_satisfied(spec: str) -> Optional[bool]:
+    """Checks the requirement without `packaging`. Only the names with the
+    comparisons of plain release versions (such as `name>=1.2,<2`) are
+    understood."""
+    match = _SIMPLE_SPEC.match(spec)
+    if match is None:
+        return None
+    version = _installed_version(match.group('name'))
+    if version is None:
+        return False
+    clauses = [''.join(c.split()) for c in match.group('clauses').split(',')
+               if c.strip()]
+    if not clauses:
+        return True
+    if not _RELEASE.match(version):
+        # the pre-releases and the local versions are left to pip
+        return None
+    for clause in clauses:
+        parsed = _CLAUSE.match(clause)
+        if parsed is None:  # such as "=1" or "==1."
+            return None
+        operator, required = parsed.groups()
+        if not _compare(_release(version), operator, _release(required)):
+            return False
+    return True
+
+
+def is_satisfied(spec: str) -> Optional[bool]:
+    """Whether the requirement (as passed to pip) is installed. None means
+    it cannot be checked without pip."""
+    if _importlib_metadata() is None:
+        return None
+    requirements = _packaging_requirements()
+    if requirements is None:
+        return _simple_satisfied(spec)
+    try:
+        requirement = requirements.Requirement(spec)
+    except requirements.InvalidRequirement:  # a path, an URL or a pip option
+        return None
+    return _satisfied(requirement)
+
+
+def unsatisfied(specs: List[str]) -> List[str]:
+    """The requirements that are missing, have a wrong version or cannot be
+    checked."""
+    return [spec for spec in specs if not is_satisfied(spec)]
+
+
+def fingerprint(specs: List[str]) -> str:
+    """Changes when the requirements or the installed packages change
+    (installing or removing a package changes the modification time of the
+    directory it is installed to)."""
+    dirs = []
+    cwd = os.getcwd()
+    for path in sys.path:
+        if path in ('', cwd):
+            # changes with every file created in the project
+            continue
+        try:
+            dirs.append([path, os.stat(path).st_mtime_ns])
+        except OSError:
+            pass
+    data = json.dumps([sys.executable, sorted(specs), dirs])
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class SatisfiedRequirements:
+    """Remembers the fingerprint of the last set of requirements that were
+    all installed, so the next run with the same environment skips even the
+    checks."""
+
+    FILE_NAME = 'requirements.json'
+
+    def __init__(self, cache: Optional[CacheDir]):
+        self.cache = cache
+        data = cache.read(self.FILE_NAME) if cache is not None else None
+        self.fingerprint = data.get('fingerprint') \
+            if isinstance(data, dict) else None
+
+    def __contains__(self, specs: List[str]) -> bool:
+        return self.fingerprint is not None \
+               and self.fingerprint == fingerprint(specs)
+
+    def add(self, specs: List[str]):
+        self.fingerprint = fingerprint(specs)
+        if self.cache is not None:
+            self.cache.write(self.FILE_NAME,
+                             {'fingerprint': self.fingerprint})
@@ -0,0 +1,299 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import builtins
+import warnings as wrn
+from typing import Dict, List, NamedTuple, Optional
+from unittest import TestResult, TextTestResult
+
+from neatest._capture import CaptureBuffer, CaptureLimits
+from neatest._jsonl import JsonLinesReporter
+from neatest._memory import MemoryTracker, MemoryUsage
+from neatest._profiler import SamplingProfiler, Stacks, merge_stacks
+from neatest._timeout import TimeoutWatchdog
+from neatest._timing import Timing, Stopwatch, TEST, start_stopwatch
+from neatest._warnings import WarningsCollector
+
+
+class RemoteTest:
+    """Stands in for a test that was run in another process.
+
+    It has everything `TextTestResult` needs to print the test."""
+
+    failureException = AssertionError
+
+    def __init__(self, test_id: str, description: str,
+                 short_description: Optional[str] = None):
+        self._id = test_id
+        self._description = description
+        self._short_description = short_description
+
+    def id(self) -> str:
+        return self._id
+
+    def shortDescription(self) -> Optional[str]:
+        return self._short_description
+
+    def countTestCases(self) -> int:
+        return 1
+
+    def __str__(self):
+        return self._description
+
+    def __repr__(self):
+        return f'<RemoteTest {self._id}>'
+
+
+class RemoteError(NamedTuple):
+    """A traceback already formatted by the process that ran the test.
+    Passed to the `add*` methods of the result instead of `sys.exc_info()`."""
+    text: str
+
+
+def describe(test) -> list:
+    """Converts the test to the form that can be sent to another process."""
+    return [test.id(), str(test), test.shortDescription()]
+
+
+def captured_output(result: TestResult) -> List[int]:
+    """The numbers of characters written to stdout and stderr during the
+    current test, if the output is buffered."""
+    stdout = getattr(result, '_stdout_buffer', None)
+    stderr = getattr(result, '_stderr_buffer', None)
+    if not result.buffer or stdout is None or stderr is None:
+        return [0, 0]
+    return [stdout.tell(), stderr.tell()]
+
+
+def _warning_category(module: str, name: str) -> type:
+    # the events may come from other machines, so nothing is imported for
+    # them. The categories defined elsewhere become UserWarning
+    source = {'builtins': builtins, 'warnings': wrn}.get(module)
+    category = getattr(source, name, None)
+    if isinstance(category, type) and issubclass(category, Warning):
+        return category
+    return UserWarning
+
+
+class NeatestResult(TextTestResult):
+    """The result of running the tests in this process or in the workers.
+
+    Events recorded by `neatest._worker.EventResult` are applied to this
+    result with `replay`, so the output and the statistics are the same as if
+    the tests were run here.
+
+    `timings` contains the wall and CPU time of each test and fixture.
+    `test_durations` maps the test IDs to the seconds they took.
+    `module_durations` is filled by the parallel runner with the time each
+    of the modules run entirely took in a worker, including the fixtures.
+    `memory_usages` contains the memory allocated by each test, measured by
+    the `memory` tracker here or by the workers.
+
+    If the `reporter` is specified, the events are also written to it as they
+    happen. In the buffer mode, the output is captured within the `capture`
+    limits. The warnings are attributed to the tests by the `collector`. The
+    `watchdog` interrupts the tests run here that take too long.
+
+    `profile` maps the test IDs to the stacks sampled by the `profiler` here
+    or by the workers."""
+
+    def __init__(self, *args,
+                 reporter: Optional[JsonLinesReporter] = None,
+                 capture: CaptureLimits = CaptureLimits(),
+                 collector: Optional[WarningsCollector] = None,
+                 memory: Optional[MemoryTracker] = None,
+                 watchdog: Optional[TimeoutWatchdog] = None,
+                 profiler: Optional[SamplingProfiler] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reporter = reporter
+        self.capture = capture
+        self.collector = collector
+        self.memory = memory
+        self.watchdog = watchdog
+        self.profiler = profiler
+        self.profile: Dict[str, Stacks] = {}
+        self.timings: List[Timing] = []
+        self.memory_usages: List[MemoryUsage] = []
+        self.test_durations: Dict[str, float] = {}
+        self.module_durations: Dict[str, float] = {}
+        self._started: Dict[str, Stopwatch] = {}
+        # the output sizes sent by the worker that ran the test
+        self._remote_output: Optional[List[int]] = None
+
+    def _report_outcome(self, test, outcome: str,
+                        details: Optional[str] = None):
+        if self.reporter is not None:
+            self.reporter.emit('outcome', test=test.id(), outcome=outcome,
+                               details=details)
+
+    def _setupStdout(self):
+        if self.buffer and self._stdout_buffer is None:
+            self._stdout_buffer = CaptureBuffer(self.capture)
+            self._stderr_buffer = CaptureBuffer(self.capture)
+        super()._setupStdout()
+
+    def startTest(self, test):
+        test_id = test.id()
+        self._started[test_id] = start_stopwatch(test)
+        super().startTest(test)
+        if self.collector is not None:
+            self.collector.start_test(test_id)
+        if self.reporter is not None:
+            self.reporter.emit('start', test=test_id)
+        if self.memory is not None:
+            self.memory.start_test(test_id)
+        if self.watchdog is not None:
+            self.watchdog.start(test)
+        if self.profiler is not None:
+            self.profiler.start_test()
+
+    def stopTest(self, test):
+        test_id = test.id()
+        if self.profiler is not None:
+            self.addProfile(test_id, self.profiler.stop_test())
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            unreported = self.watchdog.take_unreported()
+            if unreported is not None:
+                self.addError(test, unreported)
+            if self.watchdog.expired():
+                self.stop()
+        if self.memory is not None:
+            usage = self.memory.stop_test(test_id)
+            if usage is not None:
+                self.addMemoryUsage(usage)
+        # before the buffers are cleared by TestResult.stopTest
+        output = (self._remote_output or captured_output(self)
+                  if self.reporter is not None else None)
+        self._remote_output = None
+        super().stopTest(test)
+        stopwatch = self._started.pop(test_id, None)
+        if stopwatch is not None:
+            self.addTiming(stopwatch.timing(TEST, test_id))
+        if self.collector is not None:
+            self.collector.stop_test(test_id)
+        if self.reporter is not None:
+            assert output is not None
+            stdout, stderr = output
+            self.reporter.emit('end', test=test_id,
+                               stdout=stdout, stderr=stderr)
+
+    def addTiming(self, timing: Timing):
+        self.timings.append(timing)
+        if timing.kind == TEST:
+            self.test_durations[timing.name] = timing.wall
+        if self.reporter is not None:
+            self.reporter.emit('duration', **timing._asdict())
+
+    def addProfile(self, test_id: str, stacks: Stacks):
+        if stacks:
+            merge_stacks(self.profile.setdefault(test_id, {}), stacks)
+
+    def addMemoryUsage(self, usage: MemoryUsage):
+        self.memory_usages.append(usage)
+        if self.reporter is not None:
+            self.reporter.emit('memory', **usage._asdict())
+
+    def addSuccess(self, test):
+        if self.watchdog is not None:
+            # the test caught the interruption
+            unreported = self.watchdog.take_unreported()
+            if unreported is not None:
+                self.addError(test, unreported)
+                return
+        super().addSuccess(test)
+        self._report_outcome(test, 'success')
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._report_outcome(test, 'failure', self.failures[-1][1])
+
+    def addError(self, test, err):
+        if self.watchdog is not None:
+            self.watchdog.reported(err)
+        super().addError(test, err)
+        self._report_outcome(test, 'error', self.errors[-1][1])
+
+    def addSubTest(self, test, subtest, err):
+        if self.watchdog is not None and err is not None:
+            self.watchdog.reported(err)
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            if issubclass(err[0], test.failureException):
+                self._report_outcome(subtest, 'failure',
+                                     self.failures[-1][1])
+            else:
+                self._report_outcome(subtest, 'error', self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._report_outcome(test, 'skip', reason)
+
+    def addExpectedFailure(self, test, err):
+        if self.watchdog is not None:
+            self.watchdog.reported(err)
+        super().addExpectedFailure(test, err)
+        self._report_outcome(test, 'expected_failure',
+                             self.expectedFailures[-1][1])
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._report_outcome(test, 'unexpected_success')
+
+    def _exc_info_to_string(self, err, test):
+        if isinstance(err, RemoteError):
+            return err.text
+        return super()._exc_info_to_string(err, test)
+
+    def replay(self, event: List):
+        kind, args = event[0], event[1:]
+        if kind == 'warning':
+            module, name, message, filename, lineno, test_id, count = args
+            category = _warning_category(module, name)
+            try:
+                warning = category(message)
+            except Exception:
+                warning = UserWarning(message)
+            if self.collector is not None:
+                self.collector.add(warning, type(warning), filename, lineno,
+                                   count=count, test_id=test_id)
+                return
+            # the filters were already applied by the worker
+            with wrn.catch_warnings():
+                wrn.simplefilter('always')
+                for _ in range(count):
+                    wrn.warn_explicit(warning, type(warning), filename,
+                                      lineno)
+            return
+        if kind == 'timing':
+            self.addTiming(Timing(*args))
+            return
+        if kind == 'memory':
+            self.addMemoryUsage(MemoryUsage(*args))
+            return
+        if kind == 'profile':
+            self.addProfile(*args)
+            return
+
+        test = RemoteTest(*args[0])
+        if kind == 'start':
+            self.startTest(test)
+            # the worker sends the time it measured
+            self._started.pop(test.id(), None)
+        elif kind == 'stop':
+            self._remote_output = args[1]
+            self.stopTest(test)
+        elif kind == 'success':
+            self.addSuccess(test)
+        elif kind == 'failure':
+            self.addFailure(test, RemoteError(args[1]))
+        elif kind == 'error':
+            self.addError(test, RemoteError(args[1]))
+        elif kind == 'skip':
+            self.addSkip(test, args[1])
+        elif kind == 'expected_failure':
+            self.addExpectedFailure(test, RemoteError(args[1]))
+        elif kind == 'unexpected_success':
+            self.addUnexpectedSuccess(test)
+        else:
+            raise ValueError(kind)
@@ -0,0 +1,175 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Splitting the tests between the CI runners and merging their results.
+
+Each runner discovers all the tests and takes its part of the test classes.
+The split depends only on the test IDs and the durations file, so the
+runners agree on it without talking to each other."""
+
+import argparse
+import json
+from statistics import median
+from typing import Callable, Dict, List, NamedTuple
+
+from neatest._durations import class_id
+
+
+class Shard(NamedTuple):
+    # from 1 to total
+    number: int
+    total: int
+
+    def __str__(self):
+        return f'{self.number}/{self.total}'
+
+
+def parse_shard(text: str) -> Shard:
+    """Parses "NUMBER/TOTAL", where NUMBER is from 1 to TOTAL. Raises
+    ValueError."""
+    number, _, total = text.partition('/')
+    shard = Shard(int(number), int(total))
+    if not 1 <= shard.number <= shard.total:
+        raise ValueError(text)
+    return shard
+
+
+def read_test_durations(path: str) -> Dict[str, float]:
+    """The durations of the tests from a file written by `neatest merge
+    --durations-file`, or the `durations.json` from the cache."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    tests = data.get('tests') if isinstance(data, dict) else None
+    return tests if isinstance(tests, dict) else {}
+
+
+def split_classes(test_ids: List[str], count: int,
+                  durations: Dict[str, float],
+                  group: Callable[[str], str] = class_id) -> List[List[str]]:
+    """Splits the tests into `count` parts, keeping the tests of each class
+    (or of each group returned by `group` for the test IDs) together. The
+    longest groups are placed first, each to the part that is the shortest
+    so far. The tests without known durations are expected to take the
+    median time."""
+    classes: Dict[str, List[str]] = {}
+    for test_id in test_ids:
+        classes.setdefault(group(test_id), []).append(test_id)
+    known = [durations[i] for i in test_ids if i in durations]
+    default = median(known) if known else 1.0
+
+    def estimate(ids: List[str]) -> float:
+        return sum(durations.get(i, default) for i in ids)
+
+    ordered = sorted(classes.items(),
+                     key=lambda item: (-estimate(item[1]), item[0]))
+    parts: List[List[str]] = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for _, ids in ordered:
+        # the first of the shortest parts, so the split is deterministic
+        target = min(range(count), key=lambda i: (loads[i], i))
+        parts[target].extend(ids)
+        loads[target] += estimate(ids)
+    return parts
+
+
+def write_result_file(path: str, data: dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+
+
+_COUNTS = ['run', 'skipped', 'failures', 'errors', 'unexpected_successes',
+           'warnings']
+
+
+class MergedResults(NamedTuple):
+    summary: dict
+    # [test ID, outcome, details] of the failures and errors
+    problems: List[list]
+    test_durations: Dict[str, float]
+    # the shards that are missing, like "2/3"
+    missing: List[str]
+    ok: bool
+
+
+def merge_results(files: List[dict]) -> MergedResults:
+    summary: Dict[str, object] = {key: 0 for key in _COUNTS}
+    problems: List[list] = []
+    test_durations: Dict[str, float] = {}
+    shards: Dict[int, set] = {}
+    ok = True
+    for data in files:
+        for key in _COUNTS:
+            summary[key] += data.get(key, 0)  # type: ignore
+        problems.extend(data.get('problems', []))
+        test_durations.update(data.get('test_durations', {}))
+        ok = ok and bool(data.get('ok'))
+        if data.get('shard'):
+            shard = parse_shard(data['shard'])
+            shards.setdefault(shard.total, set()).add(shard.number)
+    missing = [f'{number}/{total}'
+               for total, numbers in sorted(shards.items())
+               for number in range(1, total + 1) if number not in numbers]
+    summary['files'] = len(files)
+    return MergedResults(summary, problems, test_durations, missing,
+                         ok and not missing and bool(files))
+
+
+def merge_main(argv: List[str]) -> int:
+    """`neatest merge`: prints the merged result files. Returns the exit
+    code."""
+    parser = argparse.ArgumentParser(
+        prog='neatest merge',
+        description='Combine the result files written with --result-file '
+                    'into one summary')
+    parser.add_argument('files', nargs='+', metavar='FILE')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the summary as JSON')
+    parser.add_argument('--durations-file', dest='durations_file',
+                        default=None, metavar='FILE',
+                        help='Write the durations of the tests to FILE, '
+                             'to balance the next --shard runs')
+    args = parser.parse_args(argv)
+
+    files = []
+    for path in args.files:
+        try:
+            with open(path, encoding='utf-8') as f:
+                files.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f'Cannot read "{path}": {e}')
+            return 1
+    try:
+        merged = merge_results(files)
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f'Wrong result file: {e}')
+        return 1
+
+    if args.durations_file is not None:
+        with open(args.durations_file, 'w', encoding='utf-8') as f:
+            json.dump({'tests': merged.test_durations}, f, indent=1,
+                      sort_keys=True)
+
+    if args.json:
+        print(json.dumps({**merged.summary, 'missing': merged.missing,
+                          'ok': merged.ok}))
+        return 0 if merged.ok else 1
+
+    for test_id, outcome, details in merged.problems:
+        print('=' * 70)
+        print(f'{outcome.upper()}: {test_id}')
+        print('-' * 70)
+        print(details)
+    print('-' * 70)
+    s = merged.summary
+    print(f"Ran {s['run']} tests in {s['files']} files")
+    print()
+    details = ', '.join(f'{key}={s[key]}'
+                        for key in ['failures', 'errors', 'skipped',
+                                    'unexpected_successes', 'warnings']
+                        if s[key])
+    status = 'OK' if merged.ok else 'FAILED'
+    print(f'{status} ({details})' if details else status)
+    if merged.missing:
+        print(f"Missing the results of the shards: "
+              f"{', '.join(merged.missing)}")
+    return 0 if merged.ok else 1
@@ -0,0 +1,210 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Running the test modules in threads of the current process.
+
+It makes sense for the tests that mostly wait for I/O, and on the Python
+builds without the GIL. Each thread reports to its own `EventResult`, and
+the events are replayed to the result of the runner by the main thread, as
+the process pool does.
+
+`sys.stdout`, `sys.stderr` and `warnings.showwarning` are global, so they are
+replaced by the dispatchers that look up the test running in the current
+thread."""
+
+import queue
+import sys
+import threading
+import traceback
+import warnings as wrn
+from typing import Callable, List, Optional
+from unittest import TestSuite
+from unittest.result import STDERR_LINE, STDOUT_LINE
+
+from neatest._capture import CaptureBuffer, CaptureLimits
+from neatest._discovery import iterate_tests
+from neatest._profiler import SamplingProfiler
+from neatest._result import NeatestResult
+from neatest._worker import EventResult, Emit
+
+# the attribute of the test classes that must not run at the same time as
+# other tests
+SERIAL_ATTRIBUTE = 'neatest_serial'
+
+
+def is_serial(suite: TestSuite) -> bool:
+    """Whether the suite contains tests of the classes marked as serial."""
+    return any(getattr(test.__class__, SERIAL_ATTRIBUTE, False)
+               for test in iterate_tests(suite))
+
+
+class ThreadOutput:
+    """Replaces `sys.stdout` or `sys.stderr`. Writes to the stream set for
+    the current thread, or to the `default` stream."""
+
+    def __init__(self, default):
+        self.default = default
+        self._local = threading.local()
+
+    def redirect(self, stream):
+        """Sets the stream for the current thread. None means the default."""
+        self._local.stream = stream
+
+    def _target(self):
+        stream = getattr(self._local, 'stream', None)
+        return stream if stream is not None else self.default
+
+    def write(self, s: str) -> int:
+        return self._target().write(s)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+class ThreadEventResult(EventResult):
+    """`EventResult` that captures the output of the current thread only."""
+
+    def __init__(self, emit: Emit, is_stopped: Callable[[], bool],
+                 capture: CaptureLimits, stdout: ThreadOutput,
+                 stderr: ThreadOutput,
+                 profiler: Optional[SamplingProfiler] = None):
+        super().__init__(emit, is_stopped, capture, profiler=profiler)
+        self.stdout = stdout
+        self.stderr = stderr
+
+    def _setupStdout(self):
+        if self.buffer:
+            if self._stdout_buffer is None:
+                self._stdout_buffer = CaptureBuffer(self.capture)
+                self._stderr_buffer = CaptureBuffer(self.capture)
+            self.stdout.redirect(self._stdout_buffer)
+            self.stderr.redirect(self._stderr_buffer)
+
+    def _restoreStdout(self):
+        if self.buffer:
+            self.stdout.redirect(None)
+            self.stderr.redirect(None)
+            if self._mirrorOutput:
+                output = self._stdout_buffer.getvalue()
+                error = self._stderr_buffer.getvalue()
+                if output:
+                    if not output.endswith('\n'):
+                        output += '\n'
+                    self.stdout.default.write(STDOUT_LINE % output)
+                if error:
+                    if not error.endswith('\n'):
+                        error += '\n'
+                    self.stderr.default.write(STDERR_LINE % error)
+            self._stdout_buffer.seek(0)
+            self._stdout_buffer.truncate()
+            self._stderr_buffer.seek(0)
+            self._stderr_buffer.truncate()
+
+
+class ThreadPoolSuite:
+    """Runs the module suites in `jobs` threads, taking them in the order
+    they are listed. The `serial` suites are run after the others, one at
+    a time. With `profile`, the stacks of the tests are sampled.
+
+    The object can be passed to `TextTestRunner.run` instead of a
+    `TestSuite`."""
+
+    def __init__(self, suites: List[TestSuite], jobs: int,
+                 buffer: bool = False, failfast: bool = False,
+                 capture: CaptureLimits = CaptureLimits(),
+                 serial: Optional[List[TestSuite]] = None,
+                 profile: bool = False):
+        self.suites = suites
+        self.serial = serial or []
+        self.jobs = jobs
+        self.buffer = buffer
+        self.failfast = failfast
+        self.capture = capture
+        self.profiler = SamplingProfiler() if profile else None
+        self._local = threading.local()
+
+    def countTestCases(self) -> int:
+        return sum(suite.countTestCases()
+                   for suite in self.suites + self.serial)
+
+    def _show_warning(self, message, category, filename, lineno, file=None,
+                      line=None):
+        result = getattr(self._local, 'result', None)
+        if result is not None:
+            result.add_warning(message, category, filename, lineno)
+        else:
+            self._previous_show_warning(message, category, filename, lineno,
+                                        file, line)
+
+    def _work(self, tasks: 'queue.Queue', events: 'queue.Queue',
+              is_stopped: Callable[[], bool], stdout: ThreadOutput,
+              stderr: ThreadOutput):
+        result = ThreadEventResult(events.put, is_stopped, self.capture,
+                                   stdout, stderr, self.profiler)
+        result.failfast = self.failfast
+        result.buffer = self.buffer
+        self._local.result = result
+        while True:
+            try:
+                suite = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if is_stopped():
+                break
+            try:
+                suite.run(result)
+            except Exception:
+                name = next((t.__class__.__module__
+                             for t in iterate_tests(suite)), 'suite')
+                events.put(['error', [name, f'{name} (thread)', None],
+                            traceback.format_exc()])
+            result.flush_warnings(None)
+
+    def _run_threads(self, suites: List[TestSuite], jobs: int,
+                     result: NeatestResult, stdout: ThreadOutput,
+                     stderr: ThreadOutput):
+        tasks: queue.Queue = queue.Queue()
+        for suite in suites:
+            tasks.put(suite)
+        events: queue.Queue = queue.Queue()
+        threads = [threading.Thread(
+            target=self._work,
+            args=(tasks, events, lambda: result.shouldStop, stdout, stderr),
+            daemon=True)
+            for _ in range(max(1, min(jobs, len(suites))))]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                result.replay(events.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        while True:
+            try:
+                result.replay(events.get_nowait())
+            except queue.Empty:
+                break
+
+    def __call__(self, result: NeatestResult) -> NeatestResult:
+        stdout = ThreadOutput(sys.stdout)
+        stderr = ThreadOutput(sys.stderr)
+        self._previous_show_warning = wrn.showwarning
+        sys.stdout, sys.stderr = stdout, stderr  # type: ignore
+        wrn.showwarning = self._show_warning
+        if self.profiler is not None:
+            self.profiler.start()
+        try:
+            if self.suites:
+                self._run_threads(self.suites, self.jobs, result,
+                                  stdout, stderr)
+            if self.serial and not result.shouldStop:
+                self._run_threads(self.serial, 1, result, stdout, stderr)
+        finally:
+            if self.profiler is not None:
+                self.profiler.stop()
+            wrn.showwarning = self._previous_show_warning
+            sys.stdout, sys.stderr = stdout.default, stderr.default
+        return result
@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Limiting the time of each test and of the whole run.
+
+When a test runs out of time, the stacks of all the threads are dumped with
+`faulthandler`, and `TestTimeoutError` is raised in the test, so it is
+reported as an error and the run goes on. The exception is raised by the
+SIGALRM handler, so it works only in the main thread on the systems with
+`signal.setitimer`. Elsewhere the stacks are printed to stderr, but the test
+is not interrupted.
+
+A test may catch the exception, for example with `except Exception`. Then
+the test is still reported as an error, when it finishes. A test may also
+hang in the code that is not interrupted by signals. In a worker process,
+the `on_hang` callback is called from another thread when the test does not
+stop within `grace` seconds after the timeout, so the worker can report the
+test and exit.
+
+The limit can be set for a test class:
+
+    class TestSlowServer(unittest.TestCase):
+        neatest_timeout = 120
+"""
+
+import faulthandler
+import signal
+import sys
+import tempfile
+import threading
+import time
+from types import TracebackType
+from typing import Any, Callable, Optional, Tuple, Type
+from unittest import TestCase
+
+# the attribute of the test classes with the limit of the seconds for each
+# test. 0 or None means no limit
+TIMEOUT_ATTRIBUTE = 'neatest_timeout'
+
+# seconds a worker waits for the interrupted test before giving up on it
+GRACE = 5.0
+
+OnHang = Callable[[TestCase, str], None]
+ExcInfo = Tuple[Type[BaseException], BaseException, Optional[TracebackType]]
+
+
+class TestTimeoutError(Exception):
+    pass
+
+
+def timeout_of(test: TestCase, default: Optional[float]) -> Optional[float]:
+    """The limit of the seconds for the test: the attribute of its class or
+    the `default`."""
+    return getattr(test.__class__, TIMEOUT_ATTRIBUTE, default) or None
+
+
+def dump_stacks() -> str:
+    """The stacks of all the threads, as printed by `faulthandler`."""
+    with tempfile.TemporaryFile('w+') as f:
+        faulthandler.dump_traceback(file=f, all_threads=True)
+        f.seek(0)
+        return f.read()
+
+
+def _can_interrupt() -> bool:
+    return hasattr(signal, 'setitimer') \
+           and threading.current_thread() is threading.main_thread()
+
+
+class TimeoutWatchdog:
+    """Interrupts the tests that take longer than `default` seconds (or the
+    limit of their class). `deadline` is the `time.time()` when all the tests
+    must be finished.
+
+    `start` and `stop` are called by the result when each test starts and
+    stops. The errors reported for the test are passed to `reported`, so the
+    interruption is known to be reported."""
+
+    def __init__(self, default: Optional[float] = None,
+                 deadline: Optional[float] = None,
+                 on_hang: Optional[OnHang] = None,
+                 grace: float = GRACE):
+        self.default = default
+        self.deadline = deadline
+        self.on_hang = on_hang
+        self.grace = grace
+        self._message: Optional[str] = None
+        self._interrupts = False
+        self._previous_handler: Any = None
+        self._timer: Optional[threading.Timer] = None
+        # raised in the current test and not reported yet
+        self._raised: Optional[TestTimeoutError] = None
+
+    def expired(self) -> bool:
+        """Whether the time of the whole run is over."""
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def start(self, test: TestCase):
+        timeout = timeout_of(test, self.default)
+        message = f'The test did not finish in {timeout} seconds'
+        if self.deadline is not None:
+            left = max(self.deadline - time.time(), 0.001)
+            if timeout is None or left < timeout:
+                timeout = left
+                message = 'The time of the run is over'
+        self._raised = None
+        if timeout is None:
+            return
+        self._message = message
+        self._interrupts = _can_interrupt()
+        if self._interrupts:
+            self._previous_handler = signal.signal(signal.SIGALRM,
+                                                   self._alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        elif threading.current_thread() is threading.main_thread() \
+                and sys.__stderr__ is not None:
+            faulthandler.dump_traceback_later(timeout, file=sys.__stderr__)
+        if self.on_hang is not None:
+            self._timer = threading.Timer(
+                timeout + self.grace if self._interrupts else timeout,
+                self._hang, [test, message])
+            self._timer.daemon = True
+            self._timer.start()
+
+    def reported(self, err: ExcInfo):
+        """Called with each error of the test."""
+        if not isinstance(err, tuple):  # replayed from a worker
+            return
+        error: Optional[BaseException] = err[1]
+        while error is not None:
+            if error is self._raised:
+                self._raised = None
+                return
+            error = error.__cause__ or error.__context__
+
+    def take_unreported(self) -> Optional[ExcInfo]:
+        """The interruption of the current test, if the test caught the
+        exception and it was not reported."""
+        raised, self._raised = self._raised, None
+        if raised is None:
+            return None
+        return TestTimeoutError, raised, raised.__traceback__
+
+    def stop(self):
+        if self._message is None:
+            return
+        if self._interrupts:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM,
+                          self._previous_handler or signal.SIG_DFL)
+        elif threading.current_thread() is threading.main_thread():
+            faulthandler.cancel_dump_traceback_later()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._message = None
+
+    def _alarm(self, signum, frame):
+        self._raised = TestTimeoutError(f'{self._message}. The stacks of '
+                                        f'the threads:\n\n{dump_stacks()}')
+        raise self._raised
+
+    def _hang(self, test: TestCase, message: str):
+        assert self.on_hang is not None
+        self.on_hang(test, f'{message}, and the test could not be '
+                           f'interrupted. The stacks of the threads:\n\n'
+                           f'{dump_stacks()}')
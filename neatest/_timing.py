@@ -0,0 +1,148 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import sys
+import time
+from typing import List, NamedTuple, Optional, Tuple
+from unittest import TestCase, TestSuite
+
+TEST = 'test'
+SET_UP_CLASS = 'setUpClass'
+SET_UP_MODULE = 'setUpModule'
+TEAR_DOWN_CLASS = 'tearDownClass'
+TEAR_DOWN_MODULE = 'tearDownModule'
+
+FIXTURES = (SET_UP_CLASS, SET_UP_MODULE, TEAR_DOWN_CLASS, TEAR_DOWN_MODULE)
+
+
+class Timing(NamedTuple):
+    # TEST or one of FIXTURES
+    kind: str
+    # test ID, full name of the class or name of the module
+    name: str
+    # seconds of the wall clock
+    wall: float
+    # seconds of the CPU time
+    cpu: float
+
+    def label(self) -> str:
+        return self.name if self.kind == TEST else f'{self.kind} {self.name}'
+
+
+class Stopwatch:
+    def __init__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+    def timing(self, kind: str, name: str) -> Timing:
+        return Timing(kind, name,
+                      time.perf_counter() - self.wall,
+                      time.process_time() - self.cpu)
+
+
+# the attribute of a test that was run before it was reported to the result
+_STOPWATCH_ATTRIBUTE = '_neatest_stopwatch'
+
+
+def set_stopwatch(test, stopwatch: Stopwatch):
+    """Makes the result measure the test from the moment the `stopwatch` was
+    started, instead of the moment the result was told the test started."""
+    setattr(test, _STOPWATCH_ATTRIBUTE, stopwatch)
+
+
+def start_stopwatch(test) -> Stopwatch:
+    """The stopwatch for the test that is starting."""
+    stopwatch = test.__dict__.pop(_STOPWATCH_ATTRIBUTE, None) \
+        if hasattr(test, '__dict__') else None
+    return stopwatch if stopwatch is not None else Stopwatch()
+
+
+def _overrides(cls, method: str) -> bool:
+    if not (isinstance(cls, type) and issubclass(cls, TestCase)):
+        return False
+    return getattr(getattr(cls, method), '__func__', None) \
+        is not getattr(TestCase, method).__func__
+
+
+def _add_timing(result, timing: Timing):
+    add = getattr(result, 'addTiming', None)
+    if add is not None:
+        add(timing)
+
+
+def _class_name(cls) -> str:
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+class TimingSuite(TestSuite):
+    """Reports to the result (if it has the `addTiming` method) how long
+    the `setUpClass`, `setUpModule`, `tearDownClass` and `tearDownModule`
+    took."""
+
+    # the time of the tearDownModule called by _handleModuleFixture, which
+    # is not a part of the setUpModule time
+    _module_tear_down: Optional[Timing] = None
+
+    def _handleClassSetUp(self, test, result):
+        current = test.__class__
+        if current is getattr(result, '_previousTestClass', None) \
+                or not _overrides(current, 'setUpClass'):
+            return super()._handleClassSetUp(test, result)
+        stopwatch = Stopwatch()
+        super()._handleClassSetUp(test, result)
+        _add_timing(result, stopwatch.timing(SET_UP_CLASS,
+                                             _class_name(current)))
+
+    def _handleModuleFixture(self, test, result):
+        current = test.__class__.__module__
+        if current == self._get_previous_module(result) \
+                or not hasattr(sys.modules.get(current), 'setUpModule'):
+            return super()._handleModuleFixture(test, result)
+        self._module_tear_down = None
+        stopwatch = Stopwatch()
+        super()._handleModuleFixture(test, result)
+        timing = stopwatch.timing(SET_UP_MODULE, current)
+        if self._module_tear_down is not None:
+            timing = timing._replace(
+                wall=timing.wall - self._module_tear_down.wall,
+                cpu=timing.cpu - self._module_tear_down.cpu)
+        _add_timing(result, timing)
+
+    def _tearDownPreviousClass(self, test, result):
+        previous = getattr(result, '_previousTestClass', None)
+        if previous is None or previous is test.__class__ \
+                or getattr(previous, '_classSetupFailed', False) \
+                or not _overrides(previous, 'tearDownClass'):
+            return super()._tearDownPreviousClass(test, result)
+        stopwatch = Stopwatch()
+        super()._tearDownPreviousClass(test, result)
+        _add_timing(result, stopwatch.timing(TEAR_DOWN_CLASS,
+                                             _class_name(previous)))
+
+    def _handleModuleTearDown(self, result):
+        previous = self._get_previous_module(result)
+        if previous is None or getattr(result, '_moduleSetUpFailed', False) \
+                or not hasattr(sys.modules.get(previous), 'tearDownModule'):
+            return super()._handleModuleTearDown(result)
+        stopwatch = Stopwatch()
+        super()._handleModuleTearDown(result)
+        self._module_tear_down = stopwatch.timing(TEAR_DOWN_MODULE, previous)
+        _add_timing(result, self._module_tear_down)
+
+
+def slowest(timings: List[Timing], count: int) -> List[Timing]:
+    """The `count` longest items, or all of them if `count` is 0."""
+    ordered = sorted(timings, key=lambda t: t.wall, reverse=True)
+    return ordered[:count] if count > 0 else ordered
+
+
+def total_time(timings: List[Timing]) -> Tuple[float, float]:
+    """The seconds of the wall clock spent in the tests and in the
+    fixtures."""
+    tests = sum(t.wall for t in timings if t.kind == TEST)
+    fixtures = sum(t.wall for t in timings if t.kind in FIXTURES)
+    return tests, fixtures
+
+
+def format_timing(timing: Timing) -> str:
+    return f'{timing.wall:9.3f}s wall {timing.cpu:9.3f}s cpu  {timing.label()}'
@@ -0,0 +1,135 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+import warnings as wrn
+from typing import Dict, List, Optional, Set, Tuple
+
+from neatest._jsonl import JsonLinesReporter
+
+# category, message, filename, line number
+WarningKey = Tuple[type, str, str, int]
+
+
+class CollectedWarning:
+    """A distinct warning: the first occurrence and how many times it was
+    caught."""
+
+    # the number of test IDs kept for each warning
+    MAX_TESTS = 10
+
+    def __init__(self, message: wrn.WarningMessage, text: str):
+        self.message = message
+        # formatted by warnings.formatwarning
+        self.text = text
+        self.count = 0
+        # the first tests where the warning was caught
+        self.tests: List[str] = []
+        # the number of other tests where the warning was caught
+        self.more_tests = 0
+
+    def add_test(self, test_id: str):
+        if test_id in self.tests:
+            return
+        if len(self.tests) < self.MAX_TESTS:
+            self.tests.append(test_id)
+        else:
+            self.more_tests += 1
+
+    def describe(self) -> str:
+        """The formatted warning followed by the counts."""
+        text = self.text
+        if not text.endswith('\n'):
+            text += '\n'
+        if self.count > 1:
+            text += f'Caught {self.count} times\n'
+        if self.tests:
+            text += 'In ' + ', '.join(self.tests)
+            if self.more_tests:
+                text += f' and {self.more_tests} other tests'
+            text += '\n'
+        return text
+
+
+class WarningsCollector:
+    """Keeps the distinct warnings, instead of recording every occurrence.
+
+    The warnings containing any of the `ignore` strings (in the formatted
+    form) are counted, but not kept. `total` is the number of all the caught
+    warnings, including ignored.
+
+    The warnings are attributed to the test that is running. With the
+    `reporter`, the warnings of each test are reported when the test stops."""
+
+    def __init__(self, ignore: Optional[List[str]] = None,
+                 reporter: Optional[JsonLinesReporter] = None):
+        self.ignore = ignore or []
+        self.reporter = reporter
+        self.total = 0
+        self.collected: Dict[WarningKey, CollectedWarning] = {}
+        self.current_test: Optional[str] = None
+        self._ignored: Set[WarningKey] = set()
+        # test ID -> the warnings caught in the test and their counts
+        self._pending: Dict[Optional[str], Dict[WarningKey, int]] = {}
+
+    def showwarning(self, message, category, filename, lineno,
+                    file=None, line=None):
+        """Replaces `warnings.showwarning`."""
+        self.add(message, category, filename, lineno, line)
+
+    def add(self, message, category: type, filename: str, lineno: int,
+            line: Optional[str] = None, count: int = 1,
+            test_id: Optional[str] = None):
+        """Adds `count` occurrences of the warning caught in the test (the
+        current test, if `test_id` is None)."""
+        self.total += count
+        key = (category, str(message), filename, lineno)
+        if key in self._ignored:
+            return
+        item = self.collected.get(key)
+        if item is None:
+            text = wrn.formatwarning(message, category, filename, lineno,
+                                     line)
+            if any(bad in text for bad in self.ignore):
+                self._ignored.add(key)
+                return
+            item = CollectedWarning(
+                wrn.WarningMessage(message, category, filename, lineno,
+                                   line=line),
+                text)
+            self.collected[key] = item
+        item.count += count
+        if test_id is None:
+            test_id = self.current_test
+        if test_id is not None:
+            item.add_test(test_id)
+        if self.reporter is not None:
+            pending = self._pending.setdefault(test_id, {})
+            pending[key] = pending.get(key, 0) + count
+
+    def start_test(self, test_id: str):
+        self.current_test = test_id
+
+    def stop_test(self, test_id: Optional[str]):
+        """Reports the warnings caught in the test."""
+        if self.current_test == test_id:
+            self.current_test = None
+        pending = self._pending.pop(test_id, None)
+        if pending and self.reporter is not None:
+            for (category, message, filename, lineno), count \
+                    in pending.items():
+                self.reporter.emit('warning',
+                                   test=test_id,
+                                   category=category.__name__,
+                                   message=message,
+                                   filename=filename,
+                                   lineno=lineno,
+                                   count=count)
+
+    def flush(self):
+        """Reports the warnings caught outside the tests."""
+        for test_id in list(self._pending):
+            self.stop_test(test_id)
+
+    def warnings(self) -> List[wrn.WarningMessage]:
+        """The first occurrence of each warning that was not ignored."""
+        return [item.message for item in self.collected.values()]
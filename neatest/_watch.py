@@ -0,0 +1,101 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Rerunning the tests when the sources change.
+
+The tests are rerun in the same interpreter. Only the changed modules and
+the modules importing them are removed from `sys.modules`, so the third-party
+packages (and the unchanged parts of the project) are not imported again."""
+
+import importlib
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Set, TypeVar
+
+from neatest._cache import CacheDir
+from neatest._discovery import DiscoveryManifest, StaticIndex
+from neatest._impact import ImportGraph, module_name, project_files
+
+T = TypeVar('T')
+
+
+class FileWatcher:
+    """Polls the modification times of the .py files of the project."""
+
+    def __init__(self, top_level_dir: str, interval: float = 0.5):
+        self.top_level_dir = top_level_dir
+        self.interval = interval
+        self._snapshot = self.snapshot()
+
+    def snapshot(self) -> Dict[str, int]:
+        result: Dict[str, int] = {}
+        for path in project_files(self.top_level_dir):
+            try:
+                result[path] = os.stat(path).st_mtime_ns
+            except OSError:  # removed while listing
+                pass
+        return result
+
+    def changes(self) -> List[str]:
+        """The files created, modified or removed since the previous call."""
+        old, new = self._snapshot, self.snapshot()
+        self._snapshot = new
+        return sorted(path for path in set(old) | set(new)
+                      if old.get(path) != new.get(path))
+
+    def wait(self) -> List[str]:
+        """Blocks until some files change. The changes made within the
+        `interval` after the first one are returned together."""
+        while True:
+            time.sleep(self.interval)
+            changed = self.changes()
+            if changed:
+                break
+        while True:
+            time.sleep(self.interval)
+            more = self.changes()
+            if not more:
+                return changed
+            changed = sorted(set(changed) | set(more))
+
+
+def evict_modules(top_level_dir: str, changed_files: List[str],
+                  cache: bool = True) -> Set[str]:
+    """Removes from `sys.modules` the changed modules and all the modules
+    that import them, so they are imported again by the next discovery.
+    Returns the names of the removed modules."""
+    changed_modules = {name for name in (module_name(top_level_dir, f)
+                                         for f in changed_files)
+                       if name is not None}
+    manifest = DiscoveryManifest(
+        top_level_dir, CacheDir(top_level_dir) if cache else None)
+    affected = ImportGraph(
+        StaticIndex(top_level_dir, manifest)).affected(changed_modules)
+    evicted = {name for name in affected if name in sys.modules}
+    for name in evicted:
+        del sys.modules[name]
+    importlib.invalidate_caches()
+    return evicted
+
+
+def watch(top_level_dir: str,
+          run_changed: Callable[[Optional[List[str]]], T],
+          interval: float = 0.5,
+          cache: bool = True) -> T:
+    """Calls `run_changed(None)`, then `run_changed(changed_files)` after
+    each change of the sources, until interrupted with Ctrl+C. Returns the
+    result of the last call."""
+    watcher = FileWatcher(top_level_dir, interval)
+    result = run_changed(None)
+    try:
+        while True:
+            print()
+            print('Watching for changes (press Ctrl+C to stop)')
+            changed = watcher.wait()
+            evict_modules(top_level_dir, changed, cache)
+            print()
+            result = run_changed(changed)
+    except KeyboardInterrupt:
+        pass
+    return result
@@ -0,0 +1,324 @@
+# SPDX-FileCopyrightText: (c) 2021 Artёm IG <github.com/rtmigo>
+# SPDX-License-Identifier: MIT
+
+"""Running the tests outside the main process.
+
+A worker receives units of work (a module with tests, optionally limited
+to some test IDs), runs them and reports everything that happened as
+a stream of events. The events are plain lists of strings and numbers, so
+they can be sent through a pipe. `NeatestResult.replay` applies the events to
+the result in the main process."""
+
+import os
+import sys
+import time
+import warnings as wrn
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from unittest import TestResult
+
+from neatest._capture import CaptureBuffer, CaptureLimits
+from neatest._concurrent import group_concurrent
+from neatest._discovery import NeatestLoader, filter_suite, \
+    group_fixtures, iterate_tests
+from neatest._memory import MemoryTracker
+from neatest._profiler import OUTSIDE, SamplingProfiler
+from neatest._result import describe, captured_output
+from neatest._timeout import TimeoutWatchdog
+from neatest._timing import Stopwatch, Timing, TEST, start_stopwatch
+
+Emit = Callable[[List], None]
+
+
+class Unit(NamedTuple):
+    """A part of the test suite that is run by a single worker."""
+    # name of the module or package the tests were loaded from
+    name: str
+    # path to the module file or package directory
+    path: str
+    # None means all the tests loaded from the path
+    test_ids: Optional[List[str]]
+    # the number of the tests
+    total: int
+
+
+class WorkerOptions(NamedTuple):
+    top_level_dir: str
+    pattern: str
+    buffer: bool
+    failfast: bool
+    # value of PythonWarningsArgs
+    warnings_filter: str
+    # do not write anything to stdout and stderr
+    mute: bool
+    sys_path: List[str]
+    capture: CaptureLimits = CaptureLimits()
+    # measure the memory allocated by each test
+    track_memory: bool = False
+    # see ConcurrentSuite
+    async_concurrency: int = 0
+    async_timeout: Optional[float] = None
+    # see TimeoutWatchdog
+    timeout: Optional[float] = None
+    deadline: Optional[float] = None
+    # sample the stacks of the tests
+    profile: bool = False
+    # TestLoader.testNamePatterns
+    name_patterns: Optional[List[str]] = None
+
+
+class EventResult(TestResult):
+    """Reports each of the test outcomes by calling `emit`.
+
+    `is_stopped` allows stopping the run from outside the worker (when
+    another worker failed in the failfast mode).
+
+    The warnings are counted and sent when the test stops, once for each
+    distinct warning. With the `memory` tracker, the memory allocated by each
+    test is sent too. The `watchdog` interrupts the tests that take too
+    long, and stops the run when its time is over. The stacks sampled by the
+    `profiler` are sent when the test stops."""
+
+    def __init__(self, emit: Emit,
+                 is_stopped: Optional[Callable[[], bool]] = None,
+                 capture: CaptureLimits = CaptureLimits(),
+                 memory: Optional[MemoryTracker] = None,
+                 watchdog: Optional[TimeoutWatchdog] = None,
+                 profiler: Optional[SamplingProfiler] = None):
+        self._stop_requested = False
+        self._is_stopped = is_stopped
+        super().__init__()
+        self.emit = emit
+        self.capture = capture
+        self.memory = memory
+        self.watchdog = watchdog
+        self.profiler = profiler
+        self._stopwatch: Optional[Stopwatch] = None
+        # (category module, category name, message, filename, lineno) -> count
+        self._warnings: Dict[Tuple[str, str, str, str, int], int] = {}
+
+    @property  # type: ignore
+    def shouldStop(self) -> bool:  # type: ignore
+        return self._stop_requested or bool(
+            self._is_stopped and self._is_stopped())
+
+    @shouldStop.setter
+    def shouldStop(self, value: bool):
+        self._stop_requested = value
+
+    def _setupStdout(self):
+        if self.buffer and self._stdout_buffer is None:
+            self._stdout_buffer = CaptureBuffer(self.capture)
+            self._stderr_buffer = CaptureBuffer(self.capture)
+        super()._setupStdout()
+
+    def add_warning(self, message, category: type, filename: str,
+                    lineno: int):
+        key = (category.__module__, category.__qualname__, str(message),
+               filename, lineno)
+        self._warnings[key] = self._warnings.get(key, 0) + 1
+
+    def flush_warnings(self, test_id: Optional[str]):
+        """Sends the warnings caught since the previous call."""
+        for key, count in self._warnings.items():
+            self.emit(['warning', *key, test_id, count])
+        self._warnings.clear()
+
+    def _last_text(self, records: list) -> str:
+        # we don't keep the outcomes in the worker, they are only sent
+        return records.pop()[1]
+
+    def startTest(self, test):
+        # caught outside the tests, e.g. in setUpClass
+        self.flush_warnings(None)
+        super().startTest(test)
+        self.emit(['start', describe(test)])
+        if self.memory is not None:
+            self.memory.start_test(test.id())
+        self._stopwatch = start_stopwatch(test)
+        if self.watchdog is not None:
+            self.watchdog.start(test)
+        if self.profiler is not None:
+            self.profiler.start_test()
+
+    def stopTest(self, test):
+        if self.profiler is not None:
+            stacks = self.profiler.stop_test()
+            if stacks:
+                self.emit(['profile', test.id(), stacks])
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            unreported = self.watchdog.take_unreported()
+            if unreported is not None:
+                self.addError(test, unreported)
+            if self.watchdog.expired():
+                self.shouldStop = True
+        if self.memory is not None:
+            usage = self.memory.stop_test(test.id())
+            if usage is not None:
+                self.emit(['memory', *usage])
+        if self._stopwatch is not None:
+            self.addTiming(self._stopwatch.timing(TEST, test.id()))
+            self._stopwatch = None
+        output = captured_output(self)
+        super().stopTest(test)
+        self.flush_warnings(test.id())
+        self.emit(['stop', describe(test), output])
+
+    def addTiming(self, timing: Timing):
+        self.emit(['timing', *timing])
+
+    def addSuccess(self, test):
+        if self.watchdog is not None:
+            # the test caught the interruption
+            unreported = self.watchdog.take_unreported()
+            if unreported is not None:
+                self.addError(test, unreported)
+                return
+        super().addSuccess(test)
+        self.emit(['success', describe(test)])
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self.emit(['failure', describe(test), self._last_text(self.failures)])
+
+    def addError(self, test, err):
+        if self.watchdog is not None:
+            self.watchdog.reported(err)
+        super().addError(test, err)
+        self.emit(['error', describe(test), self._last_text(self.errors)])
+
+    def addSubTest(self, test, subtest, err):
+        if self.watchdog is not None and err is not None:
+            self.watchdog.reported(err)
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            if issubclass(err[0], test.failureException):
+                self.emit(['failure', describe(subtest),
+                           self._last_text(self.failures)])
+            else:
+                self.emit(['error', describe(subtest),
+                           self._last_text(self.errors)])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self.skipped.pop()
+        self.emit(['skip', describe(test), reason])
+
+    def addExpectedFailure(self, test, err):
+        if self.watchdog is not None:
+            self.watchdog.reported(err)
+        super().addExpectedFailure(test, err)
+        self.emit(['expected_failure', describe(test),
+                   self._last_text(self.expectedFailures)])
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self.unexpectedSuccesses.pop()
+        self.emit(['unexpected_success', describe(test)])
+
+
+class Worker:
+    """Runs the units in the current process.
+
+    If a test times out and cannot be interrupted, the test is reported as
+    an error, and `abandon` is called from another thread with the part of
+    the unit that was not run yet. It is expected to end the process."""
+
+    def __init__(self, options: WorkerOptions, emit: Emit,
+                 is_stopped: Optional[Callable[[], bool]] = None,
+                 abandon: Optional[Callable[[Unit], None]] = None):
+        self.options = options
+        self.emit = emit
+        self.abandon = abandon
+        if options.sys_path:
+            sys.path[:] = options.sys_path
+        self.loader = NeatestLoader(static=False)
+        self.loader.testNamePatterns = options.name_patterns
+        self._unit: Optional[Unit] = None
+        self._unit_ids: List[str] = []
+        self.profiler: Optional[SamplingProfiler] = None
+        if options.profile:
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+        self.result = EventResult(
+            emit, is_stopped, options.capture,
+            MemoryTracker() if options.track_memory else None,
+            TimeoutWatchdog(options.timeout, options.deadline,
+                            self._hang if abandon is not None else None),
+            self.profiler)
+        self.result.failfast = options.failfast
+        self.result.buffer = options.buffer
+        if options.mute:
+            sys.stdout = CaptureBuffer(options.capture)
+            sys.stderr = CaptureBuffer(options.capture)
+
+    def _show_warning(self, message, category, filename, lineno,
+                      file=None, line=None):
+        self.result.add_warning(message, category, filename, lineno)
+
+    def _hang(self, test, details: str):
+        # called by the watchdog thread, while the test is still running
+        self.emit(['error', describe(test), details])
+        self.emit(['stop', describe(test), [0, 0]])
+        ids = self._unit_ids
+        rest = ids[ids.index(test.id()) + 1:] if test.id() in ids else []
+        assert self._unit is not None and self.abandon is not None
+        self.abandon(self._unit._replace(test_ids=rest, total=len(rest)))
+
+    def run_unit(self, unit: Unit):
+        suite = self.loader.load_path(unit.path, self.options.pattern,
+                                      self.options.top_level_dir)
+        if unit.test_ids is not None:
+            test_ids = set(unit.test_ids)
+            suite = filter_suite(suite, test_ids.__contains__)
+        suite = group_fixtures(suite)
+        if self.options.async_concurrency > 0:
+            group_concurrent(suite, self.options.async_concurrency,
+                             self.options.async_timeout)
+        self._unit = unit
+        self._unit_ids = [test.id() for test in iterate_tests(suite)]
+        # importing here, since _neatest imports this module
+        from neatest._neatest import set_warnings_filter, PythonWarningsArgs
+        with wrn.catch_warnings():
+            wrn.showwarning = self._show_warning
+            set_warnings_filter(
+                PythonWarningsArgs(self.options.warnings_filter))
+            suite.run(self.result)
+        self.result.flush_warnings(None)
+        if self.profiler is not None:
+            # the fixtures and the imports
+            stacks = self.profiler.take_outside()
+            if stacks:
+                self.emit(['profile', OUTSIDE, stacks])
+
+
+def process_main(options: WorkerOptions, tasks, events, stop_event,
+                 first_task: Optional[tuple] = None):
+    """The entry point of a worker process. Runs the `first_task`, then
+    takes (index, unit) tuples from `tasks` until gets None.
+
+    If a test hangs, sends the rest of its unit with "unit_abandoned" and
+    exits, so the parent process can start another worker."""
+    index = -1
+
+    def abandon(rest: Unit):
+        events.put(['unit_abandoned', index, os.getpid(), list(rest)])
+        events.close()
+        events.join_thread()
+        os._exit(1)
+
+    worker = Worker(options, events.put, stop_event.is_set, abandon)
+    while True:
+        if first_task is not None:
+            task, first_task = first_task, None
+        else:
+            task = tasks.get()
+        if task is None:
+            break
+        index, unit = task
+        events.put(['unit_start', index, os.getpid()])
+        started = time.perf_counter()
+        if not stop_event.is_set():
+            worker.run_unit(Unit(*unit))
+        events.put(['unit_done', index, os.getpid(),
+                    time.perf_counter() - started])
@@ -0,0 +1,71 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from neatest._capture import CaptureBuffer, CaptureLimits
+from neatest._result import NeatestResult
+
+
+class TestCaptureBuffer(unittest.TestCase):
+    def test_spills_to_file(self):
+        buffer = CaptureBuffer(CaptureLimits(memory=10, output=None))
+        buffer.write('a' * 100)
+        print('é', file=buffer)
+        self.assertTrue(buffer._file._rolled)
+        self.assertEqual(buffer.getvalue(), 'a' * 100 + 'é\n')
+        self.assertEqual(buffer.tell(), 102)
+
+    def test_cleared_like_string_io(self):
+        buffer = CaptureBuffer()
+        buffer.write('abc')
+        buffer.seek(0)
+        buffer.truncate()
+        self.assertEqual(buffer.getvalue(), '')
+        self.assertEqual(buffer.tell(), 0)
+        with self.assertRaises(io.UnsupportedOperation):
+            buffer.seek(1)
+
+    def test_cleared_in_place(self):
+        buffer = CaptureBuffer(CaptureLimits(memory=10, output=None))
+        file = buffer._file
+        buffer.write('abc')
+        buffer.seek(0)
+        buffer.truncate()
+        buffer.write('de')
+        self.assertIs(buffer._file, file)
+        self.assertEqual(buffer.getvalue(), 'de')
+        # after spilling to the disk, the memory is used again
+        buffer.write('f' * 100)
+        buffer.seek(0)
+        buffer.truncate()
+        self.assertFalse(buffer._file._rolled)
+        self.assertEqual(buffer.getvalue(), '')
+
+    def test_output_limit(self):
+        buffer = CaptureBuffer(CaptureLimits(output=10))
+        buffer.write('start' + '-' * 100 + 'end')
+        self.assertEqual(buffer.getvalue(),
+                         'start\n[... 98 bytes of the output skipped ...]\n'
+                         '--end')
+
+
+class TestResultCapture(unittest.TestCase):
+    def test_failed_test_output(self):
+        class Chatty(unittest.TestCase):
+            def test_fail(self):
+                print('x' * 1000)
+                self.fail()
+
+        # the output of a failed test is also printed to the original stdout
+        with redirect_stdout(io.StringIO()):
+            result = NeatestResult(
+                io.StringIO(), True, 0,
+                capture=CaptureLimits(memory=100, output=20))
+            result.buffer = True
+            Chatty('test_fail').run(result)
+        text = result.failures[0][1]
+        self.assertIn('[... 981 bytes of the output skipped ...]', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+import unittest
+from unittest import TestResult, TestSuite
+
+from neatest._concurrent import ConcurrentSuite, group_concurrent
+
+
+def _make_case(marked: bool):
+    events = []
+
+    class Case(unittest.IsolatedAsyncioTestCase):
+        neatest_concurrent = marked
+
+        @classmethod
+        def setUpClass(cls):
+            events.append('setUpClass')
+
+        @classmethod
+        def tearDownClass(cls):
+            events.append('tearDownClass')
+
+        async def asyncSetUp(self):
+            self.value = 1
+
+        async def test_a(self):
+            await asyncio.sleep(0.3)
+
+        async def test_b(self):
+            await asyncio.sleep(0.3)
+            self.assertEqual(self.value, 2)
+
+        async def test_c(self):
+            self.addAsyncCleanup(self.cleanup)
+            await asyncio.sleep(0.3)
+
+        async def cleanup(self):
+            events.append('cleanup')
+
+        async def test_slow(self):
+            await asyncio.sleep(5)
+
+        @unittest.skip('skipped')
+        async def test_skip(self):
+            pass
+
+        @unittest.expectedFailure
+        async def test_expected_failure(self):
+            raise ValueError
+
+    return Case, events
+
+
+@unittest.skipIf(not hasattr(unittest, 'IsolatedAsyncioTestCase'),
+                 "IsolatedAsyncioTestCase requires Python 3.8")
+class TestConcurrent(unittest.TestCase):
+    def test_group(self):
+        Case, _ = _make_case(True)
+        Other, _ = _make_case(False)
+        loader = unittest.TestLoader()
+        suite = TestSuite([loader.loadTestsFromTestCase(Case),
+                           loader.loadTestsFromTestCase(Other)])
+        group_concurrent(suite, 4, None)
+        self.assertIsInstance(list(suite)[0], ConcurrentSuite)
+        self.assertNotIsInstance(list(suite)[1], ConcurrentSuite)
+        self.assertEqual(suite.countTestCases(), 12)
+
+    def test_run(self):
+        Case, events = _make_case(True)
+        suite = group_concurrent(
+            TestSuite([unittest.TestLoader().loadTestsFromTestCase(Case)]),
+            10, 1.0)
+        result = TestResult()
+        started = time.perf_counter()
+        suite.run(result)
+        self.assertLess(time.perf_counter() - started, 2.0)
+
+        self.assertEqual(result.testsRun, 6)
+        self.assertEqual([t.id().split('.')[-1] for t, _ in result.failures],
+                         ['test_b'])
+        self.assertEqual([t.id().split('.')[-1] for t, _ in result.errors],
+                         ['test_slow'])
+        self.assertIn('did not finish in 1.0 seconds', result.errors[0][1])
+        self.assertEqual(len(result.skipped), 1)
+        self.assertEqual(len(result.expectedFailures), 1)
+        self.assertEqual(events, ['setUpClass', 'cleanup', 'tearDownClass'])
+
+    def test_limit(self):
+        Case, _ = _make_case(True)
+        suite = ConcurrentSuite(
+            [Case('test_a'), Case('test_c')], limit=1)
+        started = time.perf_counter()
+        suite.run(TestResult())
+        self.assertGreaterEqual(time.perf_counter() - started, 0.6)
+
+
+if __name__ == "__main__":
+    unittest.main()
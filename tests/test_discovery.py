@@ -0,0 +1,355 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from neatest._cache import CacheDir
+from neatest._discovery import scan_source, StaticIndex, DiscoveryManifest, \
+    group_fixtures, iterate_tests, may_match_prefix, NeatestLoader
+from neatest._parallel import default_preload, discover_in_processes
+
+
+def sample_project_path(s: str) -> Path:
+    return Path(__file__).parent.parent / 'tests_sample_projects' / s
+
+
+class TestScanSource(unittest.TestCase):
+    def test_classes_and_imports(self):
+        scan = scan_source(
+            "import unittest as ut\n"
+            "from ..base import Base as B\n"
+            "from helpers import *\n"
+            "Alias = ut.TestCase\n"
+            "try:\n"
+            "    class A(ut.TestCase, metaclass=M):\n"
+            "        def test_a(self): pass\n"
+            "except ImportError:\n"
+            "    pass\n")
+        self.assertEqual(scan.imports, {'ut': 'unittest', 'B': '..base.Base'})
+        self.assertEqual(scan.assigned, {'Alias': 'ut.TestCase'})
+        self.assertEqual(scan.star_imports, ['helpers'])
+        self.assertEqual(len(scan.classes), 1)
+        self.assertEqual(scan.classes[0].bases, ['ut.TestCase'])
+        self.assertEqual(scan.classes[0].methods, ['test_a'])
+        self.assertFalse(scan.has_load_tests)
+        self.assertFalse(scan.syntax_error)
+
+    def test_load_tests_and_syntax_error(self):
+        self.assertTrue(scan_source("def load_tests(*a): pass").has_load_tests)
+        self.assertTrue(scan_source("def (:").syntax_error)
+
+    def test_assigned_methods(self):
+        scan = scan_source("class A:\n"
+                           "    def test_a(self): pass\n"
+                           "    test_b = test_a\n")
+        self.assertEqual(scan.classes[0].methods, ['test_a', 'test_b'])
+
+    def test_module_fixtures(self):
+        self.assertTrue(scan_source(
+            "def setUpModule(): pass").has_module_fixtures)
+        self.assertTrue(scan_source(
+            "from db import tearDownModule").has_module_fixtures)
+        self.assertFalse(scan_source(
+            "class A:\n    def setUpModule(self): pass").has_module_fixtures)
+
+
+def _make_cases():
+    # defined here, so they are not discovered as the tests
+
+    class A(unittest.TestCase):
+        def test_1(self): pass
+        def test_2(self): pass
+
+    class B(unittest.TestCase):
+        def test_1(self): pass
+
+    return A, B
+
+
+class TestGroupFixtures(unittest.TestCase):
+    def test_grouped(self):
+        a, b = _make_cases()
+        suite = unittest.TestSuite([unittest.TestSuite([a('test_1')]),
+                                    b('test_1'),
+                                    unittest.TestSuite([a('test_2')])])
+        grouped = group_fixtures(suite)
+        self.assertEqual([(t.__class__, t._testMethodName)
+                          for t in iterate_tests(grouped)],
+                         [(a, 'test_1'), (a, 'test_2'), (b, 'test_1')])
+
+    def test_already_grouped(self):
+        a, b = _make_cases()
+        suite = unittest.TestSuite([a('test_1'), a('test_2'), b('test_1')])
+        self.assertIs(group_fixtures(suite), suite)
+
+
+class TestStaticIndex(unittest.TestCase):
+    def test_inherited_from_project_class(self):
+        root = sample_project_path('static_scan')
+        index = StaticIndex(str(root))
+        self.assertTrue(index.is_test_class('pkg.base', 'Base'))
+        self.assertTrue(index.is_test_class('pkg.child', 'Child'))
+        self.assertTrue(index.may_contain_tests(
+            str(root / 'pkg' / 'child.py'), 'pkg.child'))
+        self.assertFalse(index.may_contain_tests(
+            str(root / 'pkg' / 'production.py'), 'pkg.production'))
+        self.assertFalse(index.may_contain_tests(
+            str(root / 'pkg' / 'helpers' / 'util.py'), 'pkg.helpers.util'))
+
+    def test_computed_bases(self):
+        # the bases that cannot be resolved without importing the module
+        sources = {
+            'test_call_result': "import unittest\n"
+                                "def make_base():\n"
+                                "    return unittest.TestCase\n"
+                                "Base = make_base()\n"
+                                "class TestX(Base):\n"
+                                "    def test_x(self): pass\n",
+            'test_conditional': "import sys, unittest\n"
+                                "TestCase = (unittest.TestCase if sys.argv\n"
+                                "            else unittest.TestCase)\n"
+                                "class TestX(TestCase):\n"
+                                "    def test_x(self): pass\n",
+            'test_type': "import unittest\n"
+                         "Base = type('Base', (unittest.TestCase,), {})\n"
+                         "class TestX(Base):\n"
+                         "    def test_x(self): pass\n",
+            'test_call_base': "import unittest\n"
+                              "def get_base():\n"
+                              "    return unittest.TestCase\n"
+                              "class TestX(get_base()):\n"
+                              "    def test_x(self): pass\n",
+            'test_imported_base': "from .test_call_result import Base\n"
+                                  "class TestY(Base):\n"
+                                  "    def test_y(self): pass\n",
+        }
+        with tempfile.TemporaryDirectory() as temp:
+            package = Path(temp) / 'computed'
+            package.mkdir()
+            (package / '__init__.py').write_text('')
+            for name, source in sources.items():
+                (package / f'{name}.py').write_text(source)
+            index = StaticIndex(temp)
+            for name in sources:
+                with self.subTest(name):
+                    self.assertTrue(index.may_contain_tests(
+                        str(package / f'{name}.py'), f'computed.{name}'))
+
+            sys.path.insert(0, temp)
+            try:
+                static = NeatestLoader().discover(temp, pattern='test*.py',
+                                                  top_level_dir=temp)
+                imported = NeatestLoader(static=False).discover(
+                    temp, pattern='test*.py', top_level_dir=temp)
+            finally:
+                sys.path.remove(temp)
+                for name in [m for m in sys.modules
+                             if m.split('.')[0] == 'computed']:
+                    del sys.modules[name]
+            self.assertEqual(static.countTestCases(),
+                             imported.countTestCases())
+            self.assertEqual(static.countTestCases(), 5)
+
+    def test_runtime_classes(self):
+        # the test cases that are not written as "class TestX(TestCase)"
+        sources = {
+            'test_external': "from neatest_external_base import Base\n"
+                             "class Foo(Base):\n"
+                             "    def test_x(self): pass\n",
+            'test_missing': "from neatest_missing_module import Base\n"
+                            "class Foo(Base):\n"
+                            "    def test_x(self): pass\n",
+            'test_made': "import unittest\n"
+                         "def make():\n"
+                         "    return type('TestM', (unittest.TestCase,),\n"
+                         "                {'test_x': lambda self: None})\n"
+                         "TestMade = make()\n",
+            'test_loop': "import unittest\n"
+                         "for _ in range(1):\n"
+                         "    class TestL(unittest.TestCase):\n"
+                         "        def test_x(self): pass\n",
+            'test_type': "import unittest\n"
+                         "TestT = type('TestT', (unittest.TestCase,),\n"
+                         "             {'test_x': lambda self: None})\n",
+            'test_globals': "import unittest\n"
+                            "for name in ['A']:\n"
+                            "    globals()['Test' + name] = type(\n"
+                            "        name, (unittest.TestCase,),\n"
+                            "        {'test_x': lambda self: None})\n",
+        }
+        with tempfile.TemporaryDirectory() as temp, \
+                tempfile.TemporaryDirectory() as installed:
+            (Path(installed) / 'neatest_external_base.py').write_text(
+                "import unittest\nclass Base(unittest.TestCase): pass\n")
+            package = Path(temp) / 'runtime'
+            package.mkdir()
+            (package / '__init__.py').write_text('')
+            for name, source in sources.items():
+                (package / f'{name}.py').write_text(source)
+            index = StaticIndex(temp)
+            for name in sources:
+                with self.subTest(name):
+                    self.assertTrue(index.may_contain_tests(
+                        str(package / f'{name}.py'), f'runtime.{name}'))
+                    self.assertTrue(index.may_match_names(
+                        str(package / f'{name}.py'), f'runtime.{name}',
+                        ['*.test_x']))
+
+            sys.path[:0] = [temp, installed]
+            try:
+                static = NeatestLoader().discover(temp, pattern='test*.py',
+                                                  top_level_dir=temp)
+                imported = NeatestLoader(static=False).discover(
+                    temp, pattern='test*.py', top_level_dir=temp)
+            finally:
+                sys.path.remove(temp)
+                sys.path.remove(installed)
+                for name in [m for m in sys.modules
+                             if m.split('.')[0] in ('runtime',
+                                                    'neatest_external_base')]:
+                    del sys.modules[name]
+            self.assertEqual(static.countTestCases(),
+                             imported.countTestCases())
+            # with the ImportError of test_missing as a failed test
+            self.assertEqual(static.countTestCases(), 6)
+
+    def test_standard_bases(self):
+        source = ("import enum\n"
+                  "class Color(enum.Enum):\n"
+                  "    RED = 1\n")
+        with tempfile.TemporaryDirectory() as temp:
+            (Path(temp) / 'test_color.py').write_text(source)
+            index = StaticIndex(temp)
+            # the standard library has no test cases except unittest ones
+            self.assertEqual(
+                index.may_contain_tests(str(Path(temp) / 'test_color.py'),
+                                        'test_color'),
+                not hasattr(sys, 'stdlib_module_names'))
+
+    def test_name_patterns(self):
+        root = sample_project_path('static_scan')
+        index = StaticIndex(str(root))
+        child = str(root / 'pkg' / 'child.py')
+        self.assertEqual(index.class_methods('pkg.child', 'Child'),
+                         {'test_base', 'test_child'})
+        self.assertTrue(index.may_match_names(child, 'pkg.child',
+                                              ['*Child.test_base']))
+        # the imported Base is loaded with its own ID
+        self.assertTrue(index.may_match_names(child, 'pkg.child',
+                                              ['pkg.base.*']))
+        self.assertFalse(index.may_match_names(child, 'pkg.child',
+                                               ['*test_other*']))
+        self.assertFalse(index.may_match_names(
+            str(root / 'pkg' / 'base.py'), 'pkg.base', ['*Child*']))
+
+    def test_default_preload(self):
+        root = sample_project_path('static_scan')
+        index = StaticIndex(str(root))
+        self.assertEqual(index.external_dependencies('pkg.child'), set())
+        self.assertEqual(index.external_dependencies('pkg.base'),
+                         {'unittest'})
+        # pkg.child imports unittest through pkg.base
+        self.assertEqual(default_preload(index, ['pkg.child']), ['unittest'])
+
+
+class TestDiscoverInProcesses(unittest.TestCase):
+    def test_ids_without_importing(self):
+        root = sample_project_path('two_packages')
+        results = list(discover_in_processes(
+            [str(root / 'alpha'), str(root / 'beta')], str(root), '*.py',
+            static=True, cache=False, select=None, jobs=2))
+        self.assertEqual(
+            [[(u.name, u.test_ids) for u in r.units] for r in results],
+            [[('alpha.test_alpha', ['alpha.test_alpha.TestAlpha.test_a',
+                                    'alpha.test_alpha.TestAlpha.test_b'])],
+             [('beta.test_beta', ['beta.test_beta.TestBeta.test_a'])]])
+        self.assertIn('alpha.test_alpha', results[0].imported)
+        self.assertNotIn('alpha.test_alpha', sys.modules)
+
+    def test_name_patterns(self):
+        root = sample_project_path('two_packages')
+        results = list(discover_in_processes(
+            [str(root / 'alpha'), str(root / 'beta')], str(root), '*.py',
+            static=True, cache=False, select=None, jobs=2,
+            name_patterns=['*.test_b']))
+        self.assertEqual(
+            [[(u.name, u.test_ids) for u in r.units] for r in results],
+            [[('alpha.test_alpha', ['alpha.test_alpha.TestAlpha.test_b'])],
+             []])
+        self.assertNotIn('beta.test_beta', results[1].imported)
+
+
+class TestMayMatchPrefix(unittest.TestCase):
+    def test_patterns(self):
+        for pattern, prefix, expected in [
+            ('*test_a*', 'pkg.mod.A.', True),
+            ('pkg.mod.*', 'pkg.mod.A.', True),
+            ('pkg.other.*', 'pkg.mod.A.', False),
+            ('pkg.mod.A', 'pkg.mod.A.', False),
+            ('pkg.mod.?.test', 'pkg.mod.A.', True),
+            ('pkg.mod.[AB].*', 'pkg.mod.A.', True),
+            ('pkg.mod.[!A].*', 'pkg.mod.A.', False),
+            ('*.B.*', 'pkg.mod.A.', True),
+        ]:
+            with self.subTest(pattern=pattern):
+                self.assertEqual(may_match_prefix(pattern, prefix), expected)
+
+
+class TestDiscoveryManifest(unittest.TestCase):
+    def test_invalidation(self):
+        with tempfile.TemporaryDirectory() as temp:
+            module = Path(temp) / 'mod.py'
+            module.write_text("class A: pass\n")
+
+            manifest = DiscoveryManifest(temp, CacheDir(temp))
+            self.assertEqual(manifest.scan(str(module)).classes[0].name, 'A')
+            manifest.set_tests(str(module), ['mod.A.test'])
+            manifest.save()
+
+            # the same content with another mtime: the entry is reused
+            os.utime(str(module), (0, 0))
+            manifest = DiscoveryManifest(temp, CacheDir(temp))
+            self.assertEqual(manifest.scan(str(module)).classes[0].name, 'A')
+            self.assertEqual(manifest.tests(str(module)), ['mod.A.test'])
+            manifest.save()
+
+            module.write_text("class B: pass\n")
+            manifest = DiscoveryManifest(temp, CacheDir(temp))
+            self.assertEqual(manifest.scan(str(module)).classes[0].name, 'B')
+            self.assertIsNone(manifest.tests(str(module)))
+
+            # without the cache nothing is read
+            self.assertIsNone(
+                DiscoveryManifest(temp).tests(str(module)))
+
+    def test_found_units(self):
+        with tempfile.TemporaryDirectory() as temp:
+            module = Path(temp) / 'test_mod.py'
+            module.write_text("import unittest\n")
+            units = [['test_mod', str(module), ['test_mod.T.test_a']]]
+
+            manifest = DiscoveryManifest(temp, CacheDir(temp))
+            self.assertIsNone(manifest.found_units(temp, 'test*.py', False))
+            manifest.set_found_units(temp, 'test*.py', False, units)
+            manifest.save()
+
+            manifest = DiscoveryManifest(temp, CacheDir(temp))
+            self.assertEqual(manifest.found_units(temp, 'test*.py', False),
+                             units)
+            # another pattern was not discovered
+            self.assertIsNone(manifest.found_units(temp, '*.py', False))
+
+            # a new file in the project
+            (Path(temp) / 'data.txt').write_text('')
+            manifest = DiscoveryManifest(temp, CacheDir(temp))
+            self.assertIsNone(manifest.found_units(temp, 'test*.py', False))
+
+            # without the cache nothing is stored
+            manifest = DiscoveryManifest(temp)
+            manifest.set_found_units(temp, 'test*.py', False, units)
+            self.assertIsNone(manifest.found_units(temp, 'test*.py', False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from neatest._durations import DurationHistory, longest_first
+from neatest._worker import Unit
+
+
+def _unit(name: str, total: int) -> Unit:
+    return Unit(name, f"{name}.py", None, total)
+
+
+class TestLongestFirst(unittest.TestCase):
+    def test_without_history(self):
+        history = DurationHistory(None)
+        units = [_unit('a', 1), _unit('b', 5), _unit('c', 1)]
+        self.assertEqual([u.name for u in longest_first(units, history)],
+                         ['b', 'a', 'c'])
+
+    def test_with_history(self):
+        history = DurationHistory(None)
+        history.update(tests={'d.T.test': 0.5},
+                       modules={'a': 10.0, 'b': 1.0, 'c': 3.0})
+        self.assertEqual(history.classes(), {'d.T': 0.5})
+        units = [_unit('a', 1), _unit('b', 10), _unit('c', 1),
+                 # never timed: 4 tests, the median is 3 seconds per test
+                 _unit('new', 4)]
+        self.assertEqual([u.name for u in longest_first(units, history)],
+                         ['new', 'a', 'c', 'b'])
+
+
+if __name__ == "__main__":
+    unittest.main()
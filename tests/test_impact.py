@@ -0,0 +1,36 @@
+import os
+import unittest
+from pathlib import Path
+
+from neatest._discovery import StaticIndex
+from neatest._impact import ImportGraph, module_name, changed_since
+
+
+def sample_project_path(s: str) -> Path:
+    return Path(__file__).parent.parent / 'tests_sample_projects' / s
+
+
+class TestImpact(unittest.TestCase):
+    def test_module_name(self):
+        self.assertEqual(module_name('/p', '/p/a/b.py'), 'a.b')
+        self.assertEqual(module_name('/p', '/p/a/__init__.py'), 'a')
+        self.assertEqual(module_name('/p', '/other/a.py'), None)
+
+    def test_affected(self):
+        root = str(sample_project_path('static_scan'))
+        graph = ImportGraph(StaticIndex(root))
+        self.assertEqual(graph.affected({'pkg.base'}),
+                         {'pkg.base', 'pkg.child'})
+        # the package is imported before any of its modules
+        self.assertTrue({'pkg.base', 'pkg.child', 'pkg.production'}
+                        <= graph.affected({'pkg'}))
+
+    def test_changed_since(self):
+        root = str(sample_project_path('static_scan'))
+        self.assertEqual(changed_since(root, '9999999999'), [])
+        self.assertIn(os.path.join(root, 'pkg', 'base.py'),
+                      changed_since(root, '1970-01-02T00:00:00'))
+
+
+if __name__ == "__main__":
+    unittest.main()
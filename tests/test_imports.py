@@ -0,0 +1,50 @@
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from neatest._imports import ImportProfiler, slowest_imports
+
+
+class TestImportProfiler(unittest.TestCase):
+    def setUp(self):
+        self.temp = TemporaryDirectory()
+        root = Path(self.temp.name)
+        (root / 'prof_slow.py').write_text(
+            'import time\ntime.sleep(0.2)\n')
+        (root / 'prof_middle.py').write_text('import prof_slow\n')
+        (root / 'prof_test.py').write_text('import prof_middle\n')
+        sys.path.insert(0, self.temp.name)
+
+    def tearDown(self):
+        sys.path.remove(self.temp.name)
+        for name in ('prof_slow', 'prof_middle', 'prof_test'):
+            sys.modules.pop(name, None)
+        self.temp.cleanup()
+
+    def test_profile(self):
+        with ImportProfiler() as profiler:
+            import prof_test  # noqa
+        # imported modules are not measured again
+        with ImportProfiler() as again:
+            import prof_test  # noqa
+        self.assertEqual(again.timings, [])
+
+        timings = {t.module: t for t in profiler.timings}
+        self.assertEqual(set(timings),
+                         {'prof_slow', 'prof_middle', 'prof_test'})
+        slow = timings['prof_slow']
+        self.assertGreaterEqual(slow.own, 0.2)
+        self.assertEqual(slow.imported_by, 'prof_test')
+        middle = timings['prof_middle']
+        self.assertGreaterEqual(middle.cumulative, 0.2)
+        self.assertLess(middle.own, 0.2)
+        self.assertEqual(timings['prof_test'].imported_by, 'prof_test')
+
+        top = slowest_imports(profiler.timings, 1)
+        self.assertEqual([t.module for t in top], ['prof_slow'])
+        self.assertEqual(len(slowest_imports(profiler.timings, 0)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from neatest._lastfailed import LastFailed, failure_key
+
+
+class TestLastFailed(unittest.TestCase):
+    def test_failure_key(self):
+        self.assertEqual(failure_key('m.C.test_a'), 'm.C.test_a')
+        self.assertEqual(failure_key('m.C.test_a (i=1)'), 'm.C.test_a')
+        self.assertEqual(failure_key('setUpClass (m.C)'), 'm.C')
+        self.assertEqual(failure_key('setUpModule (m)'), 'm')
+
+    def test_matches(self):
+        last = LastFailed(None)
+        last.update(['m.C.test_a (i=1)', 'setUpClass (m.D)'], [])
+        self.assertTrue(last.matches('m.C.test_a'))
+        self.assertFalse(last.matches('m.C.test_b'))
+        self.assertTrue(last.matches('m.D.test_b'))
+        self.assertFalse(last.matches('m.DD.test_b'))
+        self.assertTrue(last.may_be_in_module('m'))
+        self.assertFalse(last.may_be_in_module('n'))
+
+    def test_update_keeps_not_run(self):
+        last = LastFailed(None)
+        last.update(['m.C.test_a', 'm.C.test_b', 'setUpClass (m.D)'], [])
+        last.update([], ['m.C.test_a', 'm.D.test_c'])
+        self.assertEqual(last.keys, {'m.C.test_b'})
+
+    def test_failed_import(self):
+        last = LastFailed(None)
+        last.update(['unittest.loader._FailedTest.pkg.broken'], [])
+        self.assertTrue(last.may_be_in_module('pkg.broken'))
+        self.assertTrue(last.may_be_in_module('pkg'))
+        self.assertFalse(last.may_be_in_module('pkg.fine'))
+
+
+if __name__ == "__main__":
+    unittest.main()
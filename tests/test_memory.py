@@ -0,0 +1,40 @@
+import tracemalloc
+import unittest
+
+from neatest._memory import MemoryTracker, MemoryUsage, exceeding, largest
+
+
+class TestMemoryTracker(unittest.TestCase):
+    def test_peak_and_retained(self):
+        tracker = MemoryTracker()
+        kept = []
+        tracker.start_test('t')
+        data = bytearray(4 * 1024 * 1024)
+        del data
+        kept.append(bytearray(1024 * 1024))
+        usage = tracker.stop_test('t')
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertGreaterEqual(usage.peak, 4 * 1024 * 1024)
+        self.assertGreaterEqual(usage.retained, 1024 * 1024)
+        self.assertLess(usage.retained, 2 * 1024 * 1024)
+
+    def test_stopped_by_test(self):
+        tracker = MemoryTracker()
+        tracker.start_test('t')
+        tracemalloc.stop()
+        self.assertIsNone(tracker.stop_test('t'))
+
+    def test_limits(self):
+        usages = [MemoryUsage('a', 100, 0), MemoryUsage('b', 10, 10),
+                  MemoryUsage('c', 50, 1)]
+        self.assertEqual([u.test for u in largest(usages, 2)], ['a', 'c'])
+        self.assertEqual(len(largest(usages, 0)), 3)
+        self.assertEqual([u.test for u in exceeding(usages, 60, None)],
+                         ['a'])
+        self.assertEqual([u.test for u in exceeding(usages, 60, 5)],
+                         ['a', 'b'])
+        self.assertEqual(exceeding(usages, None, None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from neatest._profiler import OUTSIDE, PROFILE_DIR, SamplingProfiler, \
+    hottest, write_profile
+
+
+def _busy(seconds: float):
+    finish = time.perf_counter() + seconds
+    while time.perf_counter() < finish:
+        pass
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_attributes_to_test(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        try:
+            profiler.start_test()
+            _busy(0.2)
+            in_test = profiler.stop_test()
+            _busy(0.1)
+        finally:
+            profiler.stop()
+        outside = profiler.take_outside()
+        self.assertTrue(in_test)
+        self.assertTrue(outside)
+        # the stacks start from this module, not from the runner
+        for stacks in [in_test, outside]:
+            for stack in stacks:
+                self.assertTrue(
+                    stack.startswith('test_attributes_to_test ('), stack)
+            busy = sum(count for stack, count in stacks.items()
+                       if '_busy (' in stack)
+            self.assertGreater(busy, sum(stacks.values()) / 2)
+        self.assertEqual(profiler.take_outside(), {})
+
+
+class TestHottest(unittest.TestCase):
+    def test_own_and_total(self):
+        samples = {'a.A.test': {'test (t.py:1);parse (p.py:5)': 6,
+                                'test (t.py:1)': 1},
+                   OUTSIDE: {'setUpClass (t.py:9);parse (p.py:5)': 3}}
+        hot = hottest(samples, 0)
+        self.assertEqual([(h.function, h.own, h.total) for h in hot],
+                         [('parse (p.py:5)', 9, 9),
+                          ('test (t.py:1)', 1, 7)])
+        self.assertEqual(len(hottest(samples, 1)), 1)
+
+
+class TestWriteProfile(unittest.TestCase):
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as temp:
+            # the files of the project are kept
+            kept = Path(temp) / 'tests' / 'keep_me.txt'
+            kept.parent.mkdir()
+            kept.write_text('')
+            directory = Path(temp) / PROFILE_DIR
+            stale = directory / 'tests' / 'old.collapsed'
+            stale.parent.mkdir(parents=True)
+            stale.write_text('')
+            other = directory / 'tests' / 'notes.txt'
+            other.write_text('')
+            write_profile(temp,
+                          {'a.A.test_x': {'f (a.py:1);g (a.py:3)': 2},
+                           OUTSIDE: {'setUpClass (a.py:7)': 1}})
+            self.assertTrue(kept.exists())
+            self.assertEqual(
+                (directory / 'run.collapsed').read_text().splitlines(),
+                [f'{OUTSIDE};setUpClass (a.py:7) 1',
+                 'a.A.test_x;f (a.py:1);g (a.py:3) 2'])
+            self.assertEqual(
+                sorted(p.name for p in (directory / 'tests').iterdir()),
+                ['a.A.test_x.collapsed', 'notes.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from neatest._capture import CaptureLimits
+from neatest._remote import AddressError, options_from_json, \
+    options_to_json, parse_address
+from neatest._worker import WorkerOptions
+
+PROJECT = Path(__file__).parent.parent / 'tests_sample_projects' / 'remote'
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _connect(port: int) -> socket.socket:
+    # waits for the coordinator to start listening
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            return socket.create_connection(('127.0.0.1', port), timeout=30)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _neatest(args, env) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, '-m', 'neatest'] + args,
+                            cwd=str(PROJECT), env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True)
+
+
+class TestProtocol(unittest.TestCase):
+    def test_parse_address(self):
+        self.assertEqual(parse_address('8000'), ('127.0.0.1', 8000))
+        self.assertEqual(parse_address('example.com:80'),
+                         ('example.com', 80))
+        with self.assertRaises(AddressError):
+            parse_address('example.com')
+
+    def test_options(self):
+        options = WorkerOptions('.', '*.py', True, False, 'default', False,
+                                [], CaptureLimits(100, None))
+        data = json.loads(json.dumps(options_to_json(options)))
+        self.assertEqual(options_from_json(data), options)
+
+
+class TestCoordinator(unittest.TestCase):
+    def test_workers(self):
+        port = str(_free_port())
+        with tempfile.TemporaryDirectory() as temp:
+            env = os.environ.copy()
+            env['PYTHONPATH'] = os.pathsep.join(
+                [str(Path(__file__).parent.parent),
+                 env.get('PYTHONPATH', '')])
+            env['NEATEST_CRASH_FLAG'] = os.path.join(temp, 'crashed')
+            coordinator = _neatest(['--serve', port, '--json', '--no-cache'],
+                                   env)
+            workers = [_neatest(['--worker', f'127.0.0.1:{port}'], env)
+                       for _ in range(2)]
+            stdout, _ = coordinator.communicate(timeout=60)
+            exit_codes = sorted(w.wait(timeout=60) for w in workers)
+            for worker in workers:
+                worker.stdout.close()
+                worker.stderr.close()
+            self.assertTrue(os.path.exists(env['NEATEST_CRASH_FLAG']))
+
+        self.assertEqual(coordinator.returncode, 0)
+        summary = json.loads(stdout)
+        # the crashed test was run again by the other worker
+        self.assertEqual((summary['run'], summary['failures'],
+                          summary['errors']), (5, 0, 0))
+        self.assertEqual(exit_codes, [0, 1])
+
+    def test_garbage_clients(self):
+        port = _free_port()
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(
+            [str(Path(__file__).parent.parent), env.get('PYTHONPATH', '')])
+        coordinator = _neatest(['--serve', str(port), '--json', '--no-cache'],
+                               env)
+        try:
+            messages = [b'not json\n', b'{"ready": 1}\n',
+                        b'["unit_done", 1.0]\n',
+                        b'["ready", 1]\n["start", 42]\n']
+            for message in messages:
+                with _connect(port) as sock:
+                    sock.sendall(message)
+                    # the coordinator disconnects the client
+                    while sock.recv(65536):
+                        pass
+            worker = _neatest(['--worker', f'127.0.0.1:{port}'], env)
+            stdout, _ = coordinator.communicate(timeout=60)
+            self.assertEqual(worker.wait(timeout=60), 0)
+            worker.stdout.close()
+            worker.stderr.close()
+        finally:
+            coordinator.kill()
+            coordinator.wait()
+
+        self.assertEqual(coordinator.returncode, 0)
+        summary = json.loads(stdout)
+        # the unit given to the last client was run by the worker
+        self.assertEqual((summary['run'], summary['failures'],
+                          summary['errors']), (5, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
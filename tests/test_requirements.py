@@ -0,0 +1,82 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from neatest._requirements import SatisfiedRequirements, is_satisfied, \
+    unsatisfied, _packaging_requirements, _simple_satisfied
+
+try:
+    from importlib import metadata  # noqa
+except ImportError:  # Python 3.7
+    try:
+        import importlib_metadata as metadata  # type: ignore # noqa
+    except ImportError:
+        metadata = None  # type: ignore
+
+# the distribution installed by the tests
+FAKE = 'neatestfakedist'
+
+
+@unittest.skipIf(metadata is None, "importlib.metadata is not available")
+class TestRequirements(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = tempfile.TemporaryDirectory()
+        dist_info = Path(cls.temp.name) / f'{FAKE}-1.2.dist-info'
+        dist_info.mkdir()
+        (dist_info / 'METADATA').write_text(
+            f'Metadata-Version: 2.1\nName: {FAKE}\nVersion: 1.2\n')
+        sys.path.append(cls.temp.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(cls.temp.name)
+        cls.temp.cleanup()
+
+    def test_names(self):
+        self.assertTrue(is_satisfied(FAKE))
+        self.assertFalse(is_satisfied('surely-not-installed-package'))
+        self.assertEqual(unsatisfied([FAKE, 'surely-not-installed-package']),
+                         ['surely-not-installed-package'])
+
+    @unittest.skipIf(_packaging_requirements() is None,
+                     "neither packaging nor pip is installed")
+    def test_specifiers(self):
+        self.assertTrue(is_satisfied(f'{FAKE}>=1.0'))
+        self.assertFalse(is_satisfied(f'{FAKE}<1.0'))
+        self.assertTrue(is_satisfied(
+            'surely-not-installed-package; python_version < "3"'))
+        self.assertIsNone(is_satisfied('./some/path'))
+
+    def test_without_packaging(self):
+        for spec, expected in [
+                (FAKE, True),
+                (f'{FAKE}==1.2', True),
+                (f'{FAKE}==1.2.0', True),
+                (f'{FAKE} >= 1.0, < 2', True),
+                (f'{FAKE}>1.2', False),
+                (f'{FAKE}<=1.1.9', False),
+                (f'{FAKE}!=1.2', False),
+                ('surely-not-installed-package>=1', False),
+                # left to pip
+                (f'{FAKE}~=1.0', None),
+                (f'{FAKE}==1.*', None),
+                (f'{FAKE}[extra]', None),
+                (f'{FAKE}; python_version < "3"', None),
+                ('./some/path', None)]:
+            with self.subTest(spec=spec):
+                self.assertEqual(_simple_satisfied(spec), expected)
+
+
+class TestSatisfiedRequirements(unittest.TestCase):
+    def test_fingerprint(self):
+        satisfied = SatisfiedRequirements(None)
+        self.assertFalse(['setuptools'] in satisfied)
+        satisfied.add(['setuptools'])
+        self.assertTrue(['setuptools'] in satisfied)
+        self.assertFalse(['setuptools', 'other'] in satisfied)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from neatest._shards import Shard, merge_results, parse_shard, split_classes
+
+
+class TestParseShard(unittest.TestCase):
+    def test_valid(self):
+        self.assertEqual(parse_shard('2/4'), Shard(2, 4))
+        self.assertEqual(str(parse_shard('1/1')), '1/1')
+
+    def test_invalid(self):
+        for text in ['0/2', '3/2', '2', 'a/b', '']:
+            with self.subTest(text):
+                with self.assertRaises(ValueError):
+                    parse_shard(text)
+
+
+class TestSplitClasses(unittest.TestCase):
+    ids = ['m.A.test_1', 'm.A.test_2', 'm.B.test_1', 'n.C.test_1',
+           'n.C.test_2', 'n.C.test_3']
+
+    def test_classes_kept_together(self):
+        parts = split_classes(self.ids, 2, {})
+        self.assertEqual(sorted(i for part in parts for i in part),
+                         sorted(self.ids))
+        self.assertEqual(parts, [['n.C.test_1', 'n.C.test_2', 'n.C.test_3'],
+                                 ['m.A.test_1', 'm.A.test_2', 'm.B.test_1']])
+
+    def test_balanced_by_durations(self):
+        durations = {'m.B.test_1': 10.0, 'm.A.test_1': 1.0,
+                     'm.A.test_2': 1.0}
+        parts = split_classes(self.ids, 2, durations)
+        self.assertEqual(parts[0], ['m.B.test_1'])
+
+    def test_groups(self):
+        # the tests of the module "m" are kept together
+        parts = split_classes(self.ids, 2, {},
+                              lambda i: 'm' if i.startswith('m.') else i)
+        self.assertIn(['m.A.test_1', 'm.A.test_2', 'm.B.test_1'], parts)
+
+    def test_deterministic(self):
+        def split(ids):
+            return [sorted(part) for part in split_classes(ids, 3, {})]
+
+        self.assertEqual(split(self.ids), split(list(reversed(self.ids))))
+
+    def test_more_shards_than_classes(self):
+        parts = split_classes(self.ids, 5, {})
+        self.assertEqual(len(parts), 5)
+        self.assertEqual(parts[3:], [[], []])
+
+
+class TestMergeResults(unittest.TestCase):
+    def test_merge(self):
+        merged = merge_results([
+            {'run': 2, 'failures': 1, 'shard': '1/2', 'ok': False,
+             'problems': [['a.T.test', 'failure', 'details']],
+             'test_durations': {'a.T.test': 1.0}},
+            {'run': 3, 'shard': '2/2', 'ok': True,
+             'test_durations': {'b.T.test': 2.0}}])
+        self.assertEqual(merged.summary['run'], 5)
+        self.assertEqual(merged.summary['failures'], 1)
+        self.assertEqual(merged.summary['files'], 2)
+        self.assertEqual(merged.problems, [['a.T.test', 'failure', 'details']])
+        self.assertEqual(merged.test_durations,
+                         {'a.T.test': 1.0, 'b.T.test': 2.0})
+        self.assertEqual(merged.missing, [])
+        self.assertFalse(merged.ok)
+
+    def test_missing_shard(self):
+        merged = merge_results([{'run': 1, 'shard': '2/3', 'ok': True}])
+        self.assertEqual(merged.missing, ['1/3', '3/3'])
+        self.assertFalse(merged.ok)
+        self.assertTrue(merge_results([{'run': 1, 'ok': True}]).ok)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import sys
+import threading
+import time
+import unittest
+from unittest import TestSuite
+
+from neatest._result import NeatestResult
+from neatest._threads import ThreadOutput, ThreadPoolSuite, is_serial
+
+
+class TestThreadOutput(unittest.TestCase):
+    def test_redirect(self):
+        default = io.StringIO()
+        output = ThreadOutput(default)
+        captured = io.StringIO()
+
+        def work():
+            output.redirect(captured)
+            output.write('thread')
+            output.redirect(None)
+            output.write('default')
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        output.redirect(None)
+        thread.join()
+        output.write('main')
+        self.assertEqual(captured.getvalue(), 'thread')
+        self.assertEqual(default.getvalue(), 'defaultmain')
+        self.assertEqual(output.getvalue(), 'defaultmain')
+
+
+def _make_cases():
+    running = []
+
+    class Sleeping(unittest.TestCase):
+        def test_sleep(self):
+            print('printed by', self.id())
+            time.sleep(0.3)
+
+        def test_fail(self):
+            print('printed by', self.id())
+            self.fail()
+
+    class Other(Sleeping):
+        pass
+
+    class Serial(unittest.TestCase):
+        neatest_serial = True
+
+        def test_alone(self):
+            running.append(threading.active_count())
+
+    return [Sleeping, Other, Serial], running
+
+
+class TestThreadPoolSuite(unittest.TestCase):
+    def test_run(self):
+        classes, running = _make_cases()
+        loader = unittest.TestLoader()
+        suites = [TestSuite([loader.loadTestsFromTestCase(c)])
+                  for c in classes]
+        self.assertEqual([is_serial(s) for s in suites],
+                         [False, False, True])
+        runnable = ThreadPoolSuite(suites[:2], 2, buffer=True,
+                                   serial=suites[2:])
+        self.assertEqual(runnable.countTestCases(), 5)
+
+        result = NeatestResult(io.StringIO(), True, 0)
+        threads = threading.active_count()
+        mirrored = io.StringIO()
+        with contextlib.redirect_stdout(mirrored):
+            started = time.perf_counter()
+            runnable(result)
+            self.assertLess(time.perf_counter() - started, 0.55)
+            self.assertIs(sys.stdout, mirrored)
+
+        self.assertEqual(result.testsRun, 5)
+        self.assertEqual(len(result.failures), 2)
+        for test, text in result.failures:
+            # the output of each test is captured separately
+            self.assertIn(f'printed by {test.id()}', text)
+            self.assertNotIn('test_sleep', text)
+        # the output of the failed tests is also shown, as unittest does
+        self.assertEqual(mirrored.getvalue().count('printed by'), 2)
+        # the serial test was run by the only thread
+        self.assertEqual(running, [threads + 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import io
+import signal
+import threading
+import time
+import unittest
+from unittest import TestSuite
+
+from neatest._result import NeatestResult
+from neatest._timeout import TimeoutWatchdog, TestTimeoutError, timeout_of
+from neatest._worker import EventResult
+
+
+def _make_cases():
+    # defined here, so they are not discovered as the tests
+
+    class Sleeping(unittest.TestCase):
+        def test_sleep(self):
+            time.sleep(5)
+
+        def test_fast(self):
+            pass
+
+    class Limited(Sleeping):
+        neatest_timeout = 0.2
+
+    class Swallowing(unittest.TestCase):
+        neatest_timeout = 0.2
+
+        def test_catch(self):
+            try:
+                time.sleep(5)
+            except Exception:
+                pass
+
+    return Sleeping, Limited, Swallowing
+
+
+@unittest.skipUnless(hasattr(signal, 'setitimer'),
+                     'the tests are interrupted with SIGALRM')
+class TestTimeoutWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.sleeping, self.limited, self.swallowing = _make_cases()
+
+    def _run(self, suite: TestSuite, watchdog: TimeoutWatchdog) -> list:
+        events = []
+        suite.run(EventResult(events.append, watchdog=watchdog))
+        return [event for event in events
+                if event[0] in ('success', 'error', 'failure')]
+
+    def test_interrupts(self):
+        started = time.monotonic()
+        outcomes = self._run(TestSuite([self.sleeping('test_sleep'),
+                                        self.sleeping('test_fast')]),
+                             TimeoutWatchdog(0.2))
+        self.assertLess(time.monotonic() - started, 3)
+        self.assertEqual([event[0] for event in outcomes],
+                         ['error', 'success'])
+        self.assertIn('TestTimeoutError: The test did not finish in 0.2 '
+                      'seconds', outcomes[0][2])
+        self.assertIn('test_sleep', outcomes[0][2])
+
+    def test_class_attribute(self):
+        self.assertEqual(timeout_of(self.limited('test_sleep'), 10), 0.2)
+        self.assertEqual(timeout_of(self.sleeping('test_sleep'), 10), 10)
+        self.assertIsNone(timeout_of(self.sleeping('test_sleep'), None))
+        outcomes = self._run(TestSuite([self.limited('test_sleep')]),
+                             TimeoutWatchdog())
+        self.assertEqual(outcomes[0][0], 'error')
+
+    def test_caught(self):
+        events = []
+        result = EventResult(events.append, watchdog=TimeoutWatchdog())
+        TestSuite([self.swallowing('test_catch')]).run(result)
+        outcomes = [event for event in events
+                    if event[0] in ('success', 'error', 'failure')]
+        self.assertEqual([event[0] for event in outcomes], ['error'])
+        self.assertIn('TestTimeoutError', outcomes[0][2])
+
+        result = NeatestResult(io.StringIO(), False, 0,
+                               watchdog=TimeoutWatchdog())
+        TestSuite([self.swallowing('test_catch')]).run(result)
+        self.assertEqual(len(result.errors), 1)
+        self.assertFalse(result.wasSuccessful())
+
+    def test_deadline(self):
+        result = EventResult(lambda event: None,
+                             watchdog=TimeoutWatchdog(
+                                 deadline=time.time() + 0.2))
+        TestSuite([self.sleeping('test_sleep'),
+                   self.sleeping('test_fast')]).run(result)
+        self.assertTrue(result.shouldStop)
+        self.assertEqual(result.testsRun, 1)
+
+    def test_hang(self):
+        hung = threading.Event()
+        details = []
+
+        def on_hang(test, text):
+            details.append(text)
+            hung.set()
+
+        watchdog = TimeoutWatchdog(0.1, on_hang=on_hang, grace=0.1)
+        watchdog.start(self.sleeping('test_sleep'))
+        try:
+            # the test ignores the interruption
+            while not hung.is_set():
+                try:
+                    hung.wait(1)
+                except TestTimeoutError:
+                    pass
+        finally:
+            watchdog.stop()
+        self.assertIn('could not be interrupted', details[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
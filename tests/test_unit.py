@@ -4,6 +4,8 @@ from pathlib import Path
 import unittest
 from typing import List, Optional
 import json
+import multiprocessing
+import tempfile
 
 import neatest
 from neatest._neatest import ModulesNotFoundError
@@ -88,6 +90,222 @@ class TestsProcess(unittest.TestCase):
         self.assertEqual(completed.returncode, 0)
         self.assertTrue("ResourceWarning" not in completed.stdout)
 
+    def test_static_discovery(self):
+        # the modules without tests raise AssertionError on import
+        completed = _run(["--json", "--static"],
+                         cwd=sample_project_path('static_scan'))
+        self.assertEqual(completed.returncode, 0)
+        d = json.loads(completed.stdout)
+        # Base.test_base runs twice, since the Base is also imported
+        # into the child.py. The same happens with `unittest discover`
+        self.assertEqual(d['run'], 4)
+        self.assertEqual(d['errors'], 0)
+
+    def test_import_all(self):
+        # every module is imported by default
+        completed = _run(["--json"], cwd=sample_project_path('static_scan'))
+        self.assertNotEqual(completed.returncode, 0)
+        d = json.loads(completed.stdout)
+        self.assertEqual(d['errors'], 2)
+
+    def test_jobs(self):
+        completed = _run(["--json", "-j", "2"],
+                         cwd=sample_project_path('tests'))
+        d = json.loads(completed.stdout)
+        self.assertEqual(d['run'], 7)
+        self.assertEqual(d['failures'], 1)
+        self.assertEqual(d['warnings'], 1)
+        self.assertNotEqual(completed.returncode, 0)
+
+    def test_jobs_start_dirs(self):
+        completed = _run(["-j", "2"],
+                         cwd=sample_project_path('two_packages'))
+        self.assertEqual(completed.returncode, 0)
+        self.assertIn('Package "alpha" contains 2 tests', completed.stdout)
+        self.assertIn('Package "beta" contains 1 tests', completed.stdout)
+
+    def test_jobs_warning_fail(self):
+        completed = _run(["-j", "2", "-w", "fail"],
+                         cwd=sample_project_path('resource_warning'))
+        self.assertTrue("ResourceWarning" in completed.stdout)
+        self.assertNotEqual(completed.returncode, 0)
+
+    @unittest.skipIf(
+        'forkserver' not in multiprocessing.get_all_start_methods(),
+        "the platform has no fork server")
+    def test_forkserver(self):
+        completed = _run(["--json", "--backend", "forkserver",
+                          "--preload", "json"],
+                         cwd=sample_project_path('fixtures'))
+        d = json.loads(completed.stdout)
+        self.assertEqual((d['run'], d['failures'], d['errors']), (2, 0, 0))
+
+    def test_jsonl(self):
+        with tempfile.TemporaryDirectory() as temp:
+            path = os.path.join(temp, 'events.jsonl')
+            _run(["--jsonl", path], cwd=sample_project_path('fixtures'))
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+        self.assertEqual(events[0]['event'], 'run_start')
+        self.assertEqual(events[-1]['event'], 'run_end')
+        self.assertEqual(events[-1]['run'], 2)
+        outcomes = {e['test']: e['outcome'] for e in events
+                    if e['event'] == 'outcome'}
+        self.assertEqual(outcomes, {'slow.Slow.test_sleep': 'success',
+                                    'slow.Slow.test_fast': 'success'})
+        self.assertIn(('setUpModule', 'slow'),
+                      [(e['kind'], e['name']) for e in events
+                       if e['event'] == 'duration'])
+
+        # only the events are written to stdout
+        completed = _run(["--jsonl", "-", "-j", "2"],
+                         cwd=sample_project_path('fixtures'))
+        events = [json.loads(line) for line in completed.stdout.splitlines()]
+        self.assertEqual(len([e for e in events if e['event'] == 'end']), 2)
+        self.assertIn('Ran 2 tests', completed.stderr)
+
+    def test_durations(self):
+        completed = _run(["--json", "--durations", "2"],
+                         cwd=sample_project_path('fixtures'))
+        d = json.loads(completed.stdout)
+        self.assertEqual(
+            [(item['kind'], item['name']) for item in d['durations']],
+            [('test', 'slow.Slow.test_sleep'),
+             ('setUpClass', 'slow.Slow')])
+
+        self.assertGreater(d['time']['fixtures'], 0.3)
+        self.assertGreater(d['time']['tests'], 0.3)
+
+        completed = _run(["--durations", "0"],
+                         cwd=sample_project_path('fixtures'))
+        self.assertTrue("Slowest 5 items" in completed.stdout)
+        self.assertTrue("setUpModule slow" in completed.stdout)
+        self.assertTrue("tearDownClass slow.Slow" in completed.stdout)
+        self.assertTrue("Tests took" in completed.stdout)
+
+    def test_profile(self):
+        for jobs in ['1', '2']:
+            with self.subTest(jobs=jobs), \
+                    tempfile.TemporaryDirectory() as temp:
+                completed = _run(["--json", "-j", jobs, "--profile", temp],
+                                 cwd=sample_project_path('fixtures'))
+                d = json.loads(completed.stdout)
+                self.assertIn('test_sleep', d['profile'][0]['function'])
+                profiles = Path(temp) / 'neatest_profiles'
+                run = (profiles / 'run.collapsed').read_text()
+                self.assertIn('slow.Slow.test_sleep;test_sleep (', run)
+                self.assertTrue(
+                    (profiles / 'tests' /
+                     'slow.Slow.test_sleep.collapsed').exists())
+
+    def test_memory(self):
+        for jobs in ['1', '2']:
+            completed = _run(["--json", "--memory", "2", "-j", jobs],
+                             cwd=sample_project_path('memory'))
+            self.assertEqual(completed.returncode, 0)
+            d = json.loads(completed.stdout)
+            self.assertEqual([item['test'] for item in d['memory']],
+                             ['pkg.test_memory.Memory.test_large',
+                              'pkg.test_memory.Memory.test_leak'])
+            self.assertEqual(d['memory_exceeded'], 0)
+
+        completed = _run(["--leak-limit", "1000000"],
+                         cwd=sample_project_path('memory'))
+        self.assertNotEqual(completed.returncode, 0)
+        self.assertIn("1 tests exceeded the memory limits", completed.stdout)
+        self.assertIn("Testing failed due to memory limits", completed.stdout)
+
+    def test_shards(self):
+        with tempfile.TemporaryDirectory() as temp:
+            files = [str(Path(temp) / f'{index}.json') for index in [1, 2]]
+            for index, file in enumerate(files, 1):
+                completed = _run(["--static", "--shard", f"{index}/2",
+                                  "--result-file", file],
+                                 cwd=sample_project_path('static_scan'))
+                self.assertEqual(completed.returncode, 0)
+                self.assertIn(f"Shard {index}/2 contains", completed.stdout)
+
+            durations = str(Path(temp) / 'durations.json')
+            completed = _run(["merge", "--json", "--durations-file",
+                              durations] + files)
+            self.assertEqual(completed.returncode, 0)
+            d = json.loads(completed.stdout)
+            self.assertEqual(d['run'], 4)
+            self.assertEqual(d['missing'], [])
+            self.assertTrue(d['ok'])
+            with open(durations) as f:
+                # Base.test_base runs twice with the same ID
+                self.assertEqual(len(json.load(f)['tests']), 3)
+
+            completed = _run(["merge", files[0]])
+            self.assertNotEqual(completed.returncode, 0)
+            self.assertIn("Missing the results of the shards: 2/2",
+                          completed.stdout)
+
+    def test_timeout(self):
+        completed = _run(["--json", "-j", "2"],
+                         cwd=sample_project_path('timeout'))
+        self.assertNotEqual(completed.returncode, 0)
+        d = json.loads(completed.stdout)
+        # the rest of the module is run by the new worker
+        self.assertEqual(d['run'], 4)
+        self.assertEqual(d['errors'], 1)
+
+    def test_name_patterns(self):
+        for jobs in ['1', '2']:
+            with self.subTest(jobs=jobs):
+                completed = _run(["--json", "--static", "-j", jobs,
+                                  "-k", "test_child"],
+                                 cwd=sample_project_path('static_scan'))
+                self.assertEqual(json.loads(completed.stdout)['run'], 1)
+                completed = _run(["--json", "--static", "-j", jobs,
+                                  "-k", "*.Base.test_base"],
+                                 cwd=sample_project_path('static_scan'))
+                self.assertEqual(json.loads(completed.stdout)['run'], 2)
+
+    def test_total_timeout(self):
+        # the fixtures take longer than the whole run may
+        completed = _run(["--json", "--total-timeout", "0.25"],
+                         cwd=sample_project_path('fixtures'))
+        self.assertNotEqual(completed.returncode, 0)
+        d = json.loads(completed.stdout)
+        self.assertGreater(d['not_run'], 0)
+        self.assertEqual(d['run'] + d['not_run'], 2)
+
+    def test_changed(self):
+        completed = _run(["--json", "--static", "--changed", "pkg/base.py"],
+                         cwd=sample_project_path('static_scan'))
+        self.assertEqual(json.loads(completed.stdout)['run'], 4)
+        completed = _run(["--json", "--static",
+                          "--changed", "pkg/helpers/util.py"],
+                         cwd=sample_project_path('static_scan'))
+        self.assertEqual(json.loads(completed.stdout)['run'], 0)
+
+    def test_last_failed(self):
+        project = sample_project_path('last_failed')
+        flag = project / 'fail.flag'
+
+        def run(*args):
+            return json.loads(_run(["--json"] + list(args),
+                                   cwd=project).stdout)
+
+        flag.write_text('')
+        try:
+            d = run("--clear-cache")
+            self.assertEqual((d['run'], d['failures']), (4, 1))
+            d = run("--last-failed")
+            self.assertEqual((d['run'], d['failures']), (1, 1))
+            d = run("--failed-first", "--failfast")
+            self.assertEqual((d['run'], d['failures']), (1, 1))
+        finally:
+            flag.unlink()
+
+        d = run("--last-failed")
+        self.assertEqual((d['run'], d['failures']), (1, 0))
+        # nothing failed, so all the tests are run
+        d = run("--last-failed")
+        self.assertEqual((d['run'], d['failures']), (4, 0))
+
     def test_require(self):
         _pip_uninstall('requests')
         _pip_uninstall('beautifulsoup4')
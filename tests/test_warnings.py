@@ -0,0 +1,36 @@
+import unittest
+
+from neatest._warnings import WarningsCollector
+
+
+class TestWarningsCollector(unittest.TestCase):
+    def test_deduplicates(self):
+        collector = WarningsCollector()
+        collector.start_test('m.T.test_a')
+        for _ in range(1000):
+            collector.showwarning(UserWarning('careful'), UserWarning,
+                                  'm.py', 5)
+        collector.stop_test('m.T.test_a')
+        collector.add(UserWarning('careful'), UserWarning, 'm.py', 5,
+                      count=3, test_id='m.T.test_b')
+        collector.add(UserWarning('careful'), UserWarning, 'm.py', 6)
+
+        self.assertEqual(collector.total, 1004)
+        self.assertEqual(len(collector.warnings()), 2)
+        first = list(collector.collected.values())[0]
+        self.assertEqual(first.count, 1003)
+        self.assertEqual(first.tests, ['m.T.test_a', 'm.T.test_b'])
+        self.assertIn('Caught 1003 times', first.describe())
+
+    def test_ignored_are_counted_only(self):
+        collector = WarningsCollector(ignore=['noisy'])
+        collector.showwarning(UserWarning('noisy one'), UserWarning,
+                              'm.py', 5)
+        collector.showwarning(UserWarning('noisy one'), UserWarning,
+                              'm.py', 5)
+        self.assertEqual(collector.total, 2)
+        self.assertEqual(collector.warnings(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from neatest._watch import FileWatcher, evict_modules
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.root = self.temp.name
+        pkg = Path(self.root) / 'watched_pkg'
+        pkg.mkdir()
+        (pkg / '__init__.py').write_text('')
+        (pkg / 'util.py').write_text('VALUE = 1\n')
+        (pkg / 'user.py').write_text('from watched_pkg.util import VALUE\n')
+        (pkg / 'other.py').write_text('import json\n')
+        sys.path.insert(0, self.root)
+
+    def tearDown(self):
+        sys.path.remove(self.root)
+        for name in list(sys.modules):
+            if name.startswith('watched_pkg'):
+                del sys.modules[name]
+        self.temp.cleanup()
+
+    def test_changes(self):
+        watcher = FileWatcher(self.root)
+        self.assertEqual(watcher.changes(), [])
+        util = os.path.join(self.root, 'watched_pkg', 'util.py')
+        os.utime(util, ns=(0, 0))
+        added = os.path.join(self.root, 'watched_pkg', 'added.py')
+        Path(added).write_text('')
+        self.assertEqual(watcher.changes(), sorted([added, util]))
+        self.assertEqual(watcher.changes(), [])
+
+    def test_evict_modules(self):
+        import watched_pkg.user  # noqa
+        import watched_pkg.other  # noqa
+        evicted = evict_modules(
+            self.root, [os.path.join(self.root, 'watched_pkg', 'util.py')],
+            cache=False)
+        self.assertEqual(evicted, {'watched_pkg.util', 'watched_pkg.user'})
+        self.assertIn('watched_pkg.other', sys.modules)
+        self.assertIn('json', sys.modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import time
+import unittest
+
+
+def setUpModule():
+    time.sleep(0.1)
+
+
+class Slow(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        time.sleep(0.2)
+
+    @classmethod
+    def tearDownClass(cls):
+        time.sleep(0.05)
+
+    def test_sleep(self):
+        time.sleep(0.3)
+
+    def test_fast(self):
+        pass
@@ -0,0 +1,17 @@
+import os
+import unittest
+
+FLAG = os.path.join(os.path.dirname(__file__), 'fail.flag')
+
+
+class TestFlaky(unittest.TestCase):
+    def test_flaky(self):
+        self.assertFalse(os.path.exists(FLAG))
+
+    def test_stable(self):
+        pass
+
+
+class TestStable(unittest.TestCase):
+    def test_stable(self):
+        pass
@@ -0,0 +1,6 @@
+import unittest
+
+
+class TestOther(unittest.TestCase):
+    def test_other(self):
+        pass
@@ -0,0 +1,15 @@
+import unittest
+
+_kept = []
+
+
+class Memory(unittest.TestCase):
+    def test_large(self):
+        data = bytearray(8 * 1024 * 1024)
+        del data
+
+    def test_leak(self):
+        _kept.append(bytearray(2 * 1024 * 1024))
+
+    def test_small(self):
+        self.assertEqual(sum(range(100)), 4950)
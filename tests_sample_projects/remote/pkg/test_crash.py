@@ -0,0 +1,18 @@
+import os
+import unittest
+
+# the test kills the first worker that runs it, if the variable is set
+FLAG = os.environ.get('NEATEST_CRASH_FLAG')
+
+
+class Crash(unittest.TestCase):
+    def test_before(self):
+        pass
+
+    def test_crash(self):
+        if FLAG and not os.path.exists(FLAG):
+            open(FLAG, 'w').close()
+            os._exit(1)
+
+    def test_later(self):
+        pass
@@ -0,0 +1,10 @@
+import time
+import unittest
+
+
+class Other(unittest.TestCase):
+    def test_a(self):
+        time.sleep(0.2)
+
+    def test_b(self):
+        time.sleep(0.2)
@@ -0,0 +1,6 @@
+import unittest
+
+
+class Base(unittest.TestCase):
+    def test_base(self):
+        pass
@@ -0,0 +1,7 @@
+from .base import Base
+
+
+class Child(Base):
+    # inherits test_base and adds test_child
+    def test_child(self):
+        pass
@@ -0,0 +1,3 @@
+raise AssertionError("This file contains no tests and expected to be "
+                     "ignored by the static discovery. But it seems to be "
+                     "imported.")
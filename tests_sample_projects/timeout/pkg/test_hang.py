@@ -0,0 +1,22 @@
+import threading
+import time
+import unittest
+
+
+class Hang(unittest.TestCase):
+    neatest_timeout = 0.5
+
+    def test_before(self):
+        pass
+
+    def test_hang(self):
+        # ignores the interruption, so the worker has to give up on it
+        end = time.monotonic() + 20
+        while time.monotonic() < end:
+            try:
+                threading.Event().wait(end - time.monotonic())
+            except Exception:
+                pass
+
+    def test_later(self):
+        pass
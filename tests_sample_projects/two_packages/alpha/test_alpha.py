@@ -0,0 +1,9 @@
+import unittest
+
+
+class TestAlpha(unittest.TestCase):
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
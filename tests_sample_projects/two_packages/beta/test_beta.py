@@ -0,0 +1,6 @@
+import unittest
+
+
+class TestBeta(unittest.TestCase):
+    def test_a(self):
+        pass